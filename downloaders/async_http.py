@@ -0,0 +1,383 @@
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import os
+import queue
+import shlex
+import threading
+from pprint import PrettyPrinter
+from urllib.parse import urlparse
+import aiohttp
+from src.settings import get_setting
+from src.host_limiter import get_host, get_host_limiter
+from utils.logger import LazyLogger
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36"
+    ),
+    "Accept": "*/*",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+CHUNK_SIZE = 64 * 1024
+
+pp = PrettyPrinter(indent=2)
+logger = LazyLogger(name="async_http", log_dir="/udown/async_http")
+
+
+def read_url_list(path: str):
+    """
+    Yields (url, output_filename) for each 'url [output_filename]' line.
+    Blank lines and lines starting with # are skipped.
+    """
+
+    with open(path, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            parts = line.split(maxsplit=1)
+            if len(parts) > 1 and ('"' in line or "'" in line):
+                # quoted filenames; an apostrophe in a URL isn't a quote
+                try:
+                    parts = shlex.split(line)
+                except ValueError as e:
+                    logger.warning(f"Not unquoting {path}:{line_number}: {e}")
+
+            yield parts[0], parts[1] if len(parts) > 1 else None
+
+
+def get_items(urls: list | str, output_filename: str = None):
+    """
+    Returns (url, output_filename) pairs. `urls` may be a URL, a list of
+    URLs or the path of a file listing one URL per line.
+    """
+
+    if isinstance(urls, str):
+        if os.path.isfile(urls):
+            return read_url_list(urls)
+        urls = [urls]
+
+    if len(urls) == 1:
+        return iter([(urls[0], output_filename)])
+
+    return ((url, None) for url in urls)
+
+
+class WriteBehindQueue:
+    """
+    Hands chunks to a single writer thread through a bounded queue.
+
+    Streams only wait on disk when the queue is full. The writer keeps one
+    handle open per file until it is finished or discarded, so open files
+    grow with the number of streams rather than with the number of chunks.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix="udown-writer")
+        self.task = None
+        self.failed = set()
+        self.files = {}
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def write(self, path, offset: int, data: bytes):
+        await self.queue.put((self.write_chunk, (path, offset, data), None))
+
+    async def finish(self, part_path, output_path):
+        """Renames a file once every chunk queued before it has been written."""
+
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((self.finish_file, (part_path, output_path), future))
+        await future
+
+    async def discard(self, path):
+        """Closes a file whose download failed, once its queued chunks are done."""
+
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((self.close_file, (path,), future))
+        await future
+
+    def write_chunk(self, path, offset: int, data: bytes):
+        fd = self.files.get(path)
+
+        if fd is None:
+            # the first chunk truncates whatever an earlier attempt left behind
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            self.files[path] = fd
+
+        os.pwrite(fd, data, offset)
+
+    def close_file(self, path):
+        self.failed.discard(path)
+        fd = self.files.pop(path, None)
+        if fd is not None:
+            os.close(fd)
+
+    def finish_file(self, part_path, output_path):
+        self.close_file(part_path)
+
+        if not os.path.exists(part_path):
+            # empty responses never wrote a chunk
+            open(part_path, "wb").close()
+        os.replace(part_path, output_path)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            func, args, future = await self.queue.get()
+            if func is None:
+                return
+
+            try:
+                if args[0] in self.failed and func != self.close_file:
+                    raise IOError(f"Failed to write {args[0]}")
+
+                await loop.run_in_executor(self.executor, func, *args)
+                if future:
+                    future.set_result(None)
+            except Exception as e:
+                if future:
+                    self.close_file(args[0])
+                    future.set_exception(e)
+                else:
+                    logger.error(f"Write failed for {args[0]}: {e}")
+                    self.failed.add(args[0])
+
+    async def close(self):
+        await self.queue.put((None, None, None))
+        await self.task
+
+        for path in list(self.files):
+            self.close_file(path)
+        self.executor.shutdown()
+
+
+class AsyncDownloader:
+    """Downloads a batch of URLs from one event loop."""
+
+    def __init__(
+        self,
+        output_directory: str = None,
+        headers: dict = None,
+        proxy: str = None,
+        concurrency: int = 500,
+        write_queue_size: int = 64,
+        host_connections: int = None,
+    ):
+        self.output_directory = output_directory or "."
+        self.headers = headers or DEFAULT_HEADERS
+        self.proxy = proxy
+        self.concurrency = max(1, int(concurrency))
+        self.write_queue_size = int(write_queue_size)
+        self.host_connections = (
+            int(host_connections) if host_connections not in (None, "") else None
+        )
+        self.host_semaphores = {}
+        self.stopped = False
+
+    def get_host_semaphore(self, url: str):
+        """
+        Streams per host are capped by `host_connections`, or by the host's
+        HOST_MAX_CONNECTIONS / HOST_LIMITS entry when it isn't set, so a batch
+        from a single CDN runs that many streams at once whatever `concurrency`
+        is. The cap only applies within this event loop.
+        """
+
+        host = get_host(url)
+
+        if host not in self.host_semaphores:
+            max_connections = self.host_connections
+            if max_connections is None:
+                max_connections = get_host_limiter().get_limit(host).max_connections
+
+            self.host_semaphores[host] = (
+                asyncio.Semaphore(max_connections) if max_connections > 0 else None
+            )
+
+        semaphore = self.host_semaphores[host]
+
+        return semaphore
+
+    def get_output_path(self, url: str, output_filename: str = None):
+        filename = (
+            output_filename or os.path.basename(urlparse(url).path) or "downloaded_file"
+        )
+        return os.path.join(self.output_directory, filename)
+
+    async def fetch(self, session, writer: WriteBehindQueue, url, output_filename):
+        output_path = self.get_output_path(url, output_filename)
+        part_path = f"{output_path}.part"
+        limit = get_host_limiter().get_limit(get_host(url))
+        semaphore = self.get_host_semaphore(url)
+        result = {
+            "url": url,
+            "status": None,
+            "output_filename": os.path.basename(output_path),
+        }
+
+        try:
+            if semaphore:
+                await semaphore.acquire()
+
+            try:
+                await asyncio.sleep(limit.requests.reserve())
+
+                async with session.get(url, proxy=self.proxy) as response:
+                    if response.status != 200:
+                        raise IOError(f"HTTP {response.status}")
+
+                    total_size = response.content_length or 0
+                    received = 0
+
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        await writer.write(part_path, received, chunk)
+                        received += len(chunk)
+                        await asyncio.sleep(limit.bytes.reserve(len(chunk)))
+
+                    if total_size and received != total_size:
+                        raise IOError(f"Ended after {received} of {total_size} bytes")
+
+            finally:
+                if semaphore:
+                    semaphore.release()
+
+            await writer.finish(part_path, output_path)
+
+        except Exception as e:
+            logger.error(f"Failed to download {url}: {e}")
+            await writer.discard(part_path)
+            return {**result, "status": 1, "error": str(e) or type(e).__name__}
+
+        return {
+            **result,
+            "status": 0,
+            "progress": "100%",
+            "path": output_path,
+            "size": received,
+        }
+
+    async def run(self, items, on_result):
+        """Runs `concurrency` streams over `items`, calling `on_result` for each."""
+
+        os.makedirs(self.output_directory, exist_ok=True)
+        items = iter(items)
+        writer = WriteBehindQueue(self.write_queue_size)
+        writer.start()
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60)
+
+        async def work(session):
+            # items are pulled lazily, so the batch can be any size
+            for url, output_filename in items:
+                if self.stopped:
+                    return
+                on_result(await self.fetch(session, writer, url, output_filename))
+
+        try:
+            async with aiohttp.ClientSession(
+                headers=self.headers, connector=connector, timeout=timeout
+            ) as session:
+                await asyncio.gather(
+                    *(work(session) for _ in range(self.concurrency))
+                )
+        finally:
+            await writer.close()
+
+
+def download(
+    urls: list | str,
+    output_directory: str = None,
+    output_filename: str = None,
+    user_agent: str = get_setting("USER_AGENT"),
+    proxy: str = get_setting("PROXY"),
+    headers: dict = None,
+    concurrency: int = get_setting("ASYNC_HTTP_CONCURRENCY", "500"),
+    write_queue_size: int = get_setting("ASYNC_HTTP_WRITE_QUEUE", "64"),
+    host_connections: int = get_setting("ASYNC_HTTP_HOST_CONNECTIONS", ""),
+):
+    """
+    Downloads every URL from a single asyncio event loop, yielding a result
+    as each file finishes. `urls` may also be a file listing one URL (and
+    optionally an output filename) per line.
+    """
+
+    if proxy and proxy.startswith("socks"):
+        yield {"url": urls, "status": 1, "error": "SOCKS proxies are not supported"}
+        return
+
+    headers = (headers or DEFAULT_HEADERS).copy()
+    if user_agent:
+        headers["User-Agent"] = user_agent
+
+    is_batch = isinstance(urls, list) or os.path.isfile(urls)
+    source_url = urls if isinstance(urls, str) else None
+    downloader = AsyncDownloader(
+        output_directory,
+        headers,
+        proxy or None,
+        concurrency,
+        write_queue_size,
+        host_connections,
+    )
+    results = queue.Queue()
+
+    def run():
+        try:
+            asyncio.run(
+                downloader.run(get_items(urls, output_filename), results.put)
+            )
+        except Exception as e:
+            logger.error(f"Async download failed: {e}")
+            results.put({"url": source_url, "status": 1, "error": str(e)})
+        finally:
+            results.put(None)
+
+    thread = threading.Thread(target=run, name="udown-async-http", daemon=True)
+    thread.start()
+
+    try:
+        while (result := results.get()) is not None:
+            if is_batch:
+                result["source_url"] = source_url
+                result["is_playlist"] = True
+            yield result
+    finally:
+        downloader.stopped = True
+        thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download URLs from one event loop")
+    parser.add_argument("urls", nargs="+", type=str, help="URLs or a URL list file")
+    parser.add_argument("-d", "--output_directory", type=str, default=None)
+    parser.add_argument("-f", "--output_filename", type=str, default=None)
+    parser.add_argument("--user_agent", type=str, default=get_setting("USER_AGENT"))
+    parser.add_argument("--proxy", type=str, default=get_setting("PROXY"))
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=get_setting("ASYNC_HTTP_CONCURRENCY", "500"),
+    )
+
+    args = parser.parse_args()
+    urls = args.urls[0] if len(args.urls) == 1 else args.urls
+
+    for result in download(
+        urls,
+        args.output_directory,
+        args.output_filename,
+        args.user_agent,
+        args.proxy,
+        concurrency=args.concurrency,
+    ):
+        pp.pprint(result)
@@ -4,11 +4,12 @@ from pprint import PrettyPrinter
 import re
 import json
 from urllib.parse import urljoin
-import requests
 from bs4 import BeautifulSoup
-from utils.logger import setup_logger, write_output
+from src.host_limiter import host_slot
+from src.http_pool import get_session
+from utils.logger import LazyLogger, write_output
 
-logger = setup_logger(name="selector", log_dir="/udown/selector")
+logger = LazyLogger(name="selector", log_dir="/udown/selector")
 pp = PrettyPrinter(indent=2)
 
 
@@ -80,7 +81,8 @@ def extract_selector(
 
     try:
         if re.match(r"^https?://", url):
-            response = requests.get(url)
+            with host_slot(url):
+                response = get_session().get(url)
             response.raise_for_status()
             html = response.text
         else:
@@ -7,7 +7,7 @@ from pprint import PrettyPrinter
 from downloaders.ytdlp import read_json_file
 from src.settings import DOWNLOADER_METADATA_DIR, get_setting
 from utils import read_file, is_valid_url
-from utils.logger import setup_logger, write_output
+from utils.logger import LazyLogger, write_output
 import re
 from selenium import webdriver
 from selenium.common.exceptions import WebDriverException
@@ -23,7 +23,7 @@ import undetected_chromedriver as uc
 # uc.TARGET_VERSION = 78
 
 pp = PrettyPrinter(indent=2)
-logger = setup_logger(name="selenium_downloader", log_dir="/udown/selenium")
+logger = LazyLogger(name="selenium_downloader", log_dir="/udown/selenium")
 
 driver_instance = None
 
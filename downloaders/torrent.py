@@ -12,13 +12,14 @@ import sys
 from argparse import ArgumentParser
 import tempfile
 import time
-import requests
 from bs4 import BeautifulSoup
 from urllib.parse import quote, unquote_plus
 from downloaders.wget import download as wget_download
 from src.settings import DOWNLOADER_METADATA_DIR
+from src.host_limiter import host_slot
+from src.http_pool import get_session
 from utils import str_to_bool
-from utils.logger import setup_logger, write_output
+from utils.logger import LazyLogger, write_output
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -26,7 +27,7 @@ from selenium.webdriver.support import expected_conditions as EC
 from urllib.parse import quote, unquote, urlparse, parse_qs, urljoin
 
 pp = PrettyPrinter(indent=2)
-logger = setup_logger(name="torrent", log_dir="/udown/torrent")
+logger = LazyLogger(name="torrent", log_dir="/udown/torrent")
 
 headers = {
     "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 Chrome/120 Safari/537.36",
@@ -377,14 +378,16 @@ def get_page_response(url: str, use_selenium: bool = False):
                 chrome_options.add_argument("--no-sandbox")
                 driver = webdriver.Chrome(options=chrome_options)
 
-            driver.get(url)
+            with host_slot(url):
+                driver.get(url)
             WebDriverWait(driver, 10).until(
                 EC.presence_of_element_located((By.TAG_NAME, "body"))
             )
 
             return driver.page_source
         else:
-            response = requests.get(url, headers=headers)
+            with host_slot(url):
+                response = get_session(headers=headers).get(url)
             response.raise_for_status()
             return response.text
     except Exception as e:
@@ -4,10 +4,10 @@ import subprocess
 import sys
 from pathlib import Path
 from pprint import PrettyPrinter
-from utils.logger import setup_logger
+from utils.logger import LazyLogger
 
 pp = PrettyPrinter(indent=2)
-logger = setup_logger(name="transmission", log_dir="/udown/transmission")
+logger = LazyLogger(name="transmission", log_dir="/udown/transmission")
 
 LINE_RE = re.compile(
     r"Progress:\s*([\d.]+)%,\s*dl from (\d+) of (\d+) peers \(([\d.]+\s*[KMG]?B/s)\),\s*ul to (\d+) \(([\d.]+\s*[KMG]?B/s)\) \[([\d.]+)\]"
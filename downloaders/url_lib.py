@@ -1,12 +1,15 @@
 import argparse
+from collections import deque
 import os
+import threading
+import time
 from pprint import PrettyPrinter
-import urllib3
 from urllib.parse import urlparse
 from pathlib import Path
 from src.settings import get_setting
-from utils.logger import setup_logger
-from urllib3.contrib.socks import SOCKSProxyManager
+from src.host_limiter import host_slot
+from src.http_pool import get_pool_manager
+from utils.logger import LazyLogger
 
 DEFAULT_HEADERS = {
     "User-Agent": (
@@ -19,8 +22,383 @@ DEFAULT_HEADERS = {
     "Connection": "keep-alive",
 }
 
+CHUNK_SIZE = 64 * 1024
+MIN_PIECE_SIZE = 1024 * 1024
+# keep adding connections while each one still gets this share of the best rate
+SCALE_THRESHOLD = 0.75
+# how often (seconds) running downloads report bytes_received
+PROGRESS_INTERVAL = 1
+
 pp = PrettyPrinter(indent=2)
-logger = setup_logger(name="url_lib", log_dir="/udown/url_lib")
+logger = LazyLogger(name="url_lib", log_dir="/udown/url_lib")
+
+
+class ProgressLogger:
+    def __init__(self, total_size: int):
+        self.total_size = total_size
+        self.downloaded = 0
+        self.last_logged_percent = 0
+        self.last_logged_bytes = 0
+        self.lock = threading.Lock()
+
+    def update(self, nbytes: int):
+        with self.lock:
+            self.downloaded += nbytes
+            downloaded = self.downloaded
+
+            if self.total_size > 0:
+                percent = int((downloaded / self.total_size) * 100)
+                if percent >= self.last_logged_percent + 5:
+                    logger.info(
+                        f"Progress: {percent}% ({downloaded:,} / {self.total_size:,} bytes)"
+                    )
+                    self.last_logged_percent = percent
+
+            elif downloaded - self.last_logged_bytes > 1_000_000:
+                logger.info(f"Progress: {downloaded:,} bytes downloaded...")
+                self.last_logged_bytes = downloaded
+
+
+def get_total_size(response) -> int:
+    """Returns the full size of the resource, also for 206 responses."""
+
+    content_range = response.headers.get("Content-Range", "")
+    if "/" in content_range:
+        total = content_range.rsplit("/", 1)[1].strip()
+        if total.isdigit():
+            return int(total)
+
+    return int(response.headers.get("Content-Length", 0))
+
+
+def get_range_start(response) -> int:
+    content_range = response.headers.get("Content-Range", "")
+    start = content_range.removeprefix("bytes ").split("-", 1)[0].strip()
+    return int(start) if start.isdigit() else 0
+
+
+def get_validators(response) -> dict:
+    return {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+
+
+def get_if_range(etag: str = None, last_modified: str = None):
+    """Returns the If-Range validator. Weak ETags can't be used with If-Range."""
+
+    if etag and not etag.startswith("W/"):
+        return etag
+    return last_modified
+
+
+def get_resume_offset(part_path, validator: str = None, bytes_received=None) -> int:
+    """
+    Returns where to resume a .part file from.
+
+    `bytes_received` is what was last recorded as written contiguously; it
+    never exceeds what's on disk, and segmented downloads preallocate the
+    file, so the file size alone can't be trusted.
+    """
+
+    if not validator or not bytes_received or not os.path.exists(part_path):
+        return 0
+
+    return min(int(bytes_received), os.path.getsize(part_path))
+
+
+def preallocate(output_path, size: int, keep: bool = False):
+    """Allocates `size` bytes for the output file, keeping existing data if `keep`."""
+
+    with open(output_path, "r+b" if keep else "wb") as f:
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+        except (AttributeError, OSError):
+            if f.seek(0, os.SEEK_END) < size:
+                f.truncate(size)
+
+
+def stream_to_file(response, f, progress: ProgressLogger, slot=None):
+    """Writes a response to `f`, yielding the bytes written so far after each chunk."""
+
+    written = 0
+
+    for chunk in response.stream(CHUNK_SIZE):
+        if not chunk:
+            continue
+
+        f.write(chunk)
+        written += len(chunk)
+        progress.update(len(chunk))
+        if slot:
+            slot.throttle(len(chunk))
+        yield written
+
+
+def write_stream(response, f, progress: ProgressLogger, slot=None) -> int:
+    written = 0
+    for written in stream_to_file(response, f, progress, slot):
+        pass
+    return written
+
+
+def stream_part(response, part_path, total_size: int, offset: int = 0, slot=None):
+    """Appends a response to a .part file at `offset`, yielding the bytes on disk."""
+
+    with open(part_path, "r+b" if offset else "wb") as f:
+        f.truncate(offset)
+        f.seek(offset)
+        progress = ProgressLogger(total_size)
+        progress.downloaded = offset
+
+        for written in stream_to_file(response, f, progress, slot):
+            yield offset + written
+
+    response.release_conn()
+
+
+def get_progress(received: int, total_size: int):
+    if not total_size:
+        return None
+    return f"{received / total_size * 100:.1f}%"
+
+
+class SegmentedDownload:
+    """
+    Fetches a file as concurrent byte ranges over a shared connection pool.
+
+    The file is split into pieces that connections pull from a queue. It
+    starts with two connections and keeps opening more (up to `max_segments`)
+    while each connection still gets close to the best per-connection rate
+    seen so far, i.e. until the link rather than the latency is the limit.
+
+    The first connection uses `slot`; every other one takes a connection
+    slot of its own from the host's limit and is only opened if one is free.
+    """
+
+    def __init__(
+        self,
+        http,
+        url: str,
+        output_path,
+        total_size: int,
+        max_segments: int = 8,
+        slot=None,
+        retries: int = 3,
+        offset: int = 0,
+    ):
+        self.http = http
+        self.url = url
+        self.output_path = output_path
+        self.total_size = total_size
+        self.max_segments = max(1, max_segments)
+        self.slot = slot
+        self.retries = retries
+        self.piece_size = max(MIN_PIECE_SIZE, total_size // (self.max_segments * 4))
+        self.progress = ProgressLogger(total_size)
+        self.progress.downloaded = offset
+        self.offset = offset
+        self.lock = threading.Lock()
+        self.finished = threading.Condition(self.lock)
+        self.pieces = deque()
+        # pieces finish out of order; only the contiguous prefix can be resumed
+        self.contiguous = offset
+        self.completed = {}
+        self.cancelled = False
+        self.threads = []
+        self.active = 0
+        self.rates = deque(maxlen=self.max_segments)
+        self.best_rate = 0
+        self.error = None
+
+    def get_pieces(self, offset: int = 0):
+        return deque(
+            (start, min(start + self.piece_size, self.total_size) - 1)
+            for start in range(offset, self.total_size, self.piece_size)
+        )
+
+    def request_piece(self, piece):
+        start, end = piece
+        headers = {**self.http.headers, "Range": f"bytes={start}-{end}"}
+
+        for attempt in range(self.retries):
+            try:
+                response = self.http.request(
+                    "GET",
+                    self.url,
+                    headers=headers,
+                    preload_content=False,
+                    retries=False,
+                )
+                if response.status == 206:
+                    return response
+
+                response.release_conn()
+                error = f"HTTP {response.status} for range {start}-{end}"
+            except Exception as e:
+                error = str(e)
+
+            logger.warning(f"Segment {start}-{end} failed ({attempt + 1}): {error}")
+
+        raise IOError(error)
+
+    def write_piece(self, f, piece, response):
+        start, end = piece
+        started = time.monotonic()
+
+        f.seek(start)
+        written = write_stream(response, f, self.progress, self.slot)
+        response.release_conn()
+
+        if written != end - start + 1:
+            raise IOError(f"Segment {start}-{end} ended after {written} bytes")
+
+        self.complete_piece(piece)
+        self.record_rate(written / max(time.monotonic() - started, 1e-6))
+
+    def complete_piece(self, piece):
+        with self.lock:
+            self.completed[piece[0]] = piece[1]
+            while self.contiguous in self.completed:
+                self.contiguous = self.completed.pop(self.contiguous) + 1
+
+    def record_rate(self, rate: float):
+        with self.lock:
+            self.rates.append(rate)
+            self.best_rate = max(self.best_rate, rate)
+            connections = self.active
+            recent = list(self.rates)[-connections:]
+            per_connection = sum(recent) / len(recent)
+
+            if (
+                connections < self.max_segments
+                and len(self.pieces) > connections
+                and per_connection >= SCALE_THRESHOLD * self.best_rate
+            ):
+                self.start_worker()
+
+    def start_worker(self, piece=None, response=None) -> bool:
+        extra_slot = bool(self.threads) and self.slot is not None
+        if extra_slot and not self.slot.limit.try_acquire():
+            return False
+
+        thread = threading.Thread(
+            target=self.work, args=(piece, response, extra_slot), daemon=True
+        )
+        self.threads.append(thread)
+        self.active += 1
+        thread.start()
+        return True
+
+    def next_piece(self):
+        with self.lock:
+            if self.error or self.cancelled or not self.pieces:
+                return None
+            return self.pieces.popleft()
+
+    def cancel(self):
+        """Stops handing out pieces; pieces already in flight still finish."""
+        with self.lock:
+            self.cancelled = True
+
+    def work(self, piece=None, response=None, extra_slot: bool = False):
+        try:
+            with open(self.output_path, "r+b") as f:
+                while True:
+                    if piece is None:
+                        piece = self.next_piece()
+                        if piece is None:
+                            return
+                        response = self.request_piece(piece)
+
+                    self.write_piece(f, piece, response)
+                    piece = response = None
+
+        except Exception as e:
+            with self.lock:
+                self.error = self.error or e
+
+        finally:
+            if extra_slot:
+                self.slot.limit.release()
+
+            with self.lock:
+                self.active -= 1
+                self.finished.notify_all()
+
+    def run(self, first_response=None):
+        """
+        Downloads every piece after `offset`, yielding the contiguous bytes
+        written so far every PROGRESS_INTERVAL seconds.
+
+        `first_response` is an already open 206 response starting at
+        `offset`, e.g. the one used to probe the server.
+        """
+
+        preallocate(self.output_path, self.total_size, keep=self.offset > 0)
+
+        first_piece = None
+        start = self.offset
+        if first_response is not None:
+            length = int(first_response.headers.get("Content-Length", 0))
+            start = min(self.offset + length, self.total_size)
+            first_piece = (self.offset, start - 1)
+
+        self.pieces = self.get_pieces(start)
+
+        try:
+            with self.lock:
+                if first_piece:
+                    self.start_worker(first_piece, first_response)
+                for _ in range(min(2, self.max_segments) - len(self.threads)):
+                    self.start_worker()
+
+            while True:
+                with self.lock:
+                    if not self.active:
+                        break
+                    self.finished.wait(PROGRESS_INTERVAL)
+                    contiguous = self.contiguous
+                yield contiguous
+
+        finally:
+            self.cancel()
+
+        if self.error:
+            raise self.error
+
+        # the last piece may finish after the last yield
+        yield self.contiguous
+
+        logger.info(f"Fetched {self.url} over {len(self.threads)} connection(s).")
+        return self.contiguous
+
+
+def request_range(
+    http, url: str, headers: dict, offset: int, segments: int, validator=None
+):
+    """
+    Requests the file from `offset`. When segmenting, only the first piece is
+    asked for, which also probes whether the server supports ranges.
+    """
+
+    request_headers = {**headers}
+    if segments > 1:
+        request_headers["Range"] = f"bytes={offset}-{offset + MIN_PIECE_SIZE - 1}"
+    elif offset:
+        request_headers["Range"] = f"bytes={offset}-"
+
+    if offset and validator:
+        # the server ignores the range (and sends a 200) if the file changed
+        request_headers["If-Range"] = validator
+
+    return http.request(
+        "GET",
+        url,
+        headers=request_headers,
+        preload_content=False,
+        retries=False,
+    )
 
 
 def download(
@@ -30,14 +408,28 @@ def download(
     user_agent: str = get_setting("USER_AGENT"),
     proxy: str = get_setting("PROXY"),
     headers: dict = None,
+    segments: int = get_setting("URLLIB_SEGMENTS", "8"),
+    etag: str = None,
+    last_modified: str = None,
+    bytes_received: int = None,
 ):
     """
     Download files using urllib3 with progress logging via logger.
+    Servers that support byte ranges are fetched in concurrent segments.
+
+    Files are written to '<output_path>.part' and renamed once complete.
+    `etag`, `last_modified` and `bytes_received` describe an earlier partial
+    download, which is continued with Range/If-Range requests.
     Returns list of results.
     """
     if isinstance(urls, str):
         urls = [urls]
 
+    if len(urls) > 1:
+        # resume state belongs to a single file
+        etag = last_modified = bytes_received = None
+
+    segments = int(segments or 1)
     headers = (headers or DEFAULT_HEADERS).copy()
     if user_agent:
         headers["User-Agent"] = user_agent
@@ -47,19 +439,24 @@ def download(
 
     if proxy:
         logger.info(f"Using proxy: {proxy}")
-        http = (
-            SOCKSProxyManager(proxy_url=proxy, headers=headers)
-            if proxy.startswith("socks")
-            else urllib3.ProxyManager(proxy_url=proxy, headers=headers)
-        )
-    else:
-        http = urllib3.PoolManager(headers=headers)
+
+    http = get_pool_manager(proxy, headers)
 
     results = []
 
     for url in urls:
         logger.info(f"Starting download: {url}")
-        result = {"url": url, "status": None}
+        validators = {"etag": etag, "last_modified": last_modified}
+        received = 0
+
+        def get_result(status=None, **kwargs):
+            return {
+                "url": url,
+                "status": status,
+                **validators,
+                "bytes_received": received,
+                **kwargs,
+            }
 
         try:
             parsed = urlparse(url)
@@ -69,61 +466,88 @@ def download(
             out_dir = Path(output_directory or ".")
             out_dir.mkdir(parents=True, exist_ok=True)
             output_path = out_dir / filename
+            part_path = Path(f"{output_path}.part")
 
             logger.info(f"→ Saving to: {output_path}")
 
-            response = http.request("GET", url, preload_content=False, retries=False)
-
-            if response.status != 200:
-                error = f"HTTP {response.status}"
-                logger.error(error)
-                result["error"] = error
-                results.append(result)
-                continue
-
-            total_size = int(response.headers.get("Content-Length", 0))
-            downloaded = 0
-            last_logged_percent = 0
-            last_logged_bytes = 0
-            chunk_size = 8192
-
-            with open(output_path, "wb") as f:
-                for chunk in response.stream(chunk_size):
-                    if not chunk:
-                        continue
-
-                    f.write(chunk)
-                    downloaded += len(chunk)
-
-                    if total_size > 0:
-                        percent = int((downloaded / total_size) * 100)
-                        if percent >= last_logged_percent + 5:
-                            logger.info(
-                                f"Progress: {percent}% ({downloaded:,} / {total_size:,} bytes)"
-                            )
-                            last_logged_percent = percent
-
-                    elif downloaded - last_logged_bytes > 1_000_000:
-                        logger.info(f"Progress: {downloaded:,} bytes downloaded...")
-                        last_logged_bytes = downloaded
-
-            logger.info(f"Completed: {downloaded:,} bytes → {output_path}")
-            result["path"] = str(output_path)
-            result["size"] = downloaded
-            result["status"] = 0
-            response.release_conn()
+            with host_slot(url) as slot:
+                validator = get_if_range(**validators)
+                offset = get_resume_offset(part_path, validator, bytes_received)
+                if offset:
+                    logger.info(f"Resuming from byte {offset:,}")
+
+                response = request_range(
+                    http, url, headers, offset, segments, validator
+                )
+
+                if response.status == 416 and offset:
+                    # the partial file no longer fits the resource; start over
+                    logger.warning(f"Range not satisfiable, restarting {url}")
+                    response.release_conn()
+                    offset = 0
+                    response = request_range(http, url, headers, offset, segments)
+
+                if response.status not in (200, 206):
+                    error = f"HTTP {response.status}"
+                    logger.error(error)
+                    response.release_conn()
+                    result = get_result(1, error=error)
+                    results.append(result)
+                    yield result
+                    continue
+
+                if response.status == 200 or get_range_start(response) != offset:
+                    if offset:
+                        logger.warning("Server sent the whole file, restarting.")
+                    offset = 0
+
+                total_size = get_total_size(response)
+                validators = get_validators(response)
+                received = offset
+                last_reported = time.monotonic()
+
+                if response.status == 206 and segments > 1:
+                    max_segments = segments
+                    if slot.limit.max_connections > 0:
+                        max_segments = min(segments, slot.limit.max_connections)
+
+                    written = SegmentedDownload(
+                        http,
+                        url,
+                        part_path,
+                        total_size,
+                        max_segments,
+                        slot,
+                        offset=offset,
+                    ).run(response)
+                else:
+                    written = stream_part(response, part_path, total_size, offset, slot)
+
+                for received in written:
+                    if time.monotonic() - last_reported >= PROGRESS_INTERVAL:
+                        last_reported = time.monotonic()
+                        yield get_result(progress=get_progress(received, total_size))
+
+            if total_size and received != total_size:
+                # keep the .part file so the next attempt resumes it
+                raise IOError(f"Received {received:,} of {total_size:,} bytes")
+
+            os.replace(part_path, output_path)
+            logger.info(f"Completed: {received:,} bytes → {output_path}")
+            result = get_result(
+                0, path=str(output_path), size=received, progress="100%"
+            )
+            yield result
 
         except KeyboardInterrupt:
             logger.warning("Download interrupted by user")
-            result["status"] = 1
-            result["error"] = "Interrupted by user"
-            yield {"url": url, "status": 1, "error": "Interrupted"}
+            result = get_result(1, error="Interrupted")
+            yield result
             break
         except Exception as e:
             logger.error(f"Failed to download {url}: {e}")
-            result["status"] = 1
-            result["error"] = str(e)
-            yield {"url": url, "status": 1, "error": "Interrupted"}
+            result = get_result(1, error=str(e))
+            yield result
             break
         results.append(result)
 
@@ -146,13 +570,23 @@ if __name__ == "__main__":
         help="Custom User-Agent",
     )
     parser.add_argument("--proxy", type=str, default=get_setting("PROXY"), help="Proxy")
+    parser.add_argument(
+        "-s",
+        "--segments",
+        type=int,
+        default=get_setting("URLLIB_SEGMENTS", "8"),
+        help="Maximum concurrent byte ranges per file (1 disables segmenting)",
+    )
 
     args = parser.parse_args()
 
-    download(
-        args.urls,
-        args.output_directory,
-        args.output_filename,
-        args.user_agent,
-        args.proxy,
+    results = list(
+        download(
+            args.urls,
+            args.output_directory,
+            args.output_filename,
+            args.user_agent,
+            args.proxy,
+            segments=args.segments,
+        )
     )
@@ -2,30 +2,54 @@ import argparse
 import os
 import subprocess
 import re
+from urllib.parse import urlparse
 from src.settings import get_setting
-from utils.logger import setup_logger
+from src.host_limiter import host_slot
+from utils.logger import LazyLogger
 
-logger = setup_logger(name="wget", log_dir="/udown/wget")
+logger = LazyLogger(name="wget", log_dir="/udown/wget")
 PROGRESS_RE = re.compile(r"(\d+)%")
+HEADER_RE = re.compile(r"^(ETag|Last-Modified):\s*(.+)$", re.IGNORECASE)
+STATUS_RE = re.compile(r"^HTTP/\S+\s+(\d{3})")
+
+
+def get_output_path(url, output_directory=None, output_filename=None):
+    filename = (
+        output_filename or os.path.basename(urlparse(url).path) or "index.html"
+    )
+    return os.path.join(output_directory, filename) if output_directory else filename
+
+
+def get_if_range(etag: str = None, last_modified: str = None):
+    """Returns the If-Range validator. Weak ETags can't be used with If-Range."""
+
+    if etag and not etag.startswith("W/"):
+        return etag
+    return last_modified
 
 
 def build_wget_cmd(
-    url, output_directory=None, output_filename=None, user_agent: str = None
+    url,
+    output_directory=None,
+    output_filename=None,
+    user_agent: str = None,
+    rate_limit: int = None,
+    resume_validator: str = None,
 ):
-    cmd = ["wget", "--progress=bar:force"]
+    # -S prints the response headers, which carry the resume validators
+    cmd = ["wget", "--progress=bar:force", "-S"]
 
     if user_agent:
         cmd += ["--user-agent", user_agent]
 
-    if output_filename:
-        output_path = (
-            os.path.join(output_directory, output_filename)
-            if output_directory
-            else output_filename
-        )
-        cmd += ["-O", output_path]
-    elif output_directory:
-        cmd += ["-P", output_directory]
+    if rate_limit:
+        cmd += [f"--limit-rate={rate_limit}"]
+
+    if resume_validator:
+        cmd += ["-c", f"--header=If-Range: {resume_validator}"]
+
+    output_path = get_output_path(url, output_directory, output_filename)
+    cmd += ["-O", f"{output_path}.part"]
 
     cmd.append(url)
     return cmd
@@ -55,65 +79,150 @@ def download(
     output_filename: str = None,
     proxy: str = get_setting("PROXY"),
     user_agent: str = get_setting("USER_AGENT"),
+    etag: str = None,
+    last_modified: str = None,
+    bytes_received: int = None,
 ):
+    """
+    Downloads to '<output_path>.part' and renames it once complete. A .part
+    file left by an earlier attempt is continued if `bytes_received` and a
+    validator (`etag` or `last_modified`) were recorded for it.
+    """
 
     if isinstance(urls, str):
         urls = [urls]
 
+    if len(urls) > 1:
+        # resume state belongs to a single file
+        etag = last_modified = bytes_received = None
+
     env = build_env(proxy)
 
     for url in urls:
         logger.info(f"URL: {url}")
-        cmd = build_wget_cmd(url, output_directory, output_filename, user_agent)
-
-        proc = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-            env=env,
+        yield from _download_url(
+            url,
+            output_directory,
+            output_filename,
+            user_agent,
+            env,
+            {"etag": etag, "last_modified": last_modified},
+            bytes_received,
         )
 
-        try:
-            for line in proc.stdout:
-                line = line.strip()
-                match = PROGRESS_RE.search(line)
-                if match:
-                    percent = match.group(1)
-                    logger.info(f"Progress: {str(percent)}%")
-                    yield {"url": url, "status": None, "progress": f"{percent}%"}
-
-            proc.wait()
-
-            if proc.returncode == 0:
-                yield {"url": url, "status": 0, "progress": "100%"}
-            else:
-                stderr_output = None
-
-                if proc.stderr:
-                    stderr_output = (
-                        proc.stderr.read().decode("utf-8", errors="replace").strip()
-                    )
-                    logger.error(f"Command failed with code {proc.returncode}")
-
-                if stderr_output:
-                    logger.error(f"Error:\n{stderr_output}")
-
-                yield {"url": url, "status": 1, "error": "wget failed"}
-
-        except KeyboardInterrupt:
-            proc.terminate()
-            proc.wait()
-            logger.error("Error: KeyboardInterrupt")
-            yield {"url": url, "status": 1, "error": "Interrupted"}
-
-        finally:
-            if proc.stdout:
-                proc.stdout.close()
-            if proc.poll() is None:
+
+def _download_url(
+    url,
+    output_directory,
+    output_filename,
+    user_agent,
+    env,
+    validators: dict = None,
+    bytes_received: int = None,
+):
+    output_path = get_output_path(url, output_directory, output_filename)
+    part_path = f"{output_path}.part"
+    validators = dict(validators or {})
+
+    resume_validator = get_if_range(**validators)
+    if not (resume_validator and bytes_received and os.path.exists(part_path)):
+        resume_validator = None
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+    if output_directory:
+        os.makedirs(output_directory, exist_ok=True)
+
+    def get_result(status=None, **kwargs):
+        received = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        return {
+            "url": url,
+            "status": status,
+            **validators,
+            "bytes_received": received,
+            **kwargs,
+        }
+
+    with host_slot(url) as slot:
+        while True:
+            cmd = build_wget_cmd(
+                url,
+                output_directory,
+                output_filename,
+                user_agent,
+                slot.rate_limit,
+                resume_validator,
+            )
+            output = []
+            restart = False
+
+            proc = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1,
+                env=env,
+            )
+
+            try:
+                for line in proc.stdout:
+                    line = line.strip()
+                    output.append(line)
+
+                    status = STATUS_RE.match(line)
+                    if resume_validator and status and status.group(1) == "200":
+                        # If-Range didn't match: the file changed since the
+                        # .part was written and wget would append to it anyway
+                        restart = True
+                        break
+
+                    header = HEADER_RE.match(line)
+                    if header:
+                        key = header.group(1).lower().replace("-", "_")
+                        validators[key] = header.group(2).strip()
+                        continue
+
+                    match = PROGRESS_RE.search(line)
+                    if match:
+                        percent = match.group(1)
+                        logger.info(f"Progress: {str(percent)}%")
+                        yield get_result(progress=f"{percent}%")
+
+                if restart:
+                    proc.terminate()
+                proc.wait()
+
+                if proc.returncode == 0 and not restart:
+                    result = get_result(0, progress="100%")
+                    os.replace(part_path, output_path)
+                    yield result
+                    return
+
+                if restart:
+                    logger.warning(f"Cannot resume {url}, restarting.")
+                    os.remove(part_path)
+                    resume_validator = None
+                    continue
+
+                logger.error(f"Command failed with code {proc.returncode}")
+                logger.error("Error:\n" + "\n".join(output[-10:]))
+                yield get_result(1, error="wget failed")
+                return
+
+            except KeyboardInterrupt:
                 proc.terminate()
                 proc.wait()
+                logger.error("Error: KeyboardInterrupt")
+                yield get_result(1, error="Interrupted")
+                return
+
+            finally:
+                if proc.stdout:
+                    proc.stdout.close()
+                if proc.poll() is None:
+                    proc.terminate()
+                    proc.wait()
 
 
 if __name__ == "__main__":
@@ -2,12 +2,13 @@ import argparse
 import os
 from pprint import PrettyPrinter
 import re
-import requests
 from downloaders.selector import apply_rules
-from utils.logger import setup_logger, write_output
+from src.host_limiter import host_slot
+from src.http_pool import get_session
+from utils.logger import LazyLogger, write_output
 from lxml import html as lxml_html
 
-logger = setup_logger(name="xpath", log_dir="/udown/xpath")
+logger = LazyLogger(name="xpath", log_dir="/udown/xpath")
 pp = PrettyPrinter(indent=2)
 
 
@@ -29,7 +30,8 @@ def extract_xpath(
 
     try:
         if re.match(r"^https?://", url):
-            response = requests.get(url)
+            with host_slot(url):
+                response = get_session().get(url)
             response.raise_for_status()
             html_content = response.text
         else:
@@ -1,17 +1,25 @@
 import yt_dlp
 import argparse
+import atexit
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+import copy
 import os
 import json
 from pprint import PrettyPrinter
+import threading
 from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+from yt_dlp.utils import PlaylistEntries
 from src.settings import get_setting
+from src.host_limiter import host_slot
+from src.scheduler import get_job_semaphore, release_type_semaphore
 from utils import read_json_file
-from utils.logger import setup_logger
+from utils.logger import LazyLogger
 
 parent_directory = os.path.dirname(os.path.abspath(__file__))
 pp = PrettyPrinter(indent=2)
 
-logger = setup_logger(name="ytdlp", log_dir="/udown/ytdlp")
+logger = LazyLogger(name="ytdlp", log_dir="/udown/ytdlp")
 
 
 def get_urls(urls: list, removed_args: list = None):
@@ -274,12 +282,16 @@ def extract_ytdlp_info(url: str):
     return results
 
 
-def get_channel_info(channel_id_or_url: str):
-    url = (
+def get_channel_url(channel_id_or_url: str) -> str:
+    return (
         f"https://www.youtube.com/{channel_id_or_url}/videos"
-        if not channel_id_or_url.startswith("https")
+        if not channel_id_or_url.startswith(("http://", "https://"))
         else channel_id_or_url
     )
+
+
+def get_channel_info(channel_id_or_url: str):
+    url = get_channel_url(channel_id_or_url)
     channel_info = extract_ytdlp_info(url)
 
     return url, channel_info
@@ -298,6 +310,89 @@ def get_video_urls_from_channel(
    
     return video_urls
 
+
+def extract_unprocessed_info(ytdl: yt_dlp.YoutubeDL, url: str) -> dict:
+    """
+    Extracts `url` without processing it, following redirects to other
+    URLs; a playlist's entries are only listed (flat), often lazily.
+    """
+
+    info = ytdl.extract_info(url, download=False, process=False)
+
+    while info and info.get("_type") == "url":
+        info = ytdl.extract_info(
+            info["url"], download=False, ie_key=info.get("ie_key"), process=False
+        )
+
+    return info
+
+
+def is_newest_first(url: str) -> bool:
+    """Whether `url` is a channel tab, which lists the newest videos first."""
+    return urlparse(url).path.rstrip("/").endswith(("/videos", "/shorts", "/streams"))
+
+
+def get_new_video_urls(
+    url: str,
+    archive=None,
+    last_video_id: str = None,
+    stop_early: bool = None,
+) -> tuple:
+    """
+    Lists the videos of a channel or playlist that aren't in `archive`.
+    Channel tabs list the newest first, so listing stops at `last_video_id`
+    (the newest video the last complete sync listed), and later pages aren't
+    fetched. Archived videos are only skipped, not stopped at, since a video
+    that failed can sit between archived ones.
+
+    Returns the new video URLs and the ID of the newest video listed.
+    """
+
+    if stop_early is None:
+        stop_early = is_newest_first(url)
+
+    options = {
+        "extract_flat": True,
+        "skip_download": True,
+        "download_archive": archive,
+    }
+    video_urls = []
+    newest_id = None
+
+    with yt_dlp.YoutubeDL(options) as ytdl:
+        info = extract_unprocessed_info(ytdl, url)
+
+        if not info or info.get("entries") is None:
+            logger.error(f"No videos listed for {url}")
+            return video_urls, newest_id
+
+        for _, entry in PlaylistEntries(ytdl, info).get_requested_items():
+            video_id = entry.get("id") if entry else None
+            if not video_id:
+                continue
+
+            newest_id = newest_id or video_id
+
+            if stop_early and video_id == last_video_id:
+                break
+
+            if ytdl.in_download_archive(entry):
+                continue
+
+            entry_url = get_entry_url(url, entry, True)
+            if entry_url:
+                video_urls.append(entry_url)
+
+    logger.info(f"{len(video_urls)} new videos in {url}")
+    return video_urls, newest_id
+
+
+def set_rate_limit(options: dict, rate_limit: int = None) -> dict:
+    if rate_limit and not options.get("ratelimit"):
+        options["ratelimit"] = rate_limit
+    return options
+
+
 def check_ffmpeg(options: dict) -> bool:
     for pp in options.get("postprocessors", []):
         key = pp.get("key", "")
@@ -344,6 +439,301 @@ class YTDLPProgressState:
             self.done = True
 
 
+class YTDLPSession:
+    """
+    A YoutubeDL that several downloads with the same options use in turn,
+    and the progress hook of the download using it.
+    """
+
+    def __init__(self, options: dict):
+        self.hook = None
+
+        # YoutubeDL keeps (and normalizes) the options it was given
+        options = copy.deepcopy(options)
+        options["progress_hooks"] = [self.progress_hook]
+        self.ytdl = yt_dlp.YoutubeDL(options)
+
+    def progress_hook(self, d):
+        if self.hook:
+            self.hook(d)
+
+    def close(self):
+        try:
+            self.ytdl.close()
+        except Exception as e:
+            logger.error(f"Could not close yt-dlp session: {e}")
+
+
+# idle sessions as (key, session) pairs, most recently used last; extractors,
+# cookies, HTTP connections and remote components are set up once per session
+_sessions = []
+_lock = threading.Lock()
+
+
+def get_session_key(options: dict) -> str:
+    return json.dumps(options, sort_keys=True, default=str)
+
+
+def get_pool_size() -> int:
+    return max(0, int(get_setting("YTDLP_POOL_SIZE", "4")))
+
+
+@contextmanager
+def ytdlp_session(options: dict, hook=None):
+    """
+    Checks out an idle YoutubeDL for `options` (which include the proxy),
+    or creates one, with `hook` attached to it until it's returned.
+    """
+
+    key = get_session_key(options)
+    session = None
+
+    with _lock:
+        for idx in range(len(_sessions) - 1, -1, -1):
+            if _sessions[idx][0] == key:
+                session = _sessions.pop(idx)[1]
+                break
+
+    if session is None:
+        session = YTDLPSession(options)
+
+    session.hook = hook
+    reuse = False
+
+    try:
+        yield session.ytdl
+        reuse = True
+    except Exception:
+        # failed downloads leave the session usable; interrupts don't
+        reuse = True
+        raise
+    finally:
+        session.hook = None
+
+        if reuse:
+            release_session(key, session)
+        else:
+            session.close()
+
+
+def release_session(key: str, session: YTDLPSession):
+    """Returns a session to the pool, closing the least recently used ones."""
+
+    with _lock:
+        _sessions.append((key, session))
+        excess = max(len(_sessions) - get_pool_size(), 0)
+        closed = [idle for _, idle in _sessions[:excess]]
+        del _sessions[:excess]
+
+    for idle in closed:
+        idle.close()
+
+
+@atexit.register
+def close_sessions():
+    """Closes every idle session, saving their cookies."""
+
+    with _lock:
+        closed = [session for _, session in _sessions]
+        _sessions.clear()
+
+    for session in closed:
+        session.close()
+
+
+def get_playlist_concurrency(playlist_concurrency: int = None) -> int:
+    if playlist_concurrency is None:
+        playlist_concurrency = get_setting("YTDLP_PLAYLIST_CONCURRENCY", "4")
+    return max(1, int(playlist_concurrency))
+
+
+def get_playlist_info(info: dict) -> dict:
+    """Playlist fields yt-dlp adds to an entry's info, for output templates."""
+
+    return {
+        "playlist": info.get("title") or info.get("id"),
+        "playlist_id": info.get("id"),
+        "playlist_title": info.get("title"),
+        "playlist_uploader": info.get("uploader"),
+        "playlist_uploader_id": info.get("uploader_id"),
+        "playlist_channel": info.get("channel"),
+        "playlist_channel_id": info.get("channel_id"),
+    }
+
+
+def get_entry_result(
+    source_url: str,
+    idx: int,
+    entry: dict,
+    is_playlist: bool,
+    progress: str = None,
+    uses_ffmpeg: bool = False,
+    prefix: str = None,
+    output_filename: str = None,
+) -> dict:
+    result = {
+        "url": source_url,
+        "index": idx,
+        "is_playlist": is_playlist,
+        "progress": progress,
+        "status": None,
+    }
+
+    if is_playlist:
+        result["source_url"] = source_url
+
+    if not entry:
+        error = f"Skipping unavailable video at index {idx}."
+        logger.error(error)
+        result["error"] = error
+        return result
+
+    entry_url = get_entry_url(source_url, entry, is_playlist)
+    entry_filename = get_entry_filename(entry, uses_ffmpeg, prefix, output_filename)
+
+    if not entry_url:
+        error = f"Missing URL at index {idx}. Skipping."
+        logger.error(error)
+        result["error"] = error
+        return result
+
+    result["url"] = entry_url
+    result["output_filename"] = entry_filename
+    result["progress"] = progress or "100%"
+    logger.info(f"Filename: {entry_filename}")
+    result["status"] = 0
+
+    return result
+
+
+def download_entry(
+    source_url: str,
+    idx: int,
+    entry: dict,
+    options: dict,
+    playlist_info: dict,
+    uses_ffmpeg: bool = False,
+    prefix: str = None,
+    output_filename: str = None,
+) -> dict:
+    """Downloads a playlist entry from its flat info, with a session of its own."""
+
+    entry_url = get_entry_url(source_url, entry, True) if entry else None
+    progress_state = YTDLPProgressState()
+
+    if not entry_url:
+        return get_entry_result(source_url, idx, entry, True)
+
+    try:
+        with host_slot(entry_url) as slot, ytdlp_session(
+            set_rate_limit(dict(options), slot.rate_limit), progress_state.hook
+        ) as ytdl:
+            info = ytdl.process_ie_result(
+                entry,
+                download=True,
+                extra_info={**playlist_info, "playlist_index": idx + 1},
+            )
+
+    except Exception as e:
+        logger.error(f"Download error: {e}")
+        return {
+            "url": entry_url,
+            "source_url": source_url,
+            "index": idx,
+            "status": 1,
+            "error": str(e),
+            "progress": progress_state.progress,
+            "is_playlist": True,
+        }
+
+    return get_entry_result(
+        source_url,
+        idx,
+        info,
+        True,
+        progress_state.progress,
+        uses_ffmpeg,
+        prefix,
+        output_filename,
+    )
+
+
+def download_playlist(
+    source_url: str,
+    info: dict,
+    entries: list,
+    options: dict,
+    playlist_concurrency: int,
+    uses_ffmpeg: bool = False,
+    prefix: str = None,
+    output_filename: str = None,
+):
+    """
+    Downloads up to `playlist_concurrency` entries of a flat playlist at a
+    time, yielding each result as soon as its entry finishes.
+
+    Run by a scheduler, the first entry uses the download's own type slot and
+    every other entry running alongside it takes a free slot of the same type,
+    so entries count towards DOWNLOADER_CONCURRENCY (e.g. `ytdlp=3`).
+    """
+
+    playlist_info = get_playlist_info(info)
+    semaphore = get_job_semaphore()
+    pending = iter(entries)
+    exhausted = False
+
+    # running entries, and whether each holds a type slot of its own
+    running = {}
+    executor = ThreadPoolExecutor(
+        max_workers=playlist_concurrency, thread_name_prefix="udown-ytdlp"
+    )
+
+    try:
+        while True:
+            while not exhausted and len(running) < playlist_concurrency:
+                extra_slot = bool(running) and semaphore is not None
+                if extra_slot and not semaphore.acquire(blocking=False):
+                    break
+
+                item = next(pending, None)
+                if item is None:
+                    exhausted = True
+                    if extra_slot:
+                        release_type_semaphore(semaphore)
+                    break
+
+                idx, entry = item
+                future = executor.submit(
+                    download_entry,
+                    source_url,
+                    idx,
+                    entry,
+                    options,
+                    playlist_info,
+                    uses_ffmpeg,
+                    prefix,
+                    output_filename,
+                )
+                running[future] = extra_slot
+
+            if not running:
+                return
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                if running.pop(future):
+                    release_type_semaphore(semaphore)
+                yield future.result()
+    finally:
+        # a stopped download starts no more entries, but the running ones
+        # finish first so nothing keeps writing once it has returned
+        executor.shutdown(wait=True, cancel_futures=True)
+
+        for extra_slot in running.values():
+            if extra_slot:
+                release_type_semaphore(semaphore)
+
+
 def download(
     urls: list,
     options_path="",
@@ -358,8 +748,18 @@ def download(
     sleep_interval: str = None,
     max_sleep_interval: str = None,
     proxy: str = None,
+    playlist_concurrency: int = None,
+    archive_key: str = None,
 ):
-    results = []
+    """
+    Downloads every URL, yielding a result per video as soon as it finishes.
+    Playlists are listed first without downloading anything (like
+    extract_ytdlp_info), then their entries are downloaded concurrently.
+
+    With `archive_key`, videos are recorded in the database's download
+    archive under that key, and videos already recorded are skipped.
+    """
+
     logger.info("Downloading with yt-dlp...")
     options = get_options(
         options_path,
@@ -375,71 +775,35 @@ def download(
         proxy,
     )
 
+    options["remote_components"] = ["ejs:github"]
+
+    if archive_key:
+        from src.archive import VideoArchive
+
+        options["download_archive"] = VideoArchive(archive_key)
+
     urls = get_urls(urls, removed_args)
+    playlist_concurrency = get_playlist_concurrency(playlist_concurrency)
+    uses_ffmpeg = check_ffmpeg(options)
     logger.info(pp.pformat(options))
 
     for url in urls:
         logger.info(f"\nProcessing URL: {url}")
         progress_state = YTDLPProgressState()
-        options["progress_hooks"] = [progress_state.hook]
-        options["remote_components"] = ["ejs:github"]
         result = {"url": url}
         is_playlist = False
 
         try:
-            with yt_dlp.YoutubeDL(options) as ytdl:
-                info = ytdl.extract_info(url, download=True)
-
-                if not info:
-                    logger.error("No info returned from yt-dlp")
-                    continue
-
-                # Determine if it's a playlist or a single video
-                is_playlist = info.get("entries") is not None
-                entries = info.get("entries") if is_playlist else [info]
-                uses_ffmpeg = check_ffmpeg(options)
+            with host_slot(url) as slot, ytdlp_session(
+                set_rate_limit(dict(options), slot.rate_limit), progress_state.hook
+            ) as ytdl:
+                info = extract_unprocessed_info(ytdl, url)
+                is_playlist = bool(info) and info.get("entries") is not None
 
                 if is_playlist:
-                    logger.info(
-                        f"Playlist: {info.get('title', 'Untitled')} ({len(entries)} videos)"
-                    )
-
-                for idx, entry in enumerate(entries):
-
-                    result = {
-                        "url": url,
-                        "index": idx,
-                        "is_playlist": is_playlist,
-                        "progress": progress_state.progress,
-                        "status": None,
-                    }
-
-                    if not entry:
-                        error = f"Skipping unavailable video at index {idx}."
-                        logger.error(error)
-                        result["error"] = error
-                        results.append(result)
-                        continue
-
-                    entry_url = get_entry_url(url, entry, is_playlist)
-                    entry_filename = get_entry_filename(
-                        entry, uses_ffmpeg, prefix, output_filename
-                    )
-
-                    if not entry_url:
-                        error = f"Missing URL at index {idx}. Skipping."
-                        logger.error(error)
-                        result["error"] = error
-                        results.append(result)
-                        continue
-
-                    result["url"] = entry_url
-                    result["output_filename"] = entry_filename
-                    result["progress"] = "100%" if not progress_state.progress else progress_state.progress
-                    logger.info(f"Filename: {entry_filename}")
-                    result["status"] = 0
-
-                    results.append(result)
+                    entries = list(PlaylistEntries(ytdl, info).get_requested_items())
+                elif info:
+                    info = ytdl.process_ie_result(info, download=True)
 
         except KeyboardInterrupt as e:
             logger.error("User interrupted the download.")
@@ -450,7 +814,7 @@ def download(
                 "progress": progress_state.progress,
                 "is_playlist": is_playlist,
             }
-            results.append(result)
+            yield result
             continue
 
         except yt_dlp.utils.DownloadError as e:
@@ -462,7 +826,7 @@ def download(
                 "progress": progress_state.progress,
                 "is_playlist": is_playlist,
             }
-            results.append(result)
+            yield result
             continue
 
         except SystemExit as e:
@@ -474,7 +838,7 @@ def download(
                 "is_playlist": is_playlist,
                 "progress": progress_state.progress,
             }
-            results.append(result)
+            yield result
             continue
 
         except Exception as e:
@@ -486,10 +850,41 @@ def download(
                 "is_playlist": is_playlist,
                 "progress": progress_state.progress,
             }
-            results.append(result)
+            yield result
             continue
 
-    return results
+        if not info:
+            logger.error("No info returned from yt-dlp")
+            continue
+
+        if not is_playlist:
+            yield get_entry_result(
+                url,
+                0,
+                info,
+                False,
+                progress_state.progress,
+                uses_ffmpeg,
+                prefix,
+                output_filename,
+            )
+            continue
+
+        logger.info(
+            f"Playlist: {info.get('title', 'Untitled')} ({len(entries)} videos)"
+        )
+
+        # PlaylistEntries counts from 1
+        yield from download_playlist(
+            url,
+            info,
+            ((idx - 1, entry) for idx, entry in entries),
+            options,
+            playlist_concurrency,
+            uses_ffmpeg,
+            prefix,
+            output_filename,
+        )
 
 
 if __name__ == "__main__":
@@ -521,6 +916,8 @@ if __name__ == "__main__":
     parser.add_argument("-F", "--output_filename", default=None)
     parser.add_argument("-si", "--sleep_interval", default=None)
     parser.add_argument("-msi", "--max_sleep_interval", default=None)
+    parser.add_argument("-c", "--playlist_concurrency", default=None, type=int)
+    parser.add_argument("-a", "--archive_key", default=None)
 
     args = parser.parse_args()
     results = list(
@@ -538,6 +935,8 @@ if __name__ == "__main__":
             args.sleep_interval,
             args.max_sleep_interval,
             args.proxy,
+            args.playlist_concurrency,
+            args.archive_key,
         )
     )
 
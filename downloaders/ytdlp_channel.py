@@ -1,10 +1,16 @@
 import os
-from downloaders.ytdlp import get_channel_info, get_video_urls_from_channel
+from downloaders.ytdlp import (
+    get_channel_info,
+    get_channel_url,
+    get_new_video_urls,
+    get_video_urls_from_channel,
+)
 from argparse import ArgumentParser
 from pprint import PrettyPrinter
 from src.download import Download
 from src.downloader import Downloader, get_downloader_types
 from src.settings import get_setting
+from utils import str_to_bool
 
 pp = PrettyPrinter(indent=2)
 downloader_types = get_downloader_types()
@@ -14,38 +20,62 @@ def download(
     channel_id: str,
     downloader: str = get_setting("DOWNLOADER_TYPE", "ytdlp_video"),
     proxy: str = None,
-    sleep_interval: str = "2",
-    max_sleep_interval: str = "5",
+    incremental: bool = None,
 ):
+    """
+    Downloads a channel's videos. Incremental syncs only list the uploads
+    since the last sync that downloaded everything it listed, skip the ones
+    already archived for `downloader`, and archive the ones they download.
+    """
 
-    channel_url, channel_info = get_channel_info(channel_id)
-    video_urls = get_video_urls_from_channel(channel_url, channel_info)
+    if incremental is None:
+        incremental = str_to_bool(get_setting("YTDLP_INCREMENTAL_SYNC", "1"))
+
+    if incremental:
+        from src.archive import VideoArchive, get_high_water_mark, set_high_water_mark
+
+        channel_url = get_channel_url(channel_id)
+        video_urls, newest_id = get_new_video_urls(
+            channel_url,
+            VideoArchive(downloader),
+            get_high_water_mark(channel_url, downloader),
+        )
+    else:
+        channel_url, channel_info = get_channel_info(channel_id)
+        video_urls = get_video_urls_from_channel(channel_url, channel_info)
 
     results = []
+    failed = []
 
-    downloads = [
+    downloads = (
         Download(
             url=video_url,
             downloader_type=downloader,
             output_directory=os.environ.get("DOWNLOAD_DIRECTORY"),
             proxy=proxy,
-            extra_args={
-                "sleep_interval": sleep_interval,
-                "max_sleep_interval": max_sleep_interval,
-            },
+            extra_args={"archive_key": downloader} if incremental else None,
         )
         for video_url in video_urls
-    ]
+    )
     try:
-        for download in downloads:
-            result = download.download()
+        # a single batch, so the videos share the scheduler and yt-dlp sessions
+        Downloader.start_downloads(
+            downloads,
+            on_complete=lambda download, error: error and failed.append(download),
+            collect_results=False,
+        )
         results.append({"url": channel_id, "status": 0})
     except Exception as e:
         print(e)
-    
+        failed.append(channel_id)
+
+    # failed videos aren't archived; the mark stays so the next sync retries them
+    if incremental and newest_id and not failed:
+        set_high_water_mark(channel_url, downloader, newest_id)
 
     return results
 
+
 if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("channel_id", type=str)
@@ -55,14 +85,14 @@ if __name__ == "__main__":
         default=get_setting("DOWNLOADER_TYPE", "ytdlp_video"),
         choices=downloader_types,
     )
-    parser.add_argument("-i", "--sleep_interval", default="2")
-    parser.add_argument("-m", "--max_sleep_interval", default="5")
     parser.add_argument("-p", "--proxy", default=None)
+    parser.add_argument(
+        "--full", action="store_true", help="List every video, not only new uploads"
+    )
     args = parser.parse_args()
     download(
         args.channel_id,
         args.downloader,
         args.proxy,
-        args.sleep_interval,
-        args.max_sleep_interval,
+        False if args.full else None,
     )
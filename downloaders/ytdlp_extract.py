@@ -1,35 +1,67 @@
 import os
 from pathlib import Path
-from downloaders.ytdlp import get_channel_info, get_video_urls_from_channel
+from downloaders.ytdlp import (
+    get_channel_info,
+    get_channel_url,
+    get_new_video_urls,
+    get_video_urls_from_channel,
+)
 from argparse import ArgumentParser
 from pprint import PrettyPrinter
 from src.downloader import get_downloader_types
 from src.settings import get_setting
-from utils.logger import setup_logger, write_output
+from utils import str_to_bool
+from utils.logger import LazyLogger, write_output
 
 pp = PrettyPrinter(indent=2)
 downloader_types = get_downloader_types()
-logger = setup_logger(name="ytdlp_extract", log_dir="/udown/ytdlp_extract")
+logger = LazyLogger(name="ytdlp_extract", log_dir="/udown/ytdlp_extract")
 
 
 def extract(
     url: str,
     output_directory: str = None,
     output_filename: str = None,
+    incremental: bool = None,
 ):
+    """
+    Writes the video URLs of a channel or playlist to a file. Incremental
+    extracts append the uploads newer than the previous extract to the same
+    file, and stop listing the channel there.
+    """
+
     output_directory = Path(output_directory or ".")
     output_directory.mkdir(parents=True, exist_ok=True)
 
     if not output_filename:
         output_filename = "downloads.txt"
 
+    if incremental is None:
+        incremental = str_to_bool(get_setting("YTDLP_INCREMENTAL_SYNC", "1"))
+
     path = os.path.join(output_directory, output_filename)
     result = {"url": url, "status": 0, "path": path}
+    last_video_id = None
+
+    if incremental:
+        from src.archive import get_high_water_mark, set_high_water_mark
+
+        # extracts download nothing, so each output file keeps its own mark
+        sync_key = os.path.abspath(path)
+        channel_url = get_channel_url(url)
+        last_video_id = get_high_water_mark(channel_url, sync_key)
+        video_urls, newest_id = get_new_video_urls(
+            channel_url, last_video_id=last_video_id
+        )
+    else:
+        channel_url, channel_info = get_channel_info(url)
+        video_urls = get_video_urls_from_channel(channel_url, channel_info)
 
-    channel_url, channel_info = get_channel_info(url)
-    video_urls = get_video_urls_from_channel(channel_url, channel_info)
-    
-    write_output(logger, video_urls, path, append=False)
+    # without a mark the listing is complete and replaces the file
+    write_output(logger, video_urls, path, append=last_video_id is not None)
+
+    if incremental and newest_id:
+        set_high_water_mark(channel_url, sync_key, newest_id)
 
     return [result]
 
@@ -47,10 +79,14 @@ if __name__ == "__main__":
         default=None,
         help="Output filename",
     )
+    parser.add_argument(
+        "--full", action="store_true", help="List every video, not only new uploads"
+    )
 
     args = vars(parser.parse_args())
 
     urls = args.get("urls")
     output_directory = args.get("output_directory")
     output_filename = args.get("output_filename")
-    results = extract(urls, output_directory, output_filename)
+    incremental = False if args.get("full") else None
+    results = extract(urls, output_directory, output_filename, incremental)
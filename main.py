@@ -1,13 +1,11 @@
 #!/usr/bin/env python3
 # PYTHON_ARGCOMPLETE_OK
 import argparse
+from collections.abc import Iterator
+import os
 import sys
 
-from src.download import download_command, download_action, complete_downloader_type
-from src.downloader import downloader_command, downloader_action, pp
-from src.update import update_command, update_action
-from src.settings import settings_action, get_setting, settings_command
-from utils import parse_date, str_to_bool
+from src.completion import complete_from_index
 
 
 def get_defaults(parser, args):
@@ -66,9 +64,21 @@ def get_extra_args(unknown_args):
 
 
 def main():
-    # if "_ARGCOMPLETE" in os.environ:
-    #     print("ARGCOMPLETE ACTIVE", file=sys.stderr)
-    #     return
+    # TAB presses are answered from the completion index when possible,
+    # before the parser and the modules behind it are loaded
+    if "_ARGCOMPLETE" in os.environ and complete_from_index():
+        return
+
+    from src.download import (
+        download_command,
+        download_action,
+        complete_downloader_type,
+    )
+    from src.downloader import downloader_command, downloader_action
+    from src.update import update_command, update_action
+    from src.worker import worker_command, worker_action
+    from src.settings import settings_action, get_setting, settings_command
+    from utils import get_date_range, parse_duration_range, str_to_bool
 
     parser = argparse.ArgumentParser(prog="udown")
 
@@ -81,9 +91,11 @@ def main():
 
     parser.add_argument("-f", "--output_filename", default=None, type=str)
     parser.add_argument("-op", "--output_path", default=None, type=str)
-    parser.add_argument("-sd", "--start_date", default=None, type=parse_date)
-    parser.add_argument("-ed", "--end_date", default=None, type=parse_date)
-    parser.add_argument("-te", "--time_elapsed", default=None, type=str)
+    parser.add_argument("-sd", "--start_date", default=None, type=get_date_range)
+    parser.add_argument("-ed", "--end_date", default=None, type=get_date_range)
+    parser.add_argument(
+        "-te", "--time_elapsed", default=None, type=parse_duration_range
+    )
     parser.add_argument(
         "-ui", "--ui", default=get_setting("USE_TUI", True), type=str_to_bool
     )
@@ -103,9 +115,14 @@ def main():
     update_parser = update_command(subparsers)
     update_parser.set_defaults(func=update_action)
 
-    import argcomplete
+    worker_parser = worker_command(subparsers)
+    worker_parser.set_defaults(func=worker_action)
+
+    # argcomplete is only needed when the shell asks for completions
+    if "_ARGCOMPLETE" in os.environ:
+        import argcomplete
 
-    argcomplete.autocomplete(parser)
+        argcomplete.autocomplete(parser)
 
     if len(sys.argv) == 1:
         sys.argv.append("download")
@@ -130,7 +147,16 @@ def main():
     output = func(**args_dict)
 
     if not ui and output:
-        pp.pprint(output)
+        from pprint import PrettyPrinter
+
+        pp = PrettyPrinter(indent=2)
+
+        if isinstance(output, Iterator):
+            # listings stream, so print rows as they are read
+            for item in output:
+                pp.pprint(item)
+        else:
+            pp.pprint(output)
 
 
 if __name__ == "__main__":
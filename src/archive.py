@@ -0,0 +1,83 @@
+"""
+yt-dlp's download archive, kept in the database instead of a text file, and
+the newest video the last sync of each channel listed (its high-water mark),
+so channel syncs only list and download new uploads.
+"""
+
+import time
+from utils.sqlite import transaction
+from utils.sqlite_item import get_connection
+from .downloader import database_path
+
+
+class VideoArchive:
+    """
+    A download archive for yt-dlp's `download_archive` option, which takes
+    any object supporting `in` and `add` in place of a file. IDs such as
+    "youtube <video id>" are archived per `archive_key`, the downloader type,
+    so an audio and a video sync of the same channel don't skip each other.
+    """
+
+    def __init__(self, archive_key: str, db_path: str = None):
+        self.archive_key = archive_key
+        self.db_path = db_path or database_path
+
+    def __contains__(self, archive_id: str) -> bool:
+        conn = get_connection(self.db_path)
+        row = conn.execute(
+            "SELECT 1 FROM ytdlp_archive WHERE archive_key = ? AND archive_id = ?",
+            (self.archive_key, archive_id),
+        ).fetchone()
+        return row is not None
+
+    def add(self, archive_id: str):
+        conn = get_connection(self.db_path)
+
+        with transaction(conn):
+            conn.execute(
+                "INSERT OR IGNORE INTO ytdlp_archive "
+                "(archive_key, archive_id, archived_date) VALUES (?, ?, ?)",
+                (self.archive_key, archive_id, time.time()),
+            )
+
+    def __bool__(self):
+        # yt-dlp doesn't look IDs up in an empty archive; counting costs more
+        return True
+
+    def __deepcopy__(self, memo):
+        # sessions copy their options; the copies share the table
+        return self
+
+    def __repr__(self):
+        # sessions are pooled by their options, this archive included
+        return f"VideoArchive({self.archive_key!r}, {self.db_path!r})"
+
+
+def get_high_water_mark(
+    channel_url: str, sync_key: str, db_path: str = None
+) -> str | None:
+    """Returns the newest video ID the last sync of `channel_url` listed."""
+
+    conn = get_connection(db_path or database_path)
+    row = conn.execute(
+        "SELECT last_video_id FROM ytdlp_channels "
+        "WHERE channel_url = ? AND sync_key = ?",
+        (channel_url, sync_key),
+    ).fetchone()
+    return row[0] if row else None
+
+
+def set_high_water_mark(
+    channel_url: str, sync_key: str, video_id: str, db_path: str = None
+):
+    conn = get_connection(db_path or database_path)
+
+    with transaction(conn):
+        conn.execute(
+            "INSERT INTO ytdlp_channels "
+            "(channel_url, sync_key, last_video_id, last_sync_date) "
+            "VALUES (?, ?, ?, ?) ON CONFLICT (channel_url, sync_key) "
+            "DO UPDATE SET last_video_id = excluded.last_video_id, "
+            "last_sync_date = excluded.last_sync_date",
+            (channel_url, sync_key, video_id, time.time()),
+        )
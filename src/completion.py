@@ -0,0 +1,146 @@
+"""
+Shell completion from a small index file of downloader types, settings keys
+and recent output directories, so a TAB press doesn't build the parser,
+open the database or import any backend. The index is rewritten whenever
+the downloaders table changes, see src.downloader.write_completion_index.
+"""
+
+import json
+import os
+
+from .settings import get_database_path
+
+COMMANDS = ("download", "downloaders", "settings", "update", "worker")
+DOWNLOADER_TYPE_OPTIONS = ("-t", "--downloader_type")
+OUTPUT_DIRECTORY_OPTIONS = ("-d", "--output_directory")
+SETTINGS_ACTIONS = ("get", "set")
+
+# characters bash splits words on, or that have to be escaped
+WORDBREAKS = " \t\n\"'><=;|&(:"
+SPECIAL_CHARS = "\\();<>|&!`$* \t\n\"'"
+
+
+def get_index_path() -> str:
+    return os.path.splitext(get_database_path())[0] + "_completions.json"
+
+
+def read_index(path: str = None) -> dict:
+    try:
+        with open(path or get_index_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_index(path: str = None, **fields):
+    """Updates `fields` of the index; the file is replaced atomically."""
+
+    path = path or get_index_path()
+    index = {**read_index(path), **fields}
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+
+    os.replace(tmp_path, path)
+
+
+def get_completions(words: list, prefix: str, index: dict):
+    """
+    Returns the completions of `prefix`, given the words before it (without
+    the program), or None if the index doesn't cover that argument.
+    """
+
+    previous = words[-1] if words else None
+    command = words[0] if words and words[0] in COMMANDS else "download"
+
+    if previous in DOWNLOADER_TYPE_OPTIONS:
+        values = index.get("downloader_types")
+    elif previous in OUTPUT_DIRECTORY_OPTIONS and command == "download":
+        values = index.get("output_directories")
+    elif command == "settings" and words[1:] and words[1] in SETTINGS_ACTIONS:
+        values = index.get("settings") if len(words) == 2 else None
+    else:
+        values = None
+
+    if values is None:
+        return None
+
+    completions = [value for value in values if value.startswith(prefix)]
+
+    # paths that aren't recent are left to the parser's file completion
+    if not completions and previous in OUTPUT_DIRECTORY_OPTIONS:
+        return None
+
+    return completions
+
+
+def format_completions(completions: list) -> list:
+    """Escapes completions the way argcomplete does for an unquoted word."""
+
+    shell = os.environ.get("_ARGCOMPLETE_SHELL")
+    special_chars = "" if shell in ("tcsh", "fish") else SPECIAL_CHARS
+    if shell == "zsh":
+        special_chars += ":"
+
+    formatted = []
+    for completion in completions:
+        for char in special_chars:
+            completion = completion.replace(char, "\\" + char)
+        formatted.append(completion)
+
+    append_space = os.environ.get("_ARGCOMPLETE_SUPPRESS_SPACE") != "1"
+    if append_space and len(formatted) == 1 and formatted[0][-1:] not in "=/:":
+        formatted[0] += " "
+
+    if shell == "zsh":
+        formatted = [f"{completion}:" for completion in formatted]
+
+    dfs = os.environ.get("_ARGCOMPLETE_DFS")
+    if dfs:
+        formatted = [f"{completion}{dfs}" for completion in formatted]
+
+    return formatted
+
+
+def complete_from_index() -> bool:
+    """
+    Answers an argcomplete request from the index. Returns False when it
+    can't, so the full parser (and argcomplete) handle the request instead.
+    """
+
+    comp_line = os.environ.get("COMP_LINE", "")
+    comp_point = int(os.environ.get("COMP_POINT", len(comp_line)))
+    line = comp_line[:comp_point]
+
+    # quoting, `--option=value` and PowerShell are left to argcomplete
+    if (
+        any(char in line for char in "\"'\\=")
+        or os.environ.get("_ARGCOMPLETE_SHELL") == "powershell"
+    ):
+        return False
+
+    head, _, prefix = line.rpartition(" ")
+    if any(char in prefix for char in WORDBREAKS):
+        return False
+
+    # _ARGCOMPLETE is 1 for `udown ...`, 2 for `python main.py ...`
+    start = int(os.environ.get("_ARGCOMPLETE", "1"))
+    words = head.split()[start:]
+
+    index = read_index()
+    completions = get_completions(words, prefix, index) if index else None
+    if completions is None:
+        return False
+
+    ifs = os.environ.get("_ARGCOMPLETE_IFS", "\013")
+    output = ifs.join(format_completions(completions))
+
+    filename = os.environ.get("_ARGCOMPLETE_STDOUT_FILENAME")
+    try:
+        with open(filename or 8, "w", closefd=filename is not None) as f:
+            f.write(output)
+    except OSError:
+        return False
+
+    return True
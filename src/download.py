@@ -1,9 +1,10 @@
-from datetime import datetime
+from datetime import timedelta
 from enum import Enum
 import json
 import os
 import shlex
 import sqlite3
+import time
 from typing import Optional
 from urllib.parse import urlparse
 from .downloader import (
@@ -11,14 +12,33 @@ from .downloader import (
     get_downloader_types,
     detect_downloader_type,
     complete_downloader_type,
+    write_completion_index,
+)
+from utils import (
+    get_date_range,
+    parse_duration,
+    parse_duration_range,
+    parse_progress,
+    parse_range,
+    parse_value,
+    str_to_bool,
+    to_timestamp,
 )
-from utils import str_to_bool, parse_value, parse_date
 from .settings import get_setting
+from utils.sqlite import load_json
 from utils.sqlite_item import SQLiteItem
+from utils.sqlite_query import And, where
 from utils.sqlite_conn import (
     download_values,
 )
-from .downloader import database_path, pp, logger
+from .downloader import database_path, logger, registry
+from .job import Job, enqueue_jobs
+
+
+# downloader types that take a whole URL list file in a single call
+BATCH_DOWNLOADER_TYPES = {"async_http"}
+ENQUEUE_BATCH_SIZE = 1000
+PAGE_SIZE = int(get_setting("PAGE_SIZE", "100"))
 
 
 class DownloadStatus(str, Enum):
@@ -31,8 +51,8 @@ class Download(SQLiteItem):
     _downloader: Downloader = None
     _downloader_type: str = None
     _download_status = DownloadStatus.STARTED
-    _start_date = str(datetime.now())
-    _end_date = None
+    _start_date: float = None
+    _end_date: float = None
     _time_elapsed = None
     _url: str = None
     _download_str: str = None
@@ -43,9 +63,22 @@ class Download(SQLiteItem):
     _source_url: str = None
     _extra_args: dict = None
     _proxy: str = None
-    _progress: str = "0"
+    _progress: float = 0.0
+    _bytes_received: int = None
+    _etag: str = None
+    _last_modified: str = None
     _results = None
 
+    exact_columns = ("downloader_type", "download_status")
+    prefix_columns = ("source_url",)
+    range_columns = ("start_date", "end_date", "time_elapsed", "progress")
+    search_table = "downloads_fts"
+    search_columns = ("url", "output_filename", "output_path")
+    page_key = "start_date"
+    json_columns = ("extra_args",)
+    date_columns = ("start_date", "end_date")
+    duration_columns = ("time_elapsed",)
+
     @property
     def results(self):
         return self._results
@@ -73,6 +106,9 @@ class Download(SQLiteItem):
         proxy: Optional[str] = None,
         extra_args: Optional[dict] = None,
         progress: Optional[str] = None,
+        bytes_received: Optional[int] = None,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
     ):
         column_names = [
             "url",
@@ -88,6 +124,9 @@ class Download(SQLiteItem):
             "proxy",
             "extra_args",
             "progress",
+            "bytes_received",
+            "etag",
+            "last_modified",
         ]
         super().__init__(download_values, column_names, db_path=database_path)
         self.url = url
@@ -103,19 +142,49 @@ class Download(SQLiteItem):
         self.proxy = proxy
         self.extra_args = extra_args
         self.progress = progress
+        self.bytes_received = bytes_received
+        self.etag = etag
+        self.last_modified = last_modified
         self.table_name = "downloads"
         self.conjunction_type = "AND"
         self.results = None
-        self.filter_condition = f"url = {self.url}"
+        self.filter_condition = where(url=self.url)
 
     @property
     def progress(self):
         return self._progress
 
     @progress.setter
-    def progress(self, progress: str):
+    def progress(self, progress):
+        # (low, high) ranges only filter listings
+        if not isinstance(progress, tuple):
+            progress = parse_progress(progress)
         self._progress = progress
 
+    @property
+    def bytes_received(self):
+        return self._bytes_received
+
+    @bytes_received.setter
+    def bytes_received(self, bytes_received: int):
+        self._bytes_received = bytes_received
+
+    @property
+    def etag(self):
+        return self._etag
+
+    @etag.setter
+    def etag(self, etag: str):
+        self._etag = etag
+
+    @property
+    def last_modified(self):
+        return self._last_modified
+
+    @last_modified.setter
+    def last_modified(self, last_modified: str):
+        self._last_modified = last_modified
+
     @property
     def proxy(self):
         return self._proxy
@@ -126,6 +195,9 @@ class Download(SQLiteItem):
 
     @property
     def extra_args(self):
+        # stored as JSON text, decoded the first time it's read
+        if isinstance(self._extra_args, str):
+            self._extra_args = load_json(self._extra_args)
         return self._extra_args
 
     @extra_args.setter
@@ -195,7 +267,9 @@ class Download(SQLiteItem):
     @start_date.setter
     def start_date(self, start_date):
         if start_date is None:
-            start_date = str(datetime.now())
+            start_date = time.time()
+        if not isinstance(start_date, tuple):
+            start_date = to_timestamp(start_date)
         self._start_date = start_date
 
     @property
@@ -204,6 +278,8 @@ class Download(SQLiteItem):
 
     @end_date.setter
     def end_date(self, end_date):
+        if not isinstance(end_date, tuple):
+            end_date = to_timestamp(end_date)
         self._end_date = end_date
 
     @property
@@ -212,6 +288,8 @@ class Download(SQLiteItem):
 
     @time_elapsed.setter
     def time_elapsed(self, time_elapsed):
+        if not isinstance(time_elapsed, tuple):
+            time_elapsed = parse_duration(time_elapsed)
         self._time_elapsed = time_elapsed
 
     @property
@@ -236,7 +314,7 @@ class Download(SQLiteItem):
             self._downloader_type = detect_downloader_type(self._url)
 
         if isinstance(self._downloader_type, str):
-            return Downloader(downloader_type=self._downloader_type).select_first()
+            return registry.get(self._downloader_type)
 
     @downloader.setter
     def downloader(self, downloader):
@@ -254,22 +332,40 @@ class Download(SQLiteItem):
         logger.info(f"Setting download status: {str(status)}")
 
         if self.download_status == DownloadStatus.COMPLETED:
-            self.end_date = str(datetime.now())
-            fmt = "%Y-%m-%d %H:%M:%S.%f"
-            start_dt = datetime.strptime(self.start_date, fmt)
-            end_dt = datetime.strptime(self.end_date, fmt)
+            self.end_date = time.time()
+            elapsed = timedelta(seconds=self.end_date - self.start_date)
 
-            self.time_elapsed = str(end_dt - start_dt)
-            log_message = f"Time elapsed: {self.time_elapsed}"
+            # stored in whole seconds
+            self.time_elapsed = elapsed.total_seconds()
+            log_message = f"Time elapsed: {elapsed}"
             logger.info(log_message)
         else:
-            data = self.as_dict()
+            from pprint import pformat
+
+            data = self.display_dict()
             logger.error(
-                f"An unexpected error has occured: {error_message}! \n{pp.pformat(data)} "
+                f"An unexpected error has occured: {error_message}! \n{pformat(data, indent=2)} "
             )
 
-        filter_condition = f"url = {self.url} AND downloader_type = {self.downloader_type} AND output_path = {self.output_path}"
-        self.update(filter_condition)
+        self.update(self.key_condition)
+
+    def load_resume_state(self):
+        """
+        Copies bytes_received and validators from this download's row, so a
+        retried or restarted download continues its .part file.
+        """
+
+        if self.bytes_received is not None:
+            return self
+
+        row = self.select_first(self.key_condition)
+
+        if row and row.download_status != DownloadStatus.COMPLETED.value:
+            self.bytes_received = row.bytes_received
+            self.etag = row.etag
+            self.last_modified = row.last_modified
+
+        return self
 
     def get_output_path(self, output_path: str | bytes = None):
         def to_str(val):
@@ -297,93 +393,150 @@ class Download(SQLiteItem):
 
     def __repr__(self):
         return json.dumps(
-            self.as_dict(),
+            self.display_dict(),
             indent=1,
             ensure_ascii=False,
         )
 
     def __str__(self):
         return json.dumps(
-            self.as_dict(),
+            self.display_dict(),
             indent=1,
             ensure_ascii=False,
         )
 
-    def insert(self):
+    def before_insert(self):
         if not self.downloader_type:
             self.downloader_type = "ytdlp_video"
         if not self.download_status:
             self.download_status = DownloadStatus.STARTED
-        return super().insert()
 
     @classmethod
     def parse_download_string(
         cls,
         **args,
     ):
-        downloads = []
+        return list(cls.iter_download_string(**args))
+
+    @classmethod
+    def iter_download_string(cls, **args):
+        """
+        Yields the downloads described by `url`: a single download string
+        ('url [downloader_type] [output_filename]'), or a .txt/.jsonl batch
+        file, which is read lazily one line at a time.
+        """
+
         url = args.get("url")
         base_downloader_type = args.get("downloader_type")
         base_output_directory = args.get("output_directory")
         base_output_filename = args.get("output_filename")
+        downloader_types = set()
 
         logger.info(f"Parsing download string: url={url}, args={args}")
 
+        def get_types():
+            if not downloader_types:
+                # fetched once per batch instead of querying for every token
+                downloader_types.update(get_downloader_types())
+            return downloader_types
+
+        def get_downloader_type(downloader_type: str, url: str):
+            if downloader_type in (None, "", "auto"):
+                return detect_downloader_type(url)
+
+            if downloader_type not in get_types():
+                raise ValueError(
+                    f"Downloader of type '{downloader_type}' does not exist."
+                )
+
+            return downloader_type
+
         def parse_line(line: str):
             url = None
             downloader_type = base_downloader_type
             output_filename = base_output_filename
+            downloader_types = get_types()
 
-            parts = shlex.split(line)
+            # shlex is only needed for quoted filenames and is much slower
+            parts = shlex.split(line) if '"' in line or "'" in line else line.split()
 
             for part in parts:
                 if part.startswith(("http://", "https://", "magnet:")):
                     url = part
                     continue
 
-                if Downloader(part).select_first() or part == "auto":
+                if part in downloader_types or part == "auto":
                     downloader_type = part
                     continue
 
                 output_filename = part
 
-            if downloader_type == "auto":
-                downloader_type = detect_downloader_type(url)
-
-            downloader = Downloader(downloader_type).select_first()
-            if not downloader:
-                raise ValueError(
-                    f"Downloader of type '{downloader_type}' does not exist."
-                )
-
             return Download(
                 url,
-                downloader_type,
+                get_downloader_type(downloader_type, url),
                 output_filename=output_filename,
                 output_directory=base_output_directory,
+                proxy=args.get("proxy"),
+                extra_args=args.get("extra_args"),
+            )
+
+        def parse_json_line(line: str):
+            data = json.loads(line)
+            url = data.get("url")
+            extra_args = data.get("extra_args")
+
+            if args.get("extra_args") or extra_args:
+                extra_args = {**(args.get("extra_args") or {}), **(extra_args or {})}
+
+            return Download(
+                url,
+                get_downloader_type(
+                    data.get("downloader_type", base_downloader_type), url
+                ),
+                output_filename=data.get("output_filename", base_output_filename),
+                output_directory=data.get("output_directory", base_output_directory),
+                proxy=data.get("proxy", args.get("proxy")),
+                extra_args=extra_args,
             )
 
-        # parse only if .txt
-        if os.path.exists(url) and url.endswith(".txt"):
-            with open(url, "r") as file:
-                for line in file:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    downloads.append(parse_line(line))
+        is_file = url and os.path.isfile(url)
+
+        if is_file and url.endswith(".jsonl"):
+            parse = parse_json_line
+        elif (
+            is_file
+            and url.endswith(".txt")
+            and base_downloader_type not in BATCH_DOWNLOADER_TYPES
+        ):
+            parse = parse_line
+        elif url and len(url.split()) > 1:
+            yield parse_line(url)
+            return
         else:
-            downloads.append(Download(**args))
+            yield Download(**args)
+            return
+
+        with open(url, "r") as file:
+            for line_number, line in enumerate(file, 1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
 
-        return downloads
+                try:
+                    download = parse(line)
+                except ValueError as e:
+                    # one bad line doesn't stop the rest of the batch
+                    logger.error(f"Skipping {url}:{line_number}: {e}")
+                    continue
+
+                yield download
 
     def download(self, downloader: Downloader = None):
         if not downloader:
             if not self._downloader_type:
                 self._downloader_type = detect_downloader_type(self._url)
 
-            downloader = Downloader(
-                downloader_type=self._downloader_type
-            ).select_first()
+            downloader = registry.get(self._downloader_type)
 
         results = downloader.start_downloads([self])
         self.results = results
@@ -398,41 +551,62 @@ def download_action(**args):
     filter_keys = Download().get_filter_keys_from_args(args, defaults)
 
     conjunction_type = args.pop("conjunction_type", get_setting("DOWNLOAD_OP", "AND"))
+    priority = args.pop("priority", 0) or 0
+    search = args.pop("search", None)
     # downloader_type = args.get("downloader_type")
 
     if action is None:
         action = "download" if url else "list"
 
     if url:
-        downloads = Download.parse_download_string(**args)
+        downloads = Download.iter_download_string(**args)
     else:
         downloads = [Download(**args)]
 
-    if action in {"add", "insert"}:
+    def require_urls(downloads):
         for d in downloads:
             if not d.url:
                 raise ValueError("No URL provided.")
-            d.insert()
+            yield d
 
-    elif action == "download":
-        all_results = []
+    if action in {"add", "insert"}:
 
-        for d in downloads:
-            if not d.url:
-                raise ValueError("No URL provided.")
+        def add_downloads(batch: list):
+            with Download().transaction():
+                # downloads already added (or done) get no second job
+                added = Download.insert_new(batch)
+
+                # picked up by `udown worker`
+                if added:
+                    jobs = [Job.from_download(d, priority) for d in added]
+                    enqueue_jobs(Download().conn, jobs)
+
+        batch = []
+        for d in require_urls(downloads):
+            batch.append(d)
+
+            if len(batch) >= ENQUEUE_BATCH_SIZE:
+                add_downloads(batch)
+                batch = []
+
+        if batch:
+            add_downloads(batch)
 
-            results = d.download()
-            if results:
-                all_results.extend(results)
+        write_completion_index()
 
-        return all_results
+    elif action == "download":
+        # batch files are read while the scheduler runs; their results are
+        # only recorded in the database so memory doesn't grow with the file
+        is_batch = os.path.isfile(url or "")
+        results = Downloader.start_downloads(
+            require_urls(downloads), collect_results=not is_batch
+        )
+        write_completion_index()
+        return results
 
     elif action == "delete":
         for d in downloads:
-            filter_condition = (
-                f"url = {d.url} AND downloader_type = {d.downloader_type}"
-            )
-            result = d.delete(filter_condition)
+            result = d.delete(where(url=d.url, downloader_type=d.downloader_type))
 
             if result:
                 logger.info(f"Download successfully deleted: {d.url}")
@@ -442,7 +616,15 @@ def download_action(**args):
 
         d = Download(**args)
         d.conjunction_type = conjunction_type
-        downloads = d.filter_by(filter_keys)
+
+        predicate = d.get_filter_predicate(filter_keys)
+        if search:
+            columns = (*d.search_columns, "downloader_type", "download_status")
+            predicate = And(predicate, d.get_search_predicate(search, columns))
+
+        # pages are read as they are shown, so large histories list immediately
+        pages = d.iter_pages(predicate, PAGE_SIZE, records=True)
+        downloads = (download for page in pages for download in page)
 
         if ui:
             from .tui_main import UDownApp
@@ -492,12 +674,15 @@ def download_command(subparsers):
     )
     download_cmd.add_argument("-f", "--output_filename", default=None, type=str)
     download_cmd.add_argument("-op", "--output_path", default=None, type=str)
-    download_cmd.add_argument("-sd", "--start_date", default=None, type=parse_date)
-    download_cmd.add_argument("-ed", "--end_date", default=None, type=parse_date)
-    download_cmd.add_argument("-te", "--time_elapsed", default=None, type=str)
+    download_cmd.add_argument("-sd", "--start_date", default=None, type=get_date_range)
+    download_cmd.add_argument("-ed", "--end_date", default=None, type=get_date_range)
+    download_cmd.add_argument(
+        "-te", "--time_elapsed", default=None, type=parse_duration_range
+    )
 
     download_cmd.add_argument("-p", "--proxy", default=get_setting("PROXY"), type=str)
-    download_cmd.add_argument("-pr", "--progress", default=None, type=str)
+    download_cmd.add_argument("-pr", "--progress", default=None, type=parse_range)
+    download_cmd.add_argument("-pri", "--priority", default=0, type=int)
     download_cmd.add_argument(
         "-ui", "--ui", default=get_setting("USE_TUI", True), type=str_to_bool
     )
@@ -1,33 +1,32 @@
-from collections.abc import Iterable
+from functools import lru_cache
 from importlib import import_module
 import json
 import os
-from pprint import PrettyPrinter
+import threading
+import time
 from utils import str_to_bool
 from .settings import (
+    all_settings,
     get_setting,
-    PROJECT_DIR,
     DOWNLOADER_METADATA_DIR,
-    ALLOWED_MODULES,
+    get_allowed_modules,
+    get_database_path,
+)
+from utils.logger import LazyLogger
+from utils.sqlite import is_valid_path, select_items, table_exists
+from utils.sqlite_item import (
+    SQLiteItem,
+    create_connection,
+    init_database,
+    set_initializer,
 )
-from utils.logger import setup_logger
-from utils.sqlite import is_valid_path
-from utils.sqlite_item import SQLiteItem, create_connection
 from utils.sqlite_conn import create_db, downloader_values
-import inspect
-
-
-pp = PrettyPrinter(indent=2)
-database_path = get_setting("DATABASE_PATH", os.path.join(PROJECT_DIR, "downloads.db"))
+from utils.sqlite_query import where
 
-# create connection and tables
-db_exists = os.path.exists(database_path)
-db = create_connection(database_path)
-create_db(database_path)
 
-
-logger = setup_logger(name="downloader", log_dir="/udown/downloader")
-logger.disabled = False
+database_path = get_database_path()
+RECENT_OUTPUT_DIRECTORIES = 20
+logger = LazyLogger(name="downloader", log_dir="/udown/downloader")
 
 
 def detect_downloader_type(url: str) -> str:
@@ -125,7 +124,7 @@ class Downloader(SQLiteItem):
         self.downloader_args = downloader_args
         self.table_name = "downloaders"
         self.conjunction_type = "OR"
-        self.filter_condition = f"downloader_type = {self.downloader_type}"
+        self.filter_condition = where(downloader_type=self.downloader_type)
 
     def __repr__(self):
         return json.dumps(
@@ -146,201 +145,405 @@ class Downloader(SQLiteItem):
         cls.upsert_all(items)
         logger.info("Successfully generated default downloaders.")
 
-    def get_function(self):
-        module_name = self.module.strip()
-        func_name = self.downloader_func.strip()
-
-        if module_name not in ALLOWED_MODULES:
-            logger.warning(
-                "Using custom module: %s\n"
-                "This can execute arbitrary code. Proceed only if you trust it.",
-                module_name,
-            )
-            response = (
-                input("Proceed with this custom downloader? [y/N]: ").strip().lower()
-            )
-            if response not in ("y", "yes"):
-                logger.info("User cancelled loading custom module.")
-                raise ValueError("Loading of custom module cancelled by user")
-
-            logger.info("User confirmed proceeding with custom module.")
+    # writes drop the registry, so this process sees them on its next lookup,
+    # and refresh the completion index
 
-        try:
-            module = import_module(module_name)
-            func = getattr(module, func_name)
-            if not callable(func):
-                raise ValueError(
-                    f"'{func_name}' is not callable in module '{module_name}'"
-                )
-            return func
-
-        except ImportError as e:
-            raise ValueError(f"Failed to import module '{module_name}': {e}")
-        except AttributeError:
-            raise ValueError(
-                f"Function '{func_name}' not found in module '{module_name}'"
-            )
-        except Exception as e:
-            raise ValueError(
-                f"Unexpected error loading '{module_name}.{func_name}': {e}"
-            )
+    def upsert(self, filter_condition=None):
+        result = super().upsert(filter_condition)
+        downloaders_changed()
+        return result
+
+    @classmethod
+    def upsert_all(cls, items: list, filter_condition: str = None):
+        result = super().upsert_all(items, filter_condition)
+        downloaders_changed()
+        return result
+
+    def delete(self, filter_condition=None):
+        result = super().delete(filter_condition)
+        downloaders_changed()
+        return result
+
+    def get_function(self):
+        return load_function(self.module.strip(), self.downloader_func.strip())
 
     def get_downloader_args(self, download, func):
         """Passes all Download values to the appropriate download func."""
 
-        func_signature = inspect.signature(func)
-        func_params = list(func_signature.parameters.values())
-
-        args_dict = {}
         extra_args = getattr(download, "extra_args", {}) or {}
 
         if extra_args:
             logger.info(f"Extra args:\n{extra_args}")
 
-        if not self.downloader_args:
-            for param in func_params:
-                if param.default is not inspect.Parameter.empty:
-                    args_dict[param.name] = param.default
-                else:
-                    args_dict[param.name] = getattr(download, param.name, None)
-            return args_dict
+        plan = get_args_plan(func, self.downloader_args or None)
+        return apply_args_plan(plan, download, extra_args)
+
+    @staticmethod
+    def record_result(download, result: dict, progress_buffer=None) -> bool:
+        """
+        Upserts the child download of a result. Returns True for playlist entries.
+        Progress-only results are left to `progress_buffer` when one is given.
+        """
+        from src.download import Download, DownloadStatus
+
+        url = result.get("url", download.url)
+        status_code = result.get("status", 1)
+        error_message = result.get("error")
+        source_url = result.get("source_url")
+        progress = result.get("progress")
+        is_playlist = result.get("is_playlist") is True
+
+        downloader_type = download.downloader_type
+        output_directory = download.output_directory
+        output_filename = result.get("output_filename", download.output_filename)
+
+        child_download = Download(
+            url,
+            downloader_type,
+            output_directory=output_directory,
+            output_filename=output_filename,
+            source_url=source_url,
+            bytes_received=result.get("bytes_received"),
+            etag=result.get("etag"),
+            last_modified=result.get("last_modified"),
+        )
+        logger.info(f"OUTPUT PATH: {child_download.output_path}")
+
+        if progress_buffer is not None:
+            if status_code is None and error_message is None:
+                child_download.progress = progress
+                progress_buffer.add(child_download)
+                return is_playlist
+
+            progress_buffer.discard(child_download)
+
+        filter_condition = child_download.key_condition
 
-        keys = [key.strip() for key in self.downloader_args.split(",")]
-        func_keys = {
-            k.strip(): v.strip()
-            for k, v in (key.split("=", 1) for key in keys if "=" in key)
-        }
+        # the child row's writes share one commit
+        with child_download.transaction():
+            if progress is not None:
+                child_download.progress = progress
+                child_download.set_progress_query(progress, filter_condition)
 
-        for idx, param in enumerate(func_params):
-            if param.name in extra_args:
-                args_dict[param.name] = extra_args[param.name]
-                continue
+            child_download.upsert(filter_condition)
 
-            key = keys[idx] if idx < len(keys) else None
+            if status_code == 1 or error_message is not None:
+                child_download.set_download_status_query(
+                    DownloadStatus.INTERRUPTED, error_message
+                )
+            elif status_code == 0:
+                child_download.set_download_status_query(
+                    DownloadStatus.COMPLETED, error_message
+                )
 
-            if key and "=" not in key:
-                args_dict[param.name] = getattr(download, key, key)
-                continue
+        return is_playlist
 
-            if param.name in func_keys:
-                val = func_keys[param.name]
-                args_val = getattr(download, val, val)
+    @staticmethod
+    def start_downloads(
+        downloads, scheduler=None, on_complete=None, collect_results: bool = True
+    ):
+        """
+        Runs downloads through the scheduler and records their results.
+
+        `downloads` may be a lazy iterable; it is consumed as slots free up.
+        `on_complete(download, error)` is called once per download after its
+        last result was recorded; `error` is None if nothing failed. Results
+        are returned unless `collect_results` is False.
+        """
+        from src.download import DownloadStatus
+        from src.progress import ProgressBuffer
+        from src.scheduler import DownloadJob, DownloadScheduler
+
+        scheduler = scheduler or DownloadScheduler()
+        progress_buffer = ProgressBuffer()
+        download_results = []
+        playlists = set()
+        errors = {}
+
+        def get_jobs():
+            for idx, download in enumerate(downloads):
+                if download.output_directory:
+                    os.makedirs(download.output_directory, exist_ok=True)
+
+                logger.info(f"Starting {download.downloader_type} download.")
+                downloader = download.downloader
+                downloader: Downloader
+
+                try:
+                    if not downloader:
+                        raise ValueError(f"Downloader not found at index {idx}!")
+                    func = downloader.get_function()
+                    download.load_resume_state()
+                    downloader_args = downloader.get_downloader_args(download, func)
+                    logger.info(f"Downloader args: \n{downloader_args}")
+
+                except Exception as e:
+                    print("Exception: ", e)
+                    if on_complete:
+                        on_complete(download, str(e))
+                    continue
 
-                if isinstance(args_val, str):
-                    if args_val.lower() == "false":
-                        args_val = False
-                    elif args_val.lower() == "true":
-                        args_val = True
+                limit_key = scheduler.get_limit_key(
+                    downloader.downloader_type, downloader.module
+                )
+                yield DownloadJob(download, func, downloader_args, limit_key)
+
+        events = scheduler.run(get_jobs(), idle_timeout=progress_buffer.interval)
+
+        try:
+            for event, download, payload in events:
+                if event == "idle":
+                    progress_buffer.flush_if_due()
+
+                elif event == "error":
+                    print("Exception: ", payload)
+                    errors[id(download)] = str(payload)
+
+                elif event == "result":
+                    if payload is None:
+                        if collect_results:
+                            download_results.append({})
+                        continue
+
+                    error = payload.get("error")
+                    if payload.get("status") == 1 or error is not None:
+                        errors[id(download)] = error or "Download failed"
+
+                    try:
+                        if Downloader.record_result(
+                            download, payload, progress_buffer
+                        ):
+                            playlists.add(id(download))
+                    except Exception as e:
+                        print("Exception: ", e)
+                        continue
+
+                    if collect_results:
+                        download_results.append(payload)
+
+                elif event == "done":
+                    # write buffered progress before the download is reported
+                    progress_buffer.flush()
+                    error = errors.pop(id(download), None)
+
+                    if id(download) in playlists:
+                        playlists.discard(id(download))
+                        download.set_download_status_query(
+                            DownloadStatus.COMPLETED
+                        )
 
-                args_dict[param.name] = args_val
-                continue
+                    if on_complete:
+                        on_complete(download, error)
+        finally:
+            # keep the latest progress of downloads cut short by an interrupt
+            progress_buffer.flush()
 
+        return download_results
+
+
+# how a downloader argument is filled in, see get_args_plan
+DEFAULT, ATTRIBUTE, FLAG = range(3)
+
+
+@lru_cache(maxsize=None)
+def load_function(module_name: str, func_name: str):
+    """
+    Imports a downloader function. Functions are loaded once per process,
+    so a custom module is only confirmed the first time it is used.
+    """
+
+    if module_name not in get_allowed_modules():
+        logger.warning(
+            "Using custom module: %s\n"
+            "This can execute arbitrary code. Proceed only if you trust it.",
+            module_name,
+        )
+        response = input("Proceed with this custom downloader? [y/N]: ").strip().lower()
+        if response not in ("y", "yes"):
+            logger.info("User cancelled loading custom module.")
+            raise ValueError("Loading of custom module cancelled by user")
+
+        logger.info("User confirmed proceeding with custom module.")
+
+    try:
+        module = import_module(module_name)
+        func = getattr(module, func_name)
+        if not callable(func):
+            raise ValueError(f"'{func_name}' is not callable in module '{module_name}'")
+        return func
+
+    except ImportError as e:
+        raise ValueError(f"Failed to import module '{module_name}': {e}")
+    except AttributeError:
+        raise ValueError(f"Function '{func_name}' not found in module '{module_name}'")
+    except Exception as e:
+        raise ValueError(f"Unexpected error loading '{module_name}.{func_name}': {e}")
+
+
+@lru_cache(maxsize=None)
+def get_args_plan(func, downloader_args: str = None) -> tuple:
+    """
+    Resolves once where each of `func`'s parameters comes from, given a
+    downloader's comma-separated `downloader_args`. Returns a tuple of
+    (param, kind, value, fallback, use_extra_args) entries, where kind is
+    DEFAULT (value is the default), ATTRIBUTE (value names a Download
+    attribute, fallback is used if the download has no such attribute)
+    or FLAG (like ATTRIBUTE, with "true" and "false" read as booleans).
+    """
+
+    import inspect
+
+    params = list(inspect.signature(func).parameters.values())
+    plan = []
+
+    if not downloader_args:
+        for param in params:
             if param.default is not inspect.Parameter.empty:
-                args_dict[param.name] = param.default
+                plan.append((param.name, DEFAULT, param.default, None, False))
             else:
-                args_dict[param.name] = getattr(download, param.name, None)
+                plan.append((param.name, ATTRIBUTE, param.name, None, False))
+        return tuple(plan)
 
-        return args_dict
+    keys = [key.strip() for key in downloader_args.split(",")]
+    func_keys = {
+        k.strip(): v.strip()
+        for k, v in (key.split("=", 1) for key in keys if "=" in key)
+    }
 
-    @staticmethod
-    def start_downloads(downloads):
-        from src.download import Download, DownloadStatus
+    for idx, param in enumerate(params):
+        key = keys[idx] if idx < len(keys) else None
 
-        download_results = []
+        if key and "=" not in key:
+            plan.append((param.name, ATTRIBUTE, key, key, True))
+        elif param.name in func_keys:
+            value = func_keys[param.name]
+            plan.append((param.name, FLAG, value, value, True))
+        elif param.default is not inspect.Parameter.empty:
+            plan.append((param.name, DEFAULT, param.default, None, True))
+        else:
+            plan.append((param.name, ATTRIBUTE, param.name, None, True))
 
-        for idx, download in enumerate(downloads):
-            if download.output_directory:
-                os.makedirs(download.output_directory, exist_ok=True)
+    return tuple(plan)
 
-            logger.info(f"Starting {download.downloader_type} download.")
-            downloader = download.downloader
-            downloader: Downloader
-            is_playlist = False
 
-            try:
-                if not downloader:
-                    raise ValueError(f"Downloader not found at index {idx}!")
-                func = downloader.get_function()
-                downloader_args = downloader.get_downloader_args(download, func)
-                logger.info(f"Downloader args: \n{downloader_args}")
+def apply_args_plan(plan: tuple, download, extra_args: dict = None) -> dict:
+    """Builds a download's arguments from a plan made by get_args_plan."""
 
-                result_iter = func(**downloader_args)
+    extra_args = extra_args or {}
+    args_dict = {}
 
-                if result_iter is None:
-                    download_results.append({})
-                    continue
-                if isinstance(result_iter, (str, dict)):
-                    result_iter = [result_iter]
-                elif isinstance(result_iter, Iterable):
-                    pass
-                else:
-                    result_iter = [result_iter]
-
-                is_playlist = False
-
-                for result in result_iter:
-                    source_url = None
-                    if not isinstance(result, dict):
-                        result = {"url": download.url, "stdout": result, "status": 0}
-
-                    url = result.get("url", download.url)
-                    status_code = result.get("status", 1)
-                    error_message = result.get("error")
-                    source_url = result.get("source_url")
-                    progress = result.get("progress")
-
-                    downloader_type = download.downloader_type
-                    output_directory = download.output_directory
-                    output_filename = result.get(
-                        "output_filename", download.output_filename
-                    )
-
-                    if result.get("is_playlist") is True:
-                        is_playlist = True
-                        source_url = source_url
-
-                    child_download = Download(
-                        url,
-                        downloader_type,
-                        output_directory=output_directory,
-                        output_filename=output_filename,
-                        source_url=source_url,
-                    )
-                    logger.info(f"OUTPUT PATH: {child_download.output_path}")
-
-                    filter_condition = (
-                        f"url = {child_download.url} AND "
-                        f"downloader_type = {child_download.downloader_type} AND "
-                        f"output_path = {child_download.output_path}"
-                    )
-
-                    # logger.info(filter_condition)
-
-                    if progress is not None:
-                        child_download.progress = progress
-                        child_download.set_progress_query(progress, filter_condition)
-
-                    child_download.upsert(filter_condition)
-
-                    if status_code == 1 or error_message is not None:
-                        child_download.set_download_status_query(
-                            DownloadStatus.INTERRUPTED, error_message
-                        )
-                    elif status_code == 0:
-                        child_download.set_download_status_query(
-                            DownloadStatus.COMPLETED, error_message
-                        )
+    for name, kind, value, fallback, use_extra_args in plan:
+        if use_extra_args and name in extra_args:
+            args_dict[name] = extra_args[name]
+            continue
 
-                    download_results.append(result)
+        if kind == DEFAULT:
+            args_dict[name] = value
+            continue
 
-            except Exception as e:
-                print("Exception: ", e)
-                continue
+        arg = getattr(download, value, fallback)
 
-        if is_playlist:
-            download.set_download_status_query(DownloadStatus.COMPLETED)
+        if kind == FLAG and isinstance(arg, str):
+            if arg.lower() == "false":
+                arg = False
+            elif arg.lower() == "true":
+                arg = True
 
-        return download_results
+        args_dict[name] = arg
+
+    return args_dict
+
+
+class DownloaderRegistry:
+    """
+    Process-wide cache of the downloaders table, so looking a downloader up
+    is a dict hit. The table is read again once `PRAGMA data_version` shows
+    another connection committed, checked at most every `check_interval`
+    seconds, or right away after this process writes a downloader.
+    """
+
+    def __init__(self, db_path: str, check_interval: float = None):
+        if check_interval is None:
+            check_interval = get_setting("DOWNLOADER_CHECK_INTERVAL", "1")
+
+        self.db_path = db_path
+        self.check_interval = float(check_interval)
+        self.lock = threading.Lock()
+        self.conn = None
+        self.downloaders = None
+        self.data_version = None
+        self.last_check = 0.0
+
+    def invalidate(self):
+        self.downloaders = None
+
+    def get_downloaders(self) -> dict:
+        """Returns the downloaders by type."""
+
+        downloaders = self.downloaders
+        if (
+            downloaders is not None
+            and time.monotonic() - self.last_check < self.check_interval
+        ):
+            return downloaders
+
+        # outside the lock: a new database's default downloaders are written
+        # (and looked up) by the initializer
+        init_database(self.db_path)
+
+        with self.lock:
+            if self.conn is None:
+                # a connection of its own: data_version ignores its own commits
+                self.conn = create_connection(self.db_path, check_same_thread=False)
+
+            data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+            if self.downloaders is None or data_version != self.data_version:
+                downloaders = select_items(self.conn, "downloaders", None, Downloader)
+                self.downloaders = {d.downloader_type: d for d in downloaders}
+                self.data_version = data_version
+
+            self.last_check = time.monotonic()
+            return self.downloaders
+
+    def get(self, downloader_type: str):
+        return self.get_downloaders().get(downloader_type)
+
+    def get_types(self) -> list:
+        return list(self.get_downloaders())
+
+
+registry = DownloaderRegistry(database_path)
+
+
+def write_completion_index():
+    """
+    Writes the downloader types, settings keys and recent output directories
+    that shell completion answers from (see src.completion).
+    """
+
+    from .completion import write_index
+
+    rows = Downloader().conn.execute(
+        "SELECT output_directory FROM downloads WHERE output_directory != '' "
+        "ORDER BY start_date DESC LIMIT ?",
+        (RECENT_OUTPUT_DIRECTORIES * 10,),
+    )
+    directories = list(dict.fromkeys(row[0] for row in rows))
+
+    try:
+        write_index(
+            downloader_types=[t for t in registry.get_types() if t],
+            settings=list(all_settings()),
+            output_directories=directories[:RECENT_OUTPUT_DIRECTORIES],
+        )
+    except OSError as e:
+        logger.warning(f"Could not write the completion index: {e}")
+
+
+def downloaders_changed():
+    registry.invalidate()
+    write_completion_index()
 
 
 default_downloaders = [
@@ -398,13 +601,20 @@ default_downloaders = [
         None,
         "downloaders.wget",
         "download",
-        "url, output_directory, output_filename, proxy=proxy",
+        "url, output_directory, output_filename, proxy=proxy, etag=etag, last_modified=last_modified, bytes_received=bytes_received",
     ),
     Downloader(
         "urllib",
         None,
         "downloaders.url_lib",
         "download",
+        "url, output_directory, output_filename, proxy=proxy, etag=etag, last_modified=last_modified, bytes_received=bytes_received",
+    ),
+    Downloader(
+        "async_http",
+        None,
+        "downloaders.async_http",
+        "download",
         "url, output_directory, output_filename, proxy=proxy",
     ),
     Downloader(
@@ -493,14 +703,25 @@ default_downloaders = [
     ),
 ]
 
-if not db_exists:
-    Downloader.reset_all(default_downloaders)
+
+def setup_database(db_path: str):
+    """Creates the tables, and the default downloaders of a new database."""
+
+    conn = create_connection(db_path)
+    new_database = not table_exists(conn, "downloaders")
+    conn.close()
+    create_db(db_path).close()
+
+    if new_database:
+        Downloader.reset_all(default_downloaders)
+
+
+# nothing touches the database until a command first needs it
+set_initializer(database_path, setup_database)
 
 
 def get_downloader_types():
-    downloader_types = [
-        downloader.downloader_type for downloader in Downloader().select_all()
-    ]
+    downloader_types = registry.get_types()
     downloader_types.append("")
     downloader_types.append(None)
     return downloader_types
@@ -570,6 +791,8 @@ def downloader_action(
 
 
 def complete_downloader_type(prefix, parsed_args, **kwargs):
+    # only reached without an index, e.g. for a database older than it
+    write_completion_index()
     return [t for t in get_downloader_types() if t and t.startswith(prefix)]
 
 
@@ -0,0 +1,201 @@
+from contextlib import contextmanager
+import threading
+import time
+from urllib.parse import urlparse
+from .settings import get_setting
+
+
+class TokenBucket:
+    """Thread-safe token bucket. A rate of 0 disables it."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = float(rate or 0)
+        self.capacity = float(
+            capacity if capacity is not None else max(self.rate, 1)
+        )
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount: float = 1) -> float:
+        """Takes `amount` tokens and returns how long to wait before using them."""
+
+        if self.rate <= 0:
+            return 0
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= amount
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+
+    def consume(self, amount: float = 1) -> float:
+        """Takes `amount` tokens, sleeping until they are available."""
+
+        wait = self.reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class HostLimit:
+    def __init__(
+        self,
+        max_connections: int = 0,
+        requests_per_second: float = 0,
+        bytes_per_second: float = 0,
+    ):
+        self.max_connections = int(max_connections or 0)
+        self.requests_per_second = float(requests_per_second or 0)
+        self.bytes_per_second = float(bytes_per_second or 0)
+        self.semaphore = (
+            threading.BoundedSemaphore(self.max_connections)
+            if self.max_connections > 0
+            else None
+        )
+        self.requests = TokenBucket(self.requests_per_second)
+        self.bytes = TokenBucket(self.bytes_per_second)
+
+    def try_acquire(self) -> bool:
+        """Takes a connection slot if one is free; always succeeds without a limit."""
+        return self.semaphore.acquire(blocking=False) if self.semaphore else True
+
+    def release(self):
+        if self.semaphore:
+            self.semaphore.release()
+
+    def connection_rate(self) -> int:
+        """Bytes/sec for backends that can only take a fixed per-connection cap."""
+
+        if self.bytes_per_second <= 0:
+            return 0
+        return int(self.bytes_per_second / max(self.max_connections, 1))
+
+
+class HostSlot:
+    def __init__(self, host: str, limit: HostLimit):
+        self.host = host
+        self.limit = limit
+
+    def throttle(self, nbytes: int):
+        """Accounts for `nbytes` transferred, sleeping if the byte rate is exceeded."""
+        self.limit.bytes.consume(nbytes)
+
+    @property
+    def rate_limit(self) -> int:
+        return self.limit.connection_rate()
+
+
+def get_host(url: str) -> str:
+    host = (urlparse(url).hostname or "").lower()
+    return host.removeprefix("www.")
+
+
+def parse_host_limits(value: str) -> dict:
+    """Parses 'youtube.com=2:0.5:0,example.com=8' into {host: (connections, rps, bps)}."""
+
+    limits = {}
+
+    if not value:
+        return limits
+
+    for pair in value.split(","):
+        if "=" not in pair:
+            continue
+
+        host, spec = pair.split("=", 1)
+        parts = [p.strip() for p in spec.split(":")]
+        parts += [None] * (3 - len(parts))
+        limits[host.strip().lower().removeprefix("www.")] = tuple(parts[:3])
+
+    return limits
+
+
+class HostLimiter:
+    """
+    Per-hostname limiter with a max-in-flight count and token buckets for
+    requests/sec and bytes/sec.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 0,
+        requests_per_second: float = 0,
+        bytes_per_second: float = 0,
+        host_limits: dict = None,
+    ):
+        self.defaults = (max_connections, requests_per_second, bytes_per_second)
+        self.host_limits = host_limits or {}
+        self.limits = {}
+        self.lock = threading.Lock()
+
+    def get_limit(self, host: str) -> HostLimit:
+        with self.lock:
+            limit = self.limits.get(host)
+
+            if limit is None:
+                spec = self.host_limits.get(host)
+                if spec is None:
+                    # subdomains share their parent's limit (e.g. m.youtube.com)
+                    spec = next(
+                        (
+                            v
+                            for k, v in self.host_limits.items()
+                            if host.endswith(f".{k}")
+                        ),
+                        (),
+                    )
+                args = [
+                    value if value not in (None, "") else default
+                    for value, default in zip(
+                        list(spec) + [None] * (3 - len(spec)), self.defaults
+                    )
+                ]
+                limit = HostLimit(*args)
+                self.limits[host] = limit
+
+            return limit
+
+    @contextmanager
+    def slot(self, url: str):
+        """Holds one of the host's connection slots and waits for a request token."""
+
+        host = get_host(url)
+        limit = self.get_limit(host)
+
+        if limit.semaphore:
+            limit.semaphore.acquire()
+
+        try:
+            limit.requests.consume()
+            yield HostSlot(host, limit)
+        finally:
+            if limit.semaphore:
+                limit.semaphore.release()
+
+
+_host_limiter = None
+_host_limiter_lock = threading.Lock()
+
+
+def get_host_limiter() -> HostLimiter:
+    """Returns the process-wide limiter configured from settings."""
+
+    global _host_limiter
+
+    with _host_limiter_lock:
+        if _host_limiter is None:
+            _host_limiter = HostLimiter(
+                get_setting("HOST_MAX_CONNECTIONS", "4"),
+                get_setting("HOST_REQUESTS_PER_SECOND", "0"),
+                get_setting("HOST_BYTES_PER_SECOND", "0"),
+                parse_host_limits(get_setting("HOST_LIMITS", "")),
+            )
+        return _host_limiter
+
+
+def host_slot(url: str):
+    return get_host_limiter().slot(url)
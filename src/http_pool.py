@@ -0,0 +1,91 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+import urllib3
+from urllib3.contrib.socks import SOCKSProxyManager
+from utils import str_to_bool
+from .settings import get_setting
+
+# connection pools are shared by every download in the process, so batches
+# from the same host reuse connections instead of handshaking for each file
+_pool_managers = {}
+_sessions = {}
+_lock = threading.Lock()
+
+
+def get_pool_key(proxy: str = None, headers: dict = None) -> tuple:
+    return (proxy or None, tuple(sorted((headers or {}).items())))
+
+
+def get_pool_size() -> int:
+    return max(1, int(get_setting("HTTP_POOL_SIZE", "16")))
+
+
+def get_pool_headers(headers: dict = None) -> dict:
+    headers = dict(headers or {})
+
+    if not str_to_bool(get_setting("HTTP_KEEP_ALIVE", "1")):
+        headers["Connection"] = "close"
+
+    return headers
+
+
+def create_pool_manager(proxy: str = None, headers: dict = None, maxsize: int = 1):
+    if not proxy:
+        return urllib3.PoolManager(headers=headers, maxsize=maxsize)
+
+    if proxy.startswith("socks"):
+        return SOCKSProxyManager(proxy_url=proxy, headers=headers, maxsize=maxsize)
+
+    return urllib3.ProxyManager(proxy_url=proxy, headers=headers, maxsize=maxsize)
+
+
+def get_pool_manager(proxy: str = None, headers: dict = None):
+    """Returns the process-wide urllib3 pool manager for a proxy and headers."""
+
+    headers = get_pool_headers(headers)
+    key = get_pool_key(proxy, headers)
+
+    with _lock:
+        http = _pool_managers.get(key)
+        if http is None:
+            http = create_pool_manager(proxy, headers, get_pool_size())
+            _pool_managers[key] = http
+        return http
+
+
+def get_session(proxy: str = None, headers: dict = None) -> requests.Session:
+    """Returns the process-wide requests session for a proxy and headers."""
+
+    headers = get_pool_headers(headers)
+    key = get_pool_key(proxy, headers)
+
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(headers)
+
+            if proxy:
+                session.proxies = {"http": proxy, "https": proxy}
+
+            pool_size = get_pool_size()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[key] = session
+
+        return session
+
+
+def clear_pools():
+    """Closes every shared pool, e.g. after the settings changed."""
+
+    with _lock:
+        for http in _pool_managers.values():
+            http.clear()
+        for session in _sessions.values():
+            session.close()
+
+        _pool_managers.clear()
+        _sessions.clear()
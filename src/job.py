@@ -0,0 +1,264 @@
+from datetime import datetime
+from enum import Enum
+import json
+import sqlite3
+import time
+from utils.sqlite import map_sqlite_results_to_objects, transaction
+from utils.sqlite_item import SQLiteItem
+from utils.sqlite_query import where
+from utils.sqlite_conn import job_values
+from .downloader import database_path, logger
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class Job(SQLiteItem):
+    """A queued download, claimed by `udown worker` processes through a lease."""
+
+    def __init__(
+        self,
+        id: int = None,
+        url: str = None,
+        downloader_type: str = None,
+        output_directory: str = None,
+        output_filename: str = None,
+        proxy: str = None,
+        extra_args: dict = None,
+        priority: int = 0,
+        attempts: int = 0,
+        max_attempts: int = 3,
+        job_status: JobStatus = JobStatus.QUEUED,
+        lease_owner: str = None,
+        lease_expiry: float = None,
+        created_date: str = None,
+        error: str = None,
+        not_before: float = None,
+    ):
+        column_names = [
+            "url",
+            "downloader_type",
+            "output_directory",
+            "output_filename",
+            "proxy",
+            "extra_args",
+            "priority",
+            "attempts",
+            "max_attempts",
+            "job_status",
+            "lease_owner",
+            "lease_expiry",
+            "created_date",
+            "error",
+            "not_before",
+        ]
+        super().__init__(job_values, column_names, db_path=database_path)
+        self.id = id
+        self.url = url
+        self.downloader_type = downloader_type
+        self.output_directory = output_directory
+        self.output_filename = output_filename
+        self.proxy = proxy
+        self.extra_args = extra_args
+        self.priority = priority
+        self.attempts = attempts
+        self.max_attempts = max_attempts
+        self.job_status = (
+            job_status.value if isinstance(job_status, Enum) else job_status
+        )
+        self.lease_owner = lease_owner
+        self.lease_expiry = lease_expiry
+        self.created_date = created_date or str(datetime.now())
+        self.error = error
+        self.not_before = not_before
+        self.table_name = "jobs"
+        self.filter_condition = where(id=self.id)
+
+    @classmethod
+    def from_download(cls, download, priority: int = 0, max_attempts: int = 3):
+        # rows read back keep their JSON text; no need to decode and re-encode it
+        extra_args = download._extra_args
+        if extra_args and not isinstance(extra_args, str):
+            extra_args = json.dumps(extra_args)
+
+        return cls(
+            url=download.url,
+            downloader_type=download.downloader_type,
+            output_directory=download._output_directory,
+            output_filename=download.output_filename,
+            proxy=download.proxy,
+            extra_args=extra_args or None,
+            priority=priority,
+            max_attempts=max_attempts,
+        )
+
+    def to_download(self):
+        from .download import Download
+
+        return Download(
+            self.url,
+            self.downloader_type,
+            output_directory=self.output_directory,
+            output_filename=self.output_filename,
+            proxy=self.proxy,
+            extra_args=self.extra_args,
+        )
+
+
+def enqueue_jobs(conn: sqlite3.Connection, jobs: list) -> int:
+    """Inserts jobs in a single transaction."""
+
+    column_names = jobs[0].column_names if jobs else []
+    placeholders = ", ".join(["?"] * len(column_names))
+    query = (
+        f"INSERT INTO jobs ({', '.join(column_names)}) VALUES ({placeholders})"
+    )
+
+    with transaction(conn):
+        conn.executemany(query, (job.get_object_values() for job in jobs))
+
+    logger.info(f"Enqueued {len(jobs)} job(s).")
+    return len(jobs)
+
+
+def requeue_unfinished(
+    conn: sqlite3.Connection, priority: int = 0, stale_after: float = 300
+) -> int:
+    """
+    Enqueues downloads left started or interrupted, e.g. by a crash or a
+    restart, unless a job for them is already queued, running or failed.
+    Their .part files are continued where the downloader supports it.
+
+    Only downloads started more than `stale_after` seconds ago are queued, so
+    one a foreground `udown download` is still writing isn't picked up twice.
+    """
+    from .download import Download, DownloadStatus
+
+    rows = conn.execute(
+        "SELECT * FROM downloads d WHERE d.download_status IN (?, ?) AND "
+        "(d.start_date IS NULL OR d.start_date < ?) AND NOT EXISTS "
+        "(SELECT 1 FROM jobs j WHERE j.url = d.url AND "
+        "j.downloader_type = d.downloader_type AND j.job_status IN (?, ?, ?))",
+        (
+            DownloadStatus.STARTED.value,
+            DownloadStatus.INTERRUPTED.value,
+            time.time() - stale_after,
+            JobStatus.QUEUED.value,
+            JobStatus.RUNNING.value,
+            JobStatus.FAILED.value,
+        ),
+    ).fetchall()
+
+    downloads = map_sqlite_results_to_objects(rows, Download)
+    jobs = [Job.from_download(download, priority) for download in downloads]
+
+    if not jobs:
+        return 0
+
+    logger.info(f"Resuming {len(jobs)} unfinished download(s).")
+    return enqueue_jobs(conn, jobs)
+
+
+def claim_jobs(
+    conn: sqlite3.Connection, owner: str, limit: int = 1, lease_seconds: float = 300
+) -> list:
+    """
+    Atomically leases up to `limit` runnable jobs to `owner`.
+
+    Runnable jobs are queued ones whose retry delay has passed and running
+    ones whose lease has expired (e.g. their worker crashed). Expired jobs
+    without attempts left are marked failed. BEGIN IMMEDIATE takes the write
+    lock before selecting, so concurrent workers never claim the same row.
+    """
+
+    now = time.time()
+
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "UPDATE jobs SET job_status = ?, lease_owner = NULL, lease_expiry = NULL, "
+            "error = COALESCE(error, 'Lease expired') WHERE job_status = ? AND "
+            "lease_expiry < ? AND attempts >= max_attempts",
+            (JobStatus.FAILED.value, JobStatus.RUNNING.value, now),
+        )
+        rows = conn.execute(
+            "SELECT * FROM jobs WHERE attempts < max_attempts AND "
+            "((job_status = ? AND (not_before IS NULL OR not_before <= ?)) OR "
+            "(job_status = ? AND lease_expiry < ?)) "
+            "ORDER BY priority DESC, id LIMIT ?",
+            (JobStatus.QUEUED.value, now, JobStatus.RUNNING.value, now, limit),
+        ).fetchall()
+
+        ids = [row[0] for row in rows]
+        if ids:
+            conn.execute(
+                f"UPDATE jobs SET job_status = ?, lease_owner = ?, lease_expiry = ?, "
+                f"attempts = attempts + 1 WHERE id IN ({', '.join(['?'] * len(ids))})",
+                (JobStatus.RUNNING.value, owner, now + lease_seconds, *ids),
+            )
+        conn.commit()
+
+    except sqlite3.Error as e:
+        conn.rollback()
+        logger.error(f"Failed to claim jobs: {e}")
+        return []
+
+    jobs = [Job(*row) for row in rows]
+    for job in jobs:
+        job.job_status = JobStatus.RUNNING.value
+        job.lease_owner = owner
+        job.attempts += 1
+
+    return jobs
+
+
+def renew_leases(
+    conn: sqlite3.Connection, owner: str, ids: list, lease_seconds: float = 300
+):
+    """Extends the lease of jobs still held by `owner`."""
+
+    if not ids:
+        return
+
+    with conn:
+        conn.execute(
+            f"UPDATE jobs SET lease_expiry = ? WHERE lease_owner = ? AND "
+            f"job_status = ? AND id IN ({', '.join(['?'] * len(ids))})",
+            (time.time() + lease_seconds, owner, JobStatus.RUNNING.value, *ids),
+        )
+
+
+def finish_job(
+    conn: sqlite3.Connection, job: Job, error: str = None, retry_delay: float = 0
+):
+    """
+    Marks a job completed, or requeues it (failed once attempts run out).
+    Requeued jobs aren't claimed again for `retry_delay` seconds, doubled
+    for every attempt already made.
+    """
+
+    not_before = None
+    if error is None:
+        status = JobStatus.COMPLETED
+    elif job.attempts < job.max_attempts:
+        status = JobStatus.QUEUED
+        if retry_delay:
+            not_before = time.time() + retry_delay * 2 ** max(job.attempts - 1, 0)
+    else:
+        status = JobStatus.FAILED
+
+    with conn:
+        conn.execute(
+            "UPDATE jobs SET job_status = ?, lease_owner = NULL, lease_expiry = NULL, "
+            "error = ?, not_before = ? WHERE id = ? AND lease_owner = ?",
+            (status.value, error, not_before, job.id, job.lease_owner),
+        )
+
+    job.job_status = status.value
+    job.error = error
+    job.not_before = not_before
+    return status
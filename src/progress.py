@@ -0,0 +1,47 @@
+import time
+from .settings import get_setting
+
+
+def get_download_key(download) -> tuple:
+    return (download.url, download.downloader_type, download.output_path)
+
+
+class ProgressBuffer:
+    """
+    Keeps the latest progress row of each download in memory and writes them
+    all in one transaction at most every `interval` seconds, so the database
+    write rate doesn't grow with the number of downloads or progress ticks.
+
+    Only used from the thread that records results.
+    """
+
+    def __init__(self, interval: float = None):
+        if interval is None:
+            interval = get_setting("PROGRESS_FLUSH_INTERVAL", "0.5")
+
+        self.interval = float(interval)
+        self.pending = {}
+        self.last_flush = time.monotonic()
+
+    def add(self, download):
+        """Buffers `download`, replacing any earlier row for the same file."""
+
+        self.pending[get_download_key(download)] = download
+        self.flush_if_due()
+
+    def discard(self, download):
+        """Drops a buffered row that a newer write supersedes."""
+        self.pending.pop(get_download_key(download), None)
+
+    def flush_if_due(self):
+        if time.monotonic() - self.last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            return
+
+        downloads = list(self.pending.values())
+        self.pending.clear()
+        type(downloads[0]).upsert_all(downloads)
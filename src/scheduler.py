@@ -0,0 +1,308 @@
+from collections import deque
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
+from .settings import get_setting
+from utils.logger import LazyLogger
+
+logger = LazyLogger(name="scheduler", log_dir="/udown/scheduler")
+
+# per-type limits are shared by every scheduler in the process, so nested
+# batches (e.g. ytdlp_channel -> ytdlp) still respect them; a scheduler
+# configured with another limit for a type gets a semaphore of its own
+_type_semaphores = {}
+_type_semaphores_lock = threading.Lock()
+
+# notified when a type slot is released, for schedulers waiting on one
+_type_released = threading.Condition(_type_semaphores_lock)
+_type_releases = 0
+
+# the type slot held by the job running on each worker thread
+_job_local = threading.local()
+
+
+def parse_concurrency_limits(value: str | dict = None) -> dict:
+    """Parses 'wget=8,ytdlp=3' into {'wget': 8, 'ytdlp': 3}."""
+
+    if isinstance(value, dict):
+        return {k: int(v) for k, v in value.items()}
+
+    limits = {}
+
+    if not value:
+        return limits
+
+    for pair in value.split(","):
+        if "=" not in pair:
+            continue
+
+        key, limit = pair.split("=", 1)
+        try:
+            limits[key.strip()] = max(1, int(limit.strip()))
+        except ValueError:
+            logger.warning(f"Invalid concurrency limit: '{pair.strip()}'")
+
+    return limits
+
+
+def get_type_semaphore(key: str, limit: int) -> threading.BoundedSemaphore:
+    with _type_semaphores_lock:
+        semaphore = _type_semaphores.get((key, limit))
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(limit)
+            _type_semaphores[(key, limit)] = semaphore
+        return semaphore
+
+
+def get_type_releases() -> int:
+    with _type_semaphores_lock:
+        return _type_releases
+
+
+def release_type_semaphore(semaphore: threading.BoundedSemaphore):
+    global _type_releases
+
+    semaphore.release()
+    with _type_released:
+        _type_releases += 1
+        _type_released.notify_all()
+
+
+def get_job_semaphore() -> threading.BoundedSemaphore | None:
+    """
+    Returns the type semaphore held by the job running on this thread, so a
+    downloader running several transfers at once can take a slot for each
+    transfer past the first. None outside a scheduler or without a limit.
+    """
+
+    return getattr(_job_local, "semaphore", None)
+
+
+def wait_for_type_release(seen: int, timeout: float = None) -> bool:
+    """
+    Waits until a type slot is released after `seen` releases were counted.
+    Returns False if `timeout` passed first.
+    """
+
+    with _type_released:
+        return _type_released.wait_for(lambda: _type_releases != seen, timeout)
+
+
+class DownloadJob:
+    def __init__(self, download, func, kwargs: dict, limit_key: str = None):
+        self.download = download
+        self.func = func
+        self.kwargs = kwargs
+        self.limit_key = limit_key
+        self.semaphore = None
+
+
+class DownloadScheduler:
+    """
+    Runs download jobs on a bounded thread pool.
+
+    Results are handed back to the calling thread through `run`, so all
+    database writes stay on the thread that started the batch.
+    """
+
+    def __init__(self, max_workers: int = None, type_limits: str | dict = None):
+        if max_workers is None:
+            max_workers = get_setting("MAX_CONCURRENT_DOWNLOADS", "4")
+        if type_limits is None:
+            type_limits = get_setting("DOWNLOADER_CONCURRENCY", "")
+
+        self.max_workers = max(1, int(max_workers))
+        self.type_limits = parse_concurrency_limits(type_limits)
+        self.max_pending = self.max_workers * 2
+        # jobs held back by a saturated type limit don't count as pending, so
+        # jobs of other types behind them still run; bounded all the same
+        self.max_blocked = self.max_pending * 16
+
+    def get_limit_key(self, downloader_type: str, module: str = None):
+        """Returns the key whose per-type limit applies to a downloader."""
+
+        if downloader_type in self.type_limits:
+            return downloader_type
+
+        module_name = module.strip().rsplit(".", 1)[-1] if module else None
+        if module_name in self.type_limits:
+            return module_name
+
+        return None
+
+    def _try_acquire(self, job: DownloadJob) -> bool:
+        if job.limit_key is None:
+            return True
+
+        semaphore = get_type_semaphore(
+            job.limit_key, self.type_limits.get(job.limit_key, 1)
+        )
+        if not semaphore.acquire(blocking=False):
+            return False
+
+        job.semaphore = semaphore
+        return True
+
+    def _release(self, job: DownloadJob):
+        if job.semaphore is not None:
+            release_type_semaphore(job.semaphore)
+            job.semaphore = None
+
+    def _work(self, job: DownloadJob, events: queue.Queue):
+        _job_local.semaphore = job.semaphore
+
+        try:
+            result_iter = job.func(**job.kwargs)
+
+            if result_iter is None:
+                events.put(("result", job.download, None))
+                return
+
+            if isinstance(result_iter, (str, dict)) or not isinstance(
+                result_iter, Iterable
+            ):
+                result_iter = [result_iter]
+
+            for result in result_iter:
+                if not isinstance(result, dict):
+                    result = {
+                        "url": job.download.url,
+                        "stdout": result,
+                        "status": 0,
+                    }
+                events.put(("result", job.download, result))
+
+        except Exception as e:
+            events.put(("error", job.download, e))
+
+        finally:
+            _job_local.semaphore = None
+            self._release(job)
+            events.put(("done", job.download, None))
+
+    def run(self, jobs: Iterable, idle_timeout: float = None):
+        """
+        Schedules jobs and yields (event, download, payload) tuples as they happen.
+
+        `event` is one of "result", "error" or "done". Jobs are pulled from
+        the iterable lazily, so at most `max_pending` of them are held at once,
+        plus up to `max_blocked` waiting for a type limit that is saturated.
+        With `idle_timeout`, ("idle", None, None) is yielded whenever no event
+        arrived for that many seconds.
+
+        If the iterable raises, no more jobs are pulled from it and the error is
+        re-raised once the jobs already pulled have finished and their events
+        have been yielded.
+        """
+
+        jobs = iter(jobs)
+        events = queue.Queue()
+        # (sequence, job) pairs in arrival order, per limit key
+        waiting = {}
+        # limit keys whose next job couldn't get a slot
+        blocked = set()
+        pulled = 0
+        exhausted = False
+        jobs_error = None
+        running = 0
+
+        executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="udown"
+        )
+
+        def count_waiting(blocked_keys: bool) -> int:
+            return sum(
+                len(queued)
+                for key, queued in waiting.items()
+                if (key in blocked) == blocked_keys
+            )
+
+        def pull_jobs() -> int:
+            nonlocal pulled, exhausted, jobs_error
+            count = 0
+
+            while (
+                not exhausted
+                and running + count_waiting(False) < self.max_pending
+                and count_waiting(True) < self.max_blocked
+            ):
+                try:
+                    job = next(jobs)
+                except StopIteration:
+                    exhausted = True
+                    break
+                except Exception as e:
+                    exhausted = True
+                    jobs_error = e
+                    break
+
+                waiting.setdefault(job.limit_key, deque()).append((pulled, job))
+                pulled += 1
+                count += 1
+
+            return count
+
+        def submit_ready():
+            nonlocal running
+            blocked.clear()
+
+            while running < self.max_workers:
+                # the earliest job whose limit may still have a free slot
+                heads = [
+                    queued[0] for key, queued in waiting.items() if key not in blocked
+                ]
+                if not heads:
+                    return
+
+                _, job = min(heads, key=lambda head: head[0])
+                if not self._try_acquire(job):
+                    blocked.add(job.limit_key)
+                    continue
+
+                queued = waiting[job.limit_key]
+                queued.popleft()
+                if not queued:
+                    del waiting[job.limit_key]
+
+                running += 1
+                executor.submit(self._work, job, events)
+
+        try:
+            while True:
+                releases = get_type_releases()
+
+                # jobs found blocked make room to pull the ones behind them
+                while True:
+                    pulled_now = pull_jobs()
+                    submit_ready()
+                    if not pulled_now:
+                        break
+
+                if exhausted and not running and not waiting and events.empty():
+                    break
+
+                if not running and events.empty():
+                    # every waiting job is blocked by a limit held elsewhere
+                    if not wait_for_type_release(releases, idle_timeout):
+                        yield ("idle", None, None)
+                    continue
+
+                try:
+                    event = events.get(timeout=idle_timeout)
+                except queue.Empty:
+                    yield ("idle", None, None)
+                    continue
+
+                if event[0] == "done":
+                    running -= 1
+                yield event
+
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+        executor.shutdown(wait=True)
+
+        if jobs_error:
+            raise jobs_error
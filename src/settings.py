@@ -1,21 +1,23 @@
-import ast
+from functools import lru_cache
 import os
-import re
 from shutil import copy
 
-from utils import str_to_bool
-
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
 DOWNLOADER_DIR = os.path.join(PROJECT_DIR, "downloaders")
 DOWNLOADER_METADATA_DIR = os.path.join(DOWNLOADER_DIR, "metadata")
 CONFIG_PATH = os.path.join(PROJECT_DIR, "src", ".config")
 DEFAULT_CONFIG_PATH = os.path.join(PROJECT_DIR, "src", ".default")
-ALLOWED_MODULES = [
-    f"downloaders.{module[:-3]}"
-    for module in os.listdir(DOWNLOADER_DIR)
-    if module.endswith(".py")
-]
+
+
+@lru_cache(maxsize=None)
+def get_allowed_modules() -> tuple:
+    """Returns the bundled downloader modules, listed the first time they're needed."""
+    return tuple(
+        f"downloaders.{module[:-3]}"
+        for module in os.listdir(DOWNLOADER_DIR)
+        if module.endswith(".py")
+    )
 
 
 def _load_raw_config():
@@ -80,6 +82,10 @@ def get_setting(key=None, default=None):
     return value
 
 
+def get_database_path() -> str:
+    return get_setting("DATABASE_PATH", os.path.join(PROJECT_DIR, "downloads.db"))
+
+
 def set_setting(key, value):
     global _config_cache
 
@@ -93,10 +99,17 @@ def set_setting(key, value):
 
 
 def reset_settings():
+    global _config_cache
+
     try:
         copy(DEFAULT_CONFIG_PATH, CONFIG_PATH)
+        _config_cache = None
         print("Successfully reset all settings.")
 
+        from .completion import write_index
+
+        write_index(settings=list(all_settings()))
+
     except Exception as e:
         print(e)
 
@@ -129,7 +142,13 @@ def settings_action(
         return settings
 
 
+def complete_setting_key(prefix, parsed_args, **kwargs):
+    return [key for key in all_settings() if key.startswith(prefix)]
+
+
 def settings_command(subparsers):
+    from utils import str_to_bool
+
     settings_cmd = subparsers.add_parser("settings", help="List settings")
 
     settings_cmd.add_argument(
@@ -139,7 +158,8 @@ def settings_command(subparsers):
         default="list",
         nargs="?",
     )
-    settings_cmd.add_argument("key", type=str, default=None, nargs="?")
+    key_arg = settings_cmd.add_argument("key", type=str, default=None, nargs="?")
+    key_arg.completer = complete_setting_key
     settings_cmd.add_argument("value", type=str, default=None, nargs="?")
     settings_cmd.add_argument(
         "-ui", "--ui", default=get_setting("USE_TUI", True), type=str_to_bool
@@ -23,7 +23,7 @@ class DownloaderDetails(ModalScreen):
         table = self.query_one("#details", DataTable)
         table.add_columns("Field", "Value")
 
-        for key, value in self.downloader.as_dict().items():
+        for key, value in self.downloader.display_dict().items():
             table.add_row(
                 key,
                 "" if value is None else str(value),
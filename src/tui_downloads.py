@@ -1,6 +1,8 @@
+from itertools import islice
 from textual.widgets import DataTable, Header, Footer
 from textual import events
 from textual.screen import ModalScreen
+from .settings import get_setting
 from .tui_common import (
     ConfirmModal,
     DownloadConfirmed,
@@ -8,6 +10,9 @@ from .tui_common import (
     btn_confirm_download_caption,
 )
 
+# rows fetched whenever the cursor reaches the last loaded row
+PAGE_SIZE = int(get_setting("PAGE_SIZE", "100"))
+
 
 class DownloadDetails(ModalScreen):
     BINDINGS = [
@@ -28,7 +33,7 @@ class DownloadDetails(ModalScreen):
         table = self.query_one("#details", DataTable)
         table.add_columns("Field", "Value")
 
-        for key, value in self.download.as_dict().items():
+        for key, value in self.download.display_dict().items():
             table.add_row(
                 key,
                 "" if value is None else str(value),
@@ -51,15 +56,30 @@ class DownloadsTable(DataTable):
         ("d", "delete", "Delete"),
     ]
 
-    def __init__(self, downloads):
+    def __init__(self, downloads, search=None):
         super().__init__()
-        self.downloads = downloads
         self.row_map = {}
+        self.search_query = ""
+        # returns the downloads matching a query, read from the database
+        self.search = search
+        self.set_source(downloads)
+
+    def set_source(self, downloads):
+        # downloads may be lazy; rows are pulled a page at a time as they're shown
+        self.source = iter(downloads or [])
+        self.downloads = []
+        self.exhausted = False
 
     def set_items(self, items):
-        self.downloads = items
+        self.set_source(items)
         self.load()
 
+    def fetch_page(self) -> list:
+        page = list(islice(self.source, PAGE_SIZE))
+        self.exhausted = len(page) < PAGE_SIZE
+        self.downloads.extend(page)
+        return page
+
     def on_mount(self):
 
         self.add_columns(
@@ -71,24 +91,52 @@ class DownloadsTable(DataTable):
         self.focus()
         self.load()
 
+    def add_download(self, d, output: str):
+        self.row_map[self.row_count] = d
+        self.add_row(
+            d.url,
+            str(d.downloader_type),
+            d.download_status,
+            output,
+        )
+
     def load(self):
         self.clear()
         self.row_map.clear()
 
-        for idx, d in enumerate(self.downloads):
-            self.add_row(
-                d.url,
-                str(d.downloader_type),
-                d.download_status,
-                d.output_filename,
-            )
-            self.row_map[idx] = d
+        if not self.downloads:
+            self.fetch_page()
+
+        for d in self.downloads:
+            self.add_download(d, d.output_filename)
+
+    def load_more(self):
+        # only rows filtered in memory are a subset of the loaded pages
+        if self.exhausted or (self.search_query and self.search is None):
+            return
+
+        for d in self.fetch_page():
+            self.add_download(d, d.output_filename)
+
+    def on_data_table_row_highlighted(self, event: DataTable.RowHighlighted):
+        if event.cursor_row >= self.row_count - 1:
+            self.load_more()
 
     def apply_filter(self, query: str):
+        """
+        Shows the downloads matching `query`, searched in the database from
+        the first page on. Without a search, only the rows loaded so far are
+        filtered.
+        """
+        if self.search is not None:
+            self.search_query = query.strip()
+            self.set_items(self.search(self.search_query))
+            return
+
         self.clear()
         self.row_map.clear()
         q = query.lower().strip()
-        table_row_index = 0  # real table row index
+        self.search_query = q
 
         for d in self.downloads:
             haystack = " ".join(
@@ -103,14 +151,7 @@ class DownloadsTable(DataTable):
             )
 
             if q in haystack:
-                self.add_row(
-                    d.url,
-                    str(d.downloader_type),
-                    d.download_status,
-                    d.output_path or "",
-                )
-                self.row_map[table_row_index] = d
-                table_row_index += 1
+                self.add_download(d, d.output_path or "")
 
     def get_download(self):
         row = self.cursor_row
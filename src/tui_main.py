@@ -8,6 +8,7 @@ from .tui_downloaders import DownloadersTable
 from .tui_downloads import DownloadsTable
 from .tui_settings import SettingsTable
 from utils.logger import setup_logger
+from utils.sqlite import SQLiteRecord
 
 logger = setup_logger(name="ui", log_dir="/udown/ui")
 
@@ -73,7 +74,8 @@ class UDownApp(App):
         container = self.query_one("#table-container")
 
         if self.table_type == "download":
-            table = DownloadsTable(self.items)
+            search = self.search_items if self.action else None
+            table = DownloadsTable(self.items, search)
         elif self.table_type == "downloaders":
             table = DownloadersTable(self.items)
         elif self.table_type == "settings":
@@ -96,6 +98,12 @@ class UDownApp(App):
         if hasattr(self, "active_table"):
             self.active_table.set_items(self.items)
 
+    def search_items(self, query: str):
+        # kept in args, so refreshes and downloader changes stay filtered
+        self.args["search"] = query or None
+        self.args["ui"] = False
+        return self.action(**self.args)
+
     def action_search(self):
         search = self.query_one("#search", Input)
         search.remove_class("hidden")
@@ -141,12 +149,11 @@ class UDownApp(App):
         if not item:
             return
 
-        filter_condition = (
-            f"url = {item.url} AND downloader_type = {item.downloader_type} AND output_path = {item.output_path}"
-            if self.table_type == "download"
-            else f"downloader_type = {item.downloader_type}"
-        )
-        item.delete(filter_condition)
+        # listings hold read-only records
+        if isinstance(item, SQLiteRecord):
+            item = item.to_item()
+
+        item.delete(item.key_condition)
         self.reload_items()
 
     def on_download_confirmed(self, message):
@@ -1,4 +1,3 @@
-import subprocess
 import sys
 from src.downloader import Downloader
 from src.download import Download
@@ -17,6 +16,7 @@ default_packages = [
 
 
 def pip_upgrade(packages: list):
+    import subprocess
 
     if isinstance(packages, str):
         packages = [packages]
@@ -31,8 +31,8 @@ def pip_upgrade(packages: list):
 
 def update_action(packages=None, **args):
 
-    # get existing items before updating
-    existing_downloads = Download().select_all()
+    # get existing items before updating; history is kept as compact records
+    existing_downloads = Download().select_all(records=True)
     existing_downloaders = Downloader().select_all()
 
     # update dependencies
@@ -42,8 +42,10 @@ def update_action(packages=None, **args):
         pip_upgrade(default_packages)
 
     # reset items
-    Downloader.reset_all(existing_downloaders)
-    Download.insert_all(existing_downloads)
+    with Download().transaction():
+        Downloader.reset_all(existing_downloaders)
+        Download.insert_all(existing_downloads)
+
 
 def update_command(subparsers):
     update_cmd = subparsers.add_parser("update", help="Update udown")
@@ -0,0 +1,186 @@
+import os
+import threading
+import time
+from utils import str_to_bool
+from utils.sqlite import create_connection
+from utils.sqlite_item import init_database
+from .downloader import Downloader, database_path, logger
+from .job import claim_jobs, finish_job, renew_leases, requeue_unfinished
+from .scheduler import DownloadScheduler
+from .settings import get_setting
+
+
+def get_worker_id() -> str:
+    import socket
+
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseKeeper(threading.Thread):
+    """Periodically extends the leases of the jobs a worker is running."""
+
+    def __init__(self, owner: str, lease_seconds: float):
+        super().__init__(daemon=True)
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def add(self, key, job):
+        with self.lock:
+            self.jobs[key] = job
+
+    def pop(self, key):
+        with self.lock:
+            return self.jobs.pop(key, None)
+
+    def pop_all(self) -> list:
+        with self.lock:
+            jobs = list(self.jobs.values())
+            self.jobs.clear()
+            return jobs
+
+    def run(self):
+        conn = create_connection(database_path)
+
+        while not self.stopped.wait(self.lease_seconds / 3):
+            with self.lock:
+                ids = [job.id for job in self.jobs.values()]
+            try:
+                renew_leases(conn, self.owner, ids, self.lease_seconds)
+            except Exception as e:
+                logger.error(f"Failed to renew leases: {e}")
+
+        conn.close()
+
+    def stop(self):
+        self.stopped.set()
+
+
+def run_worker(
+    workers: int = None,
+    lease_seconds: float = 300,
+    poll_interval: float = 5,
+    once: bool = False,
+    owner: str = None,
+    resume: bool = True,
+    retry_delay: float = 30,
+):
+    """
+    Claims and runs queued jobs until interrupted, or until the queue is empty.
+    With `resume`, unfinished downloads from earlier runs are queued first.
+    Failed jobs are retried after `retry_delay` seconds, doubled per attempt.
+    """
+
+    owner = owner or get_worker_id()
+    lease_seconds = float(lease_seconds)
+    poll_interval = float(poll_interval)
+    retry_delay = float(retry_delay)
+
+    # claims need their own transactions, so don't share the SQLiteItem connection
+    init_database(database_path)
+    conn = create_connection(database_path)
+    if resume:
+        # rows started within a lease may still be downloading elsewhere
+        requeue_unfinished(conn, stale_after=lease_seconds)
+
+    scheduler = DownloadScheduler(workers)
+    keeper = LeaseKeeper(owner, lease_seconds)
+    keeper.start()
+    claimed = 0
+
+    logger.info(f"Worker {owner} started with {scheduler.max_workers} slot(s).")
+
+    def claim():
+        nonlocal claimed
+
+        while True:
+            jobs = claim_jobs(conn, owner, 1, lease_seconds)
+            if not jobs:
+                return
+
+            job = jobs[0]
+            download = job.to_download()
+            keeper.add(id(download), job)
+            claimed += 1
+            logger.info(f"Claimed job {job.id}: {job.url}")
+            yield download
+
+    def on_complete(download, error):
+        job = keeper.pop(id(download))
+        if job:
+            status = finish_job(conn, job, error, retry_delay)
+            logger.info(f"Job {job.id} {status.value}.")
+
+    try:
+        while True:
+            claimed_before = claimed
+            Downloader.start_downloads(claim(), scheduler, on_complete)
+
+            if claimed == claimed_before:
+                if once:
+                    break
+                time.sleep(poll_interval)
+
+    except KeyboardInterrupt:
+        logger.warning("Worker interrupted, releasing claimed jobs.")
+        for job in keeper.pop_all():
+            finish_job(conn, job, "Interrupted")
+
+    finally:
+        keeper.stop()
+        conn.close()
+
+    return claimed
+
+
+def worker_action(**args):
+    return run_worker(
+        args.get("workers"),
+        args.get("lease_seconds") or 300,
+        args.get("poll_interval") or 5,
+        args.get("once", False),
+        resume=args.get("resume", True),
+        retry_delay=args.get("retry_delay", 30),
+    )
+
+
+def worker_command(subparsers):
+    worker_cmd = subparsers.add_parser("worker", help="Process queued downloads")
+    worker_cmd.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=get_setting("MAX_CONCURRENT_DOWNLOADS", "4"),
+    )
+    worker_cmd.add_argument(
+        "-l",
+        "--lease_seconds",
+        type=float,
+        default=get_setting("WORKER_LEASE_SECONDS", "300"),
+    )
+    worker_cmd.add_argument(
+        "-i",
+        "--poll_interval",
+        type=float,
+        default=get_setting("WORKER_POLL_INTERVAL", "5"),
+    )
+    worker_cmd.add_argument(
+        "-d",
+        "--retry_delay",
+        type=float,
+        default=get_setting("WORKER_RETRY_DELAY", "30"),
+        help="Seconds before a failed job is retried, doubled per attempt",
+    )
+    worker_cmd.add_argument(
+        "--once", action="store_true", help="Exit once the queue is empty"
+    )
+    worker_cmd.add_argument(
+        "-r",
+        "--resume",
+        type=str_to_bool,
+        default=get_setting("RESUME_DOWNLOADS", True),
+        help="Queue downloads left started or interrupted by an earlier run",
+    )
+    return worker_cmd
@@ -0,0 +1,99 @@
+"""
+Compares the per-row cost of mapping downloads rows to Download objects
+through `__init__`, `setattr` and `literal_eval` (how rows used to be mapped)
+against the row factory used by map_sqlite_results_to_objects.
+
+    python benchmark_mapping.py [-n ROWS]
+"""
+
+from argparse import ArgumentParser
+from ast import literal_eval
+from itertools import zip_longest
+from pathlib import Path
+import os
+import tempfile
+import time
+
+current_file = Path(__file__).resolve()
+os.sys.path.insert(0, str(current_file.parents[1]))
+
+tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_PATH"] = os.path.join(tmp.name, "downloads.db")
+
+from src.download import Download
+from utils.sqlite import get_cached_column_names, map_sqlite_results_to_objects
+
+
+def map_with_init(sqlite_results: list, object_type):
+    all_columns = get_cached_column_names(object_type)
+    objects = []
+
+    for result in sqlite_results:
+        o = object_type()
+
+        for value, column_name in zip_longest(result, all_columns):
+            if isinstance(value, str) and (
+                value.startswith("[")
+                and value.endswith("]")
+                or value.startswith("{")
+                and value.endswith("}")
+            ):
+                try:
+                    value = literal_eval(value)
+                except (SyntaxError, ValueError):
+                    pass
+
+            if column_name is not None and hasattr(o, column_name):
+                setattr(o, column_name, value)
+
+        objects.append(o)
+
+    return objects
+
+
+def get_rows(rows: int):
+    return [
+        (
+            f"https://example.com/{i}.mp4",
+            "wget",
+            "completed",
+            "2024-01-01 00:00:00",
+            "2024-01-01 00:01:00",
+            "60",
+            "/downloads",
+            f"{i}.mp4",
+            f"/downloads/{i}.mp4",
+            None,
+            None,
+            '{"segments": 4}' if i % 10 == 0 else None,
+            "100",
+            1024,
+            None,
+            None,
+        )
+        for i in range(rows)
+    ]
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("-n", "--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    rows = get_rows(args.rows)
+
+    for name, func in [
+        ("init_setattr", map_with_init),
+        ("row_factory", map_sqlite_results_to_objects),
+    ]:
+        start = time.perf_counter()
+        downloads = func(rows, Download)
+        elapsed = time.perf_counter() - start
+
+        if len(downloads) != args.rows or downloads[-1].url != rows[-1][0]:
+            raise RuntimeError("Unexpected mapping")
+
+        del downloads
+        print(f"{name:<13} {elapsed:6.2f}s {elapsed / args.rows * 1e6:8.2f} us/row")
+
+    tmp.cleanup()
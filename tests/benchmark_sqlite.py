@@ -0,0 +1,97 @@
+"""
+Compares SQLiteItem upserts that look rows up before writing them against
+native INSERT ... ON CONFLICT upserts, one at a time and in bulk.
+
+    python benchmark_sqlite.py [-n ROWS]
+"""
+
+from argparse import ArgumentParser
+from pathlib import Path
+import os
+import tempfile
+import time
+
+current_file = Path(__file__).resolve()
+os.sys.path.insert(0, str(current_file.parents[1]))
+
+from utils.sqlite import create_connection, create_table
+from utils.sqlite_item import SQLiteItem
+
+item_values = [
+    "url text NOT NULL",
+    "downloader_type text NOT NULL",
+    "download_status text",
+    "progress text",
+    "PRIMARY KEY (url, downloader_type)",
+]
+
+
+class Item(SQLiteItem):
+    def __init__(
+        self,
+        url: str = None,
+        downloader_type: str = None,
+        download_status: str = None,
+        progress: str = None,
+        db_path: str = None,
+    ):
+        column_names = ["url", "downloader_type", "download_status", "progress"]
+        super().__init__(item_values, column_names, db_path=db_path)
+        self.url = url
+        self.downloader_type = downloader_type
+        self.download_status = download_status
+        self.progress = progress
+        self.filter_condition = (
+            f"url = {url} AND downloader_type = {downloader_type}"
+        )
+
+
+class LookupItem(Item):
+    def can_upsert(self):
+        return False
+
+
+def get_items(item_type: type, rows: int, db_path: str, status: str):
+    # half the keys already exist, so both the update and insert paths run
+    return [
+        item_type(f"https://example.com/{i}", "urllib", status, "50%", db_path)
+        for i in range(rows // 2, rows + rows // 2)
+    ]
+
+
+def run(item_type: type, rows: int, db_path: str, bulk: bool) -> float:
+    create_table(create_connection(db_path), item_type.__name__, item_values)
+    item_type.insert_all(get_items(item_type, rows, db_path, "started")[: rows // 2])
+    items = get_items(item_type, rows, db_path, "completed")
+
+    start = time.perf_counter()
+    if bulk:
+        item_type.upsert_all(items)
+    else:
+        with item_type(db_path=db_path).transaction():
+            for item in items:
+                item.upsert()
+    elapsed = time.perf_counter() - start
+
+    rows_written = item_type(db_path=db_path).select_all()
+    if len(rows_written) != rows:
+        raise RuntimeError("Unexpected row count")
+    return elapsed
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("-n", "--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, item_type, bulk in [
+            ("lookup", LookupItem, False),
+            ("on_conflict", Item, False),
+            ("on_conflict_bulk", Item, True),
+        ]:
+            db_path = os.path.join(tmp, f"{name}.db")
+            elapsed = run(item_type, args.rows, db_path, bulk)
+            print(
+                f"{name:<17} {elapsed:6.2f}s {args.rows / elapsed:10.0f} upserts/s"
+            )
@@ -0,0 +1,60 @@
+"""
+Compares single-stream and segmented url_lib downloads against a local
+range-capable server that caps every connection's bandwidth.
+
+    python benchmark_url_lib.py [-s SIZE_MB] [-r CONNECTION_RATE_MB] [-l LATENCY]
+"""
+
+from argparse import ArgumentParser
+from pathlib import Path
+import os
+import tempfile
+import time
+
+current_file = Path(__file__).resolve()
+os.sys.path.insert(0, str(current_file.parents[1]))
+
+from downloaders.url_lib import download
+from range_server import start_server
+
+
+def run(base_url: str, output_directory: str, segments: int) -> float:
+    start = time.perf_counter()
+    url = f"{base_url}/file.bin"
+    results = list(download(url, output_directory, segments=segments))
+    elapsed = time.perf_counter() - start
+
+    if results[-1].get("status") != 0:
+        raise RuntimeError(results[-1])
+    return elapsed
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("-s", "--size", type=int, default=32, help="File size (MiB)")
+    parser.add_argument(
+        "-r", "--rate", type=float, default=4, help="Per-connection rate (MiB/s)"
+    )
+    parser.add_argument("-l", "--latency", type=float, default=0.05)
+    parser.add_argument("--segments", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    os.environ.setdefault("HOST_MAX_CONNECTIONS", "0")
+    size = args.size * 1024 * 1024
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "file.bin"), "wb") as f:
+            f.write(os.urandom(size))
+
+        server, base_url = start_server(
+            tmp, latency=args.latency, connection_rate=args.rate * 1024 * 1024
+        )
+
+        for segments in args.segments:
+            elapsed = run(base_url, os.path.join(tmp, f"out{segments}"), segments)
+            print(
+                f"segments={segments:<3} {elapsed:6.2f}s "
+                f"{size / elapsed / 1024 / 1024:8.2f} MiB/s"
+            )
+
+        server.shutdown()
@@ -0,0 +1,105 @@
+"""
+Compares the per-video overhead of the ytdlp backend when every URL gets a
+fresh YoutubeDL (how URLs used to be downloaded) against pooled sessions,
+on a playlist of small videos served locally. Each video is downloaded in
+its own call, the way ytdlp_channel hands videos to start_downloads.
+
+The playlist page is then downloaded as a whole, one entry at a time and
+`-c` entries at a time, over connections throttled to `-r` bytes/s.
+
+    python benchmark_ytdlp.py [-n VIDEOS] [-s SIZE_KB] [-c CONCURRENCY] [-r RATE]
+"""
+
+from argparse import ArgumentParser
+from pathlib import Path
+import os
+import tempfile
+import time
+
+current_file = Path(__file__).resolve()
+os.sys.path.insert(0, str(current_file.parents[1]))
+
+from downloaders.ytdlp import close_sessions, download
+from range_server import start_server
+
+
+def run(urls: list, output_directory: str, pooled: bool) -> float:
+    start = time.perf_counter()
+
+    for url in urls:
+        results = list(
+            download(url, custom_format="best", output_directory=output_directory)
+        )
+        if results[-1].get("status") != 0:
+            raise RuntimeError(results[-1])
+
+        if not pooled:
+            close_sessions()
+
+    elapsed = time.perf_counter() - start
+    close_sessions()
+    return elapsed
+
+
+def run_playlist(url: str, output_directory: str, concurrency: int) -> float:
+    start = time.perf_counter()
+
+    for result in download(
+        url,
+        custom_format="best",
+        output_directory=output_directory,
+        playlist_concurrency=concurrency,
+    ):
+        if result.get("status") != 0:
+            raise RuntimeError(result)
+
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("-n", "--videos", type=int, default=50)
+    parser.add_argument("-s", "--size", type=int, default=16, help="Video size (KiB)")
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument(
+        "-r", "--rate", type=int, default=4 * 1024 * 1024, help="Bytes/s per connection"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        playlist = os.path.join(tmp, "playlist")
+        os.makedirs(playlist)
+
+        for i in range(args.videos):
+            with open(os.path.join(playlist, f"{i}.mp4"), "wb") as f:
+                f.write(os.urandom(args.size * 1024))
+
+        videos = "".join(f'<video src="{i}.mp4"></video>' for i in range(args.videos))
+        with open(os.path.join(playlist, "index.html"), "w") as f:
+            f.write(f"<html><title>Playlist</title><body>{videos}</body></html>")
+
+        server, base_url = start_server(playlist)
+        urls = [f"{base_url}/{i}.mp4" for i in range(args.videos)]
+
+        for name, pooled in [("fresh", False), ("pooled", True)]:
+            output_directory = os.path.join(tmp, name)
+            elapsed = run(urls, output_directory, pooled)
+            print(
+                f"{name:<7} {elapsed:6.2f}s "
+                f"{elapsed / args.videos * 1000:8.2f} ms/video"
+            )
+
+        server.shutdown()
+        server, base_url = start_server(playlist, connection_rate=args.rate)
+
+        for concurrency in sorted({1, args.concurrency}):
+            output_directory = os.path.join(tmp, f"playlist-{concurrency}")
+            elapsed = run_playlist(
+                f"{base_url}/index.html", output_directory, concurrency
+            )
+            print(
+                f"playlist x{concurrency:<3} {elapsed:6.2f}s "
+                f"{elapsed / args.videos * 1000:8.2f} ms/video"
+            )
+
+        server.shutdown()
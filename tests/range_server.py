@@ -0,0 +1,128 @@
+import functools
+from email.utils import formatdate
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import os
+import re
+import threading
+import time
+
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Static file handler with single byte-range and If-Range support.
+
+    `latency` delays every response and `connection_rate` caps the bytes/sec
+    of each connection, to emulate a high-latency link. Range headers are
+    recorded in `ranges`, and with `in_flight` set to a dict, the most
+    requests served at once is kept in its "max" key. `short_by` ends every
+    range that many bytes before the end of the file.
+    """
+
+    latency = 0
+    connection_rate = 0
+    accept_ranges = True
+    short_by = 0
+    chunk_size = 64 * 1024
+    ranges = None
+    in_flight = None
+    in_flight_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.in_flight is None:
+            self.send_file()
+            return
+
+        with self.in_flight_lock:
+            current = self.in_flight["current"] = self.in_flight.get("current", 0) + 1
+            self.in_flight["max"] = max(self.in_flight.get("max", 0), current)
+
+        try:
+            self.send_file()
+        finally:
+            with self.in_flight_lock:
+                self.in_flight["current"] -= 1
+
+    def send_file(self):
+        path = self.translate_path(self.path)
+
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        stat = os.stat(path)
+        size = stat.st_size
+        etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+        last_modified = formatdate(stat.st_mtime, usegmt=True)
+        start, end = 0, size - 1
+        match = RANGE_RE.fullmatch(self.headers.get("Range", ""))
+
+        if self.ranges is not None:
+            self.ranges.append(self.headers.get("Range"))
+
+        if_range = self.headers.get("If-Range")
+        if if_range and if_range not in (etag, last_modified):
+            # the file changed, so the range is ignored
+            match = None
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if match and self.accept_ranges:
+            if match.group(1):
+                start = int(match.group(1))
+                end = int(match.group(2)) if match.group(2) else size - 1
+            else:
+                start = size - int(match.group(2))
+
+            end = min(end, size - 1 - self.short_by)
+            if start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+
+        if self.accept_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Content-Type", "application/octet-stream")
+        self.end_headers()
+
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+
+            while remaining > 0:
+                chunk = f.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                try:
+                    self.wfile.write(chunk)
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                remaining -= len(chunk)
+                if self.connection_rate:
+                    time.sleep(len(chunk) / self.connection_rate)
+
+
+def start_server(directory: str, **handler_attrs):
+    """Serves `directory` on a random local port. Returns (server, base_url)."""
+
+    handler = type("Handler", (RangeRequestHandler,), handler_attrs)
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), functools.partial(handler, directory=directory)
+    )
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
@@ -0,0 +1,128 @@
+from pathlib import Path
+import copy
+import os
+import tempfile
+from test_base import *
+
+current_file = Path(__file__).resolve()
+parent_directory = current_file.parents[2]
+os.sys.path.insert(0, str(parent_directory))
+
+from downloaders.ytdlp import get_new_video_urls
+from range_server import start_server
+from src.archive import VideoArchive, get_high_water_mark, set_high_water_mark
+from utils.sqlite_conn import create_db, migrate_ytdlp_archive
+
+
+class TestArchive(TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "archive.db")
+        self.conn = create_db(self.db_path)
+
+    def test_archive(self):
+        archive = VideoArchive("ytdlp_video", self.db_path)
+        self.assertNotIn("youtube abc", archive)
+
+        archive.add("youtube abc")
+        archive.add("youtube abc")
+        self.assertIn("youtube abc", archive)
+        self.assertNotIn("youtube abc", VideoArchive("ytdlp_audio", self.db_path))
+
+        # sessions deep-copy their options, archive included
+        options = copy.deepcopy({"download_archive": archive})
+        self.assertIs(options["download_archive"], archive)
+
+        plan = self.conn.execute(
+            "EXPLAIN QUERY PLAN SELECT 1 FROM ytdlp_archive "
+            "WHERE archive_key = ? AND archive_id = ?",
+            ("ytdlp_video", "youtube abc"),
+        ).fetchall()
+        self.assertIn("COVERING INDEX sqlite_autoindex_ytdlp_archive", str(plan))
+
+    def test_high_water_mark(self):
+        channel_url = "https://www.youtube.com/@channel/videos"
+        mark = get_high_water_mark(channel_url, "ytdlp_video", self.db_path)
+        self.assertIsNone(mark)
+
+        set_high_water_mark(channel_url, "ytdlp_video", "a", self.db_path)
+        set_high_water_mark(channel_url, "ytdlp_video", "b", self.db_path)
+        set_high_water_mark(channel_url, "ytdlp_audio", "c", self.db_path)
+
+        for sync_key, video_id in [("ytdlp_video", "b"), ("ytdlp_audio", "c")]:
+            mark = get_high_water_mark(channel_url, sync_key, self.db_path)
+            self.assertEqual(mark, video_id)
+
+    def test_migrate_completed_downloads(self):
+        rows = [
+            ("https://www.youtube.com/watch?v=dQw4w9WgXcQ", "completed"),
+            ("https://www.youtube.com/watch?v=j17yEgxPwkk", "interrupted"),
+            ("https://www.youtube.com/watch?v=tPEE9ZwTmy0&list=PL", "completed"),
+        ]
+        self.conn.executemany(
+            "INSERT INTO downloads (url, downloader_type, download_status) "
+            "VALUES (?, 'ytdlp_video', ?)",
+            rows,
+        )
+        migrate_ytdlp_archive(self.conn)
+        self.conn.commit()
+
+        archive = VideoArchive("ytdlp_video", self.db_path)
+        self.assertIn("youtube dQw4w9WgXcQ", archive)
+        self.assertNotIn("youtube j17yEgxPwkk", archive)
+        self.assertNotIn("youtube tPEE9ZwTmy0", archive)
+
+    def serve_playlist(self, count: int) -> str:
+        videos = "".join(f'<video src="{i}.mp4"></video>' for i in range(count))
+        with open(os.path.join(self.tmp.name, "index.html"), "w") as f:
+            f.write(f"<html><title>Channel</title><body>{videos}</body></html>")
+
+        server, base_url = start_server(self.tmp.name)
+        self.addCleanup(server.shutdown)
+        return f"{base_url}/index.html"
+
+    def test_new_video_urls(self):
+        url = self.serve_playlist(5)
+        archive = VideoArchive("ytdlp_video", self.db_path)
+        archive.add("generic index-4")
+
+        # without a mark, everything but the archived videos is listed
+        video_urls, newest_id = get_new_video_urls(url, archive, stop_early=True)
+        self.assertEqual(video_urls, [f"{url}/index-{i}" for i in [1, 2, 3, 5]])
+        self.assertEqual(newest_id, "index-1")
+
+        video_urls, _ = get_new_video_urls(url, archive, "index-2", stop_early=True)
+        self.assertEqual(video_urls, [f"{url}/index-1"])
+
+        # lists that aren't newest first are listed in full, without archived videos
+        video_urls, _ = get_new_video_urls(url, archive, "index-2")
+        self.assertEqual(len(video_urls), 4)
+        self.assertNotIn(f"{url}/index-4", video_urls)
+
+    def test_failed_video_listed_again(self):
+        url = self.serve_playlist(5)
+        archive = VideoArchive("ytdlp_video", self.db_path)
+
+        # the last complete sync listed up to index-4; of the three uploads
+        # since, index-2 failed, so the mark wasn't moved
+        archive.add("generic index-1")
+        archive.add("generic index-3")
+
+        video_urls, _ = get_new_video_urls(url, archive, "index-4", stop_early=True)
+        self.assertEqual(video_urls, [f"{url}/index-2"])
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+
+
+if __name__ == "__main__":
+    test_methods = [
+        TestArchive.test_archive,
+        TestArchive.test_high_water_mark,
+        TestArchive.test_migrate_completed_downloads,
+        TestArchive.test_new_video_urls,
+        TestArchive.test_failed_video_listed_again,
+    ]
+    run_test_methods(test_methods)
@@ -0,0 +1,140 @@
+from pathlib import Path
+import asyncio
+import os
+import tempfile
+from test_base import *
+
+current_file = Path(__file__).resolve()
+parent_directory = current_file.parents[2]
+os.sys.path.insert(0, str(parent_directory))
+
+from downloaders.async_http import (
+    AsyncDownloader,
+    WriteBehindQueue,
+    download,
+    read_url_list,
+)
+from range_server import start_server
+
+
+class TestAsyncHttp(TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.serve_dir = os.path.join(self.tmp.name, "serve")
+        self.output_directory = os.path.join(self.tmp.name, "out")
+        os.makedirs(self.serve_dir)
+
+        self.files = {}
+        for i in range(200):
+            data = os.urandom(i * 97)
+            self.files[f"{i}.bin"] = data
+            with open(os.path.join(self.serve_dir, f"{i}.bin"), "wb") as f:
+                f.write(data)
+
+    def test_batch_download(self):
+        server, base_url = start_server(self.serve_dir, latency=0.05)
+        list_path = os.path.join(self.tmp.name, "urls.txt")
+
+        with open(list_path, "w") as f:
+            for filename in self.files:
+                f.write(f"{base_url}/{filename}\n")
+            f.write(f"{base_url}/missing.bin renamed.bin\n")
+
+        results = list(
+            download(list_path, self.output_directory, concurrency=64)
+        )
+        server.shutdown()
+
+        self.assertEqual(len(results), len(self.files) + 1)
+        failed = [r for r in results if r["status"] != 0]
+        self.assertEqual(len(failed), 1)
+        self.assertEqual(failed[0]["error"], "HTTP 404")
+        self.assertEqual(failed[0]["output_filename"], "renamed.bin")
+        self.assertTrue(all(r["source_url"] == list_path for r in results))
+
+        for filename, data in self.files.items():
+            with open(os.path.join(self.output_directory, filename), "rb") as f:
+                self.assertEqual(f.read(), data)
+
+    def test_read_url_list(self):
+        list_path = os.path.join(self.tmp.name, "urls.txt")
+        with open(list_path, "w") as f:
+            f.write("# comment\n\n")
+            f.write("https://example.com/it's.bin\n")
+            f.write("https://example.com/it's.bin copy.bin\n")
+            f.write('https://example.com/a.bin "my file.bin"\n')
+
+        self.assertEqual(
+            list(read_url_list(list_path)),
+            [
+                ("https://example.com/it's.bin", None),
+                ("https://example.com/it's.bin", "copy.bin"),
+                ("https://example.com/a.bin", "my file.bin"),
+            ],
+        )
+
+    def test_single_url(self):
+        server, base_url = start_server(self.serve_dir)
+        results = list(
+            download(f"{base_url}/150.bin", self.output_directory, "copy.bin")
+        )
+        server.shutdown()
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["status"], 0)
+        self.assertNotIn("is_playlist", results[0])
+        with open(os.path.join(self.output_directory, "copy.bin"), "rb") as f:
+            self.assertEqual(f.read(), self.files["150.bin"])
+
+    def test_write_behind_queue(self):
+        part_path = os.path.join(self.tmp.name, "file.part")
+        output_path = os.path.join(self.tmp.name, "file.bin")
+        failed_path = os.path.join(self.tmp.name, "failed.part")
+
+        async def run():
+            writer = WriteBehindQueue(maxsize=4)
+            writer.start()
+
+            for i in range(8):
+                await writer.write(part_path, i * 4, b"%04d" % i)
+                await writer.write(failed_path, i, b"x")
+
+            # one handle per file, however many chunks were written
+            await writer.finish(part_path, output_path)
+            self.assertEqual(list(writer.files), [failed_path])
+
+            await writer.discard(failed_path)
+            self.assertEqual(writer.files, {})
+            await writer.close()
+
+        asyncio.run(run())
+
+        with open(output_path, "rb") as f:
+            self.assertEqual(f.read(), b"".join(b"%04d" % i for i in range(8)))
+
+    def test_host_connections(self):
+        downloader = AsyncDownloader(host_connections=16)
+        semaphore = downloader.get_host_semaphore("https://cdn.example.com/a.bin")
+        self.assertIs(
+            downloader.get_host_semaphore("https://cdn.example.com/b.bin"), semaphore
+        )
+        self.assertEqual(semaphore._value, 16)
+
+        downloader = AsyncDownloader(host_connections=0)
+        self.assertIsNone(downloader.get_host_semaphore("https://example.com/a"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        return super().tearDown()
+
+
+if __name__ == "__main__":
+    test_methods = [
+        TestAsyncHttp.test_batch_download,
+        TestAsyncHttp.test_read_url_list,
+        TestAsyncHttp.test_single_url,
+        TestAsyncHttp.test_write_behind_queue,
+        TestAsyncHttp.test_host_connections,
+    ]
+    run_test_methods(test_methods)
@@ -1,10 +1,21 @@
+import atexit
 import unittest
 import os
+import shutil
 import subprocess
+import tempfile
 
 parent_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 os.sys.path.insert(0, parent_directory)
 
+# modules read the database path when they're imported, and writing downloaders
+# or downloads also writes the completion index next to the database, so tests
+# get a database of their own unless DATABASE_PATH is set
+if not os.environ.get("DATABASE_PATH"):
+    test_database_directory = tempfile.mkdtemp(prefix="udown-tests-")
+    atexit.register(shutil.rmtree, test_database_directory, True)
+    os.environ["DATABASE_PATH"] = os.path.join(test_database_directory, "downloads.db")
+
 from pprint import PrettyPrinter
 
 
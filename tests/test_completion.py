@@ -0,0 +1,120 @@
+from pathlib import Path
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from test_base import *
+
+current_file = Path(__file__).resolve()
+parent_directory = current_file.parents[2]
+os.sys.path.insert(0, str(parent_directory))
+
+from src.completion import get_completions, read_index, write_index
+
+project_directory = str(current_file.parents[1])
+
+index = {
+    "downloader_types": ["wget", "ytdlp_audio", "ytdlp_video"],
+    "settings": ["DOWNLOAD_DIRECTORY", "DOWNLOADER_TYPE", "PAGE_SIZE"],
+    "output_directories": ["/music", "/videos"],
+}
+
+add_downloader = """
+from src.downloader import Downloader
+Downloader("ytdlp_custom", None, "downloaders.ytdlp", "download").upsert()
+"""
+
+
+class TestCompletion(TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "downloads.db")
+        self.index_path = os.path.join(self.tmp.name, "downloads_completions.json")
+        self.env = {**os.environ, "DATABASE_PATH": self.db_path}
+
+    def complete(self, line: str):
+        """Runs a TAB press on `line`, returning the completions and imports."""
+
+        output_path = os.path.join(self.tmp.name, "completions")
+        env = {
+            **self.env,
+            "_ARGCOMPLETE": "1",
+            "_ARGCOMPLETE_STDOUT_FILENAME": output_path,
+            "COMP_LINE": line,
+            "COMP_POINT": str(len(line)),
+        }
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "main.py"],
+            cwd=project_directory,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+
+        with open(output_path) as f:
+            completions = f.read()
+
+        return completions.split("\013") if completions else [], result.stderr
+
+    def test_get_completions(self):
+        self.assertEqual(
+            get_completions(["-t"], "yt", index), ["ytdlp_audio", "ytdlp_video"]
+        )
+        self.assertEqual(
+            get_completions(["downloaders", "--downloader_type"], "w", index), ["wget"]
+        )
+        self.assertEqual(
+            get_completions(["settings", "get"], "PAGE", index), ["PAGE_SIZE"]
+        )
+        self.assertEqual(get_completions(["-d"], "/m", index), ["/music"])
+
+        # left to the parser
+        self.assertIsNone(get_completions(["-d"], "/tmp", index))
+        self.assertIsNone(get_completions(["downloaders", "-d"], "/m", index))
+        self.assertIsNone(get_completions(["settings", "get", "PAGE_SIZE"], "", index))
+        self.assertIsNone(get_completions([], "", index))
+
+    def test_write_index(self):
+        self.assertEqual(read_index(self.index_path), {})
+        write_index(self.index_path, **index)
+        write_index(self.index_path, output_directories=["/books"])
+        self.assertEqual(
+            read_index(self.index_path), {**index, "output_directories": ["/books"]}
+        )
+
+    def test_complete_from_index(self):
+        # the index is written when the downloaders table changes
+        subprocess.run(
+            [sys.executable, "-c", add_downloader],
+            cwd=project_directory,
+            env=self.env,
+            capture_output=True,
+            check=True,
+        )
+        self.assertIn("ytdlp_custom", read_index(self.index_path)["downloader_types"])
+
+        start = time.perf_counter()
+        completions, imports = self.complete("udown -t ytdlp_cu")
+        print(f"completion: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+        self.assertEqual(completions, ["ytdlp_custom "])
+        self.assertNotIn("src.download", imports)
+        self.assertNotIn("sqlite3", imports)
+
+        completions, _ = self.complete("udown settings set PAGE_")
+        self.assertEqual(completions, ["PAGE_SIZE "])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        return super().tearDown()
+
+
+if __name__ == "__main__":
+    test_methods = [
+        TestCompletion.test_get_completions,
+        TestCompletion.test_write_index,
+        TestCompletion.test_complete_from_index,
+    ]
+    run_test_methods(test_methods)
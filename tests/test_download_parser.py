@@ -0,0 +1,124 @@
+from pathlib import Path
+import json
+import os
+import tempfile
+import tracemalloc
+from test_base import *
+
+current_file = Path(__file__).resolve()
+parent_directory = current_file.parents[2]
+os.sys.path.insert(0, str(parent_directory))
+
+from src.download import Download
+
+
+class TestDownloadParser(TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def write_file(self, filename: str, lines: list):
+        path = os.path.join(self.tmp.name, filename)
+        with open(path, "w") as f:
+            f.writelines(f"{line}\n" for line in lines)
+        return path
+
+    def test_parse_download_string(self):
+        downloads = Download.parse_download_string(
+            url="https://example.com/a.mp4 a_copy.mp4 urllib"
+        )
+        self.assertEqual(len(downloads), 1)
+        self.assertEqual(downloads[0].url, "https://example.com/a.mp4")
+        self.assertEqual(downloads[0].downloader_type, "urllib")
+        self.assertEqual(downloads[0].output_filename, "a_copy.mp4")
+
+    def test_parse_text_file(self):
+        path = self.write_file(
+            "downloads.txt",
+            [
+                "https://example.com/a.bin wget",
+                "",
+                "# comment",
+                "https://example.com/b.bin b_copy.bin",
+                "https://youtu.be/abc auto",
+            ],
+        )
+        downloads = Download.parse_download_string(url=path, downloader_type="urllib")
+
+        self.assertEqual(
+            [(d.url, d.downloader_type, d.output_filename) for d in downloads],
+            [
+                ("https://example.com/a.bin", "wget", None),
+                ("https://example.com/b.bin", "urllib", "b_copy.bin"),
+                ("https://youtu.be/abc", "ytdlp_video", None),
+            ],
+        )
+
+    def test_parse_jsonl_file(self):
+        path = self.write_file(
+            "downloads.jsonl",
+            [
+                json.dumps({"url": "https://example.com/a.bin"}),
+                json.dumps(
+                    {
+                        "url": "https://example.com/b.bin",
+                        "downloader_type": "urllib",
+                        "output_filename": "b_copy.bin",
+                        "extra_args": {"segments": 2},
+                    }
+                ),
+            ],
+        )
+        downloads = list(Download.iter_download_string(url=path))
+
+        self.assertEqual(downloads[0].downloader_type, "wget")
+        self.assertEqual(downloads[1].downloader_type, "urllib")
+        self.assertEqual(downloads[1].output_filename, "b_copy.bin")
+        self.assertEqual(downloads[1].extra_args, {"segments": 2})
+
+    def test_invalid_downloader_type(self):
+        path = self.write_file(
+            "downloads.jsonl",
+            [
+                json.dumps({"url": "https://example.com/a.bin"}),
+                json.dumps({"url": "https://example.com/b", "downloader_type": "x"}),
+                "{not json",
+                json.dumps({"url": "https://example.com/c.bin"}),
+            ],
+        )
+
+        # bad lines are logged and skipped, the rest of the batch still runs
+        downloads = list(Download.iter_download_string(url=path))
+        self.assertEqual(
+            [d.url for d in downloads],
+            ["https://example.com/a.bin", "https://example.com/c.bin"],
+        )
+
+    def test_parsing_is_lazy(self):
+        lines = [f"https://example.com/{i}.bin urllib" for i in range(50000)]
+        path = self.write_file("downloads.txt", lines)
+
+        tracemalloc.start()
+        count = 0
+        for download in Download.iter_download_string(url=path):
+            count += 1
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.assertEqual(count, len(lines))
+        self.assertLess(peak, 1024 * 1024)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        return super().tearDown()
+
+
+if __name__ == "__main__":
+    test_methods = [
+        TestDownloadParser.test_parse_download_string,
+        TestDownloadParser.test_parse_text_file,
+        TestDownloadParser.test_parse_jsonl_file,
+        TestDownloadParser.test_invalid_downloader_type,
+        TestDownloadParser.test_parsing_is_lazy,
+    ]
+    run_test_methods(test_methods)
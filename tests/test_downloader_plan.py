@@ -0,0 +1,97 @@
+from pathlib import Path
+import inspect
+import os
+from test_base import *
+
+current_file = Path(__file__).resolve()
+parent_directory = current_file.parents[2]
+os.sys.path.insert(0, str(parent_directory))
+
+from src.download import Download
+from src.downloader import Downloader, get_args_plan, load_function
+from downloaders.wget import download as wget_download
+
+
+def download_func(url, output_path=None, verbose=False, retries=3, label=None):
+    pass
+
+
+class TestDownloaderPlan(TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.download = Download(
+            url="https://example.com/a.mp4",
+            downloader_type="wget",
+            output_path="/tmp/a.mp4",
+        )
+
+    def get_args(self, downloader_args: str, extra_args: dict = None):
+        self.download.extra_args = extra_args
+        downloader = Downloader("plan", None, __name__, "download_func", downloader_args)
+        return downloader.get_downloader_args(self.download, download_func)
+
+    def test_default_args(self):
+        self.assertEqual(
+            self.get_args(None, {"retries": 10}),
+            {
+                "url": "https://example.com/a.mp4",
+                "output_path": None,
+                "verbose": False,
+                "retries": 3,
+                "label": None,
+            },
+        )
+
+    def test_downloader_args(self):
+        args = self.get_args(
+            "url, output_path, verbose=true, label=downloader_type",
+            {"retries": 10},
+        )
+        self.assertEqual(
+            args,
+            {
+                "url": "https://example.com/a.mp4",
+                "output_path": "/tmp/a.mp4",
+                "verbose": True,
+                "retries": 10,
+                "label": "wget",
+            },
+        )
+
+        # positional keys that aren't attributes are passed as literals
+        args = self.get_args("url, missing, verbose=False, retries=5")
+        self.assertEqual(args["output_path"], "missing")
+        self.assertIs(args["verbose"], False)
+        self.assertEqual(args["retries"], "5")
+        self.assertIsNone(args["label"])
+
+    def test_plans_are_cached(self):
+        get_args_plan.cache_clear()
+        load_function.cache_clear()
+
+        for i in range(100):
+            downloader = Downloader("wget", None, "downloaders.wget ", "download")
+            func = downloader.get_function()
+            self.assertIs(func, wget_download)
+            downloader.get_downloader_args(self.download, func)
+
+        self.assertEqual(load_function.cache_info().misses, 1)
+        self.assertEqual(get_args_plan.cache_info().misses, 1)
+        self.assertEqual(
+            [entry[0] for entry in get_args_plan(wget_download, None)],
+            list(inspect.signature(wget_download).parameters),
+        )
+
+    def test_load_errors(self):
+        with self.assertRaises(ValueError):
+            load_function("downloaders.wget", "missing")
+
+
+if __name__ == "__main__":
+    test_methods = [
+        TestDownloaderPlan.test_default_args,
+        TestDownloaderPlan.test_downloader_args,
+        TestDownloaderPlan.test_plans_are_cached,
+        TestDownloaderPlan.test_load_errors,
+    ]
+    run_test_methods(test_methods)
@@ -0,0 +1,85 @@
+from pathlib import Path
+import os
+import tempfile
+from test_base import *
+
+current_file = Path(__file__).resolve()
+parent_directory = current_file.parents[2]
+os.sys.path.insert(0, str(parent_directory))
+
+from src.downloader import Downloader, DownloaderRegistry
+from utils.sqlite import create_connection
+from utils.sqlite_conn import create_db
+
+
+class TestDownloaderRegistry(TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "downloads.db")
+        create_db(self.db_path).close()
+
+        # stands in for another process editing the table
+        self.conn = create_connection(self.db_path)
+        self.add_downloader("wget", "downloaders.wget")
+
+    def add_downloader(self, downloader_type: str, module: str):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO downloaders "
+            "(downloader_type, module, downloader_func) VALUES (?, ?, 'download')",
+            (downloader_type, module),
+        )
+        self.conn.commit()
+
+    def test_lookups_are_cached(self):
+        registry = DownloaderRegistry(self.db_path, check_interval=60)
+        downloader = registry.get("wget")
+        self.assertIsInstance(downloader, Downloader)
+        self.assertEqual(downloader.module, "downloaders.wget")
+
+        statements = []
+        registry.conn.set_trace_callback(statements.append)
+
+        for _ in range(1000):
+            self.assertIs(registry.get("wget"), downloader)
+        self.assertEqual(registry.get_types(), ["wget"])
+        self.assertEqual(statements, [])
+
+    def test_changes_are_detected(self):
+        registry = DownloaderRegistry(self.db_path, check_interval=0)
+        self.assertIsNone(registry.get("curl"))
+        first = registry.get("wget")
+
+        statements = []
+        registry.conn.set_trace_callback(statements.append)
+        self.assertIs(registry.get("wget"), first)
+        # an unchanged database costs a PRAGMA, not a table read
+        self.assertEqual(statements, ["PRAGMA data_version"])
+
+        self.add_downloader("curl", "downloaders.curl")
+        self.assertEqual(registry.get("curl").module, "downloaders.curl")
+        self.assertEqual(sorted(registry.get_types()), ["curl", "wget"])
+
+    def test_invalidate(self):
+        registry = DownloaderRegistry(self.db_path, check_interval=60)
+        registry.get("wget")
+
+        self.add_downloader("wget", "downloaders.url_lib")
+        self.assertEqual(registry.get("wget").module, "downloaders.wget")
+
+        registry.invalidate()
+        self.assertEqual(registry.get("wget").module, "downloaders.url_lib")
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+        return super().tearDown()
+
+
+if __name__ == "__main__":
+    test_methods = [
+        TestDownloaderRegistry.test_lookups_are_cached,
+        TestDownloaderRegistry.test_changes_are_detected,
+        TestDownloaderRegistry.test_invalidate,
+    ]
+    run_test_methods(test_methods)
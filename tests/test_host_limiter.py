@@ -0,0 +1,76 @@
+from pathlib import Path
+import os
+import threading
+import time
+from test_base import *
+
+current_file = Path(__file__).resolve()
+parent_directory = current_file.parents[2]
+os.sys.path.insert(0, str(parent_directory))
+
+from src.host_limiter import HostLimiter, TokenBucket, get_host, parse_host_limits
+
+
+class TestHostLimiter(TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+
+    def test_get_host(self):
+        self.assertEqual(get_host("https://www.YouTube.com/watch?v=1"), "youtube.com")
+        self.assertEqual(get_host("http://127.0.0.1:8000/a"), "127.0.0.1")
+
+    def test_parse_host_limits(self):
+        limits = parse_host_limits("youtube.com=2:0.5,www.example.com=8")
+        self.assertEqual(limits["youtube.com"], ("2", "0.5", None))
+        self.assertEqual(limits["example.com"], ("8", None, None))
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(20, capacity=1)
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.consume()
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_disabled_bucket(self):
+        self.assertEqual(TokenBucket(0).consume(10**9), 0)
+
+    def test_max_connections(self):
+        limiter = HostLimiter(2, 0, 0)
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def work():
+            with limiter.slot("http://example.com/file"):
+                with lock:
+                    running[0] += 1
+                    running[1] = max(running)
+                time.sleep(0.05)
+                with lock:
+                    running[0] -= 1
+
+        threads = [threading.Thread(target=work) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(running[1], 2)
+
+    def test_host_overrides(self):
+        limiter = HostLimiter(4, 0, 1000, {"youtube.com": ("1", None, None)})
+        limit = limiter.get_limit("m.youtube.com")
+        self.assertEqual(limit.max_connections, 1)
+        self.assertEqual(limit.connection_rate(), 1000)
+        self.assertEqual(limiter.get_limit("example.com").max_connections, 4)
+
+
+if __name__ == "__main__":
+    test_methods = [
+        TestHostLimiter.test_get_host,
+        TestHostLimiter.test_parse_host_limits,
+        TestHostLimiter.test_token_bucket,
+        TestHostLimiter.test_disabled_bucket,
+        TestHostLimiter.test_max_connections,
+        TestHostLimiter.test_host_overrides,
+    ]
+    run_test_methods(test_methods)
@@ -0,0 +1,62 @@
+from pathlib import Path
+import os
+import tempfile
+from test_base import *
+
+current_file = Path(__file__).resolve()
+parent_directory = current_file.parents[2]
+os.sys.path.insert(0, str(parent_directory))
+
+from src.http_pool import clear_pools, get_pool_manager, get_session
+from range_server import start_server
+
+
+class TestHttpPool(TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        clear_pools()
+        self.tmp = tempfile.TemporaryDirectory()
+        for i in range(5):
+            with open(os.path.join(self.tmp.name, f"{i}.bin"), "wb") as f:
+                f.write(os.urandom(1024))
+
+    def test_pools_are_shared(self):
+        headers = {"User-Agent": "udown"}
+        self.assertIs(get_pool_manager(None, headers), get_pool_manager(None, headers))
+        self.assertIsNot(get_pool_manager(None, headers), get_pool_manager())
+        self.assertIsNot(
+            get_pool_manager(None, headers),
+            get_pool_manager("http://127.0.0.1:1", headers),
+        )
+        self.assertIs(get_session(headers=headers), get_session(headers=headers))
+
+    def test_connections_are_reused(self):
+        server, base_url = start_server(self.tmp.name, protocol_version="HTTP/1.1")
+
+        for i in range(5):
+            response = get_pool_manager().request("GET", f"{base_url}/{i}.bin")
+            self.assertEqual(response.status, 200)
+
+        pool = get_pool_manager().connection_from_url(base_url)
+        self.assertEqual(pool.num_connections, 1)
+
+        for i in range(5):
+            get_session().get(f"{base_url}/{i}.bin").raise_for_status()
+
+        pools = get_session().get_adapter(base_url).poolmanager.pools
+        self.assertEqual(len(pools), 1)
+        self.assertEqual(pools[list(pools.keys())[0]].num_connections, 1)
+        server.shutdown()
+
+    def tearDown(self):
+        clear_pools()
+        self.tmp.cleanup()
+        return super().tearDown()
+
+
+if __name__ == "__main__":
+    test_methods = [
+        TestHttpPool.test_pools_are_shared,
+        TestHttpPool.test_connections_are_reused,
+    ]
+    run_test_methods(test_methods)
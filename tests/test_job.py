@@ -0,0 +1,136 @@
+from pathlib import Path
+import os
+import tempfile
+import time
+from test_base import *
+
+current_file = Path(__file__).resolve()
+parent_directory = current_file.parents[2]
+os.sys.path.insert(0, str(parent_directory))
+
+from src.job import (
+    Job,
+    JobStatus,
+    claim_jobs,
+    enqueue_jobs,
+    finish_job,
+    requeue_unfinished,
+)
+from src.download import Download, download_action
+from utils.sqlite_conn import create_db
+
+
+class TestJob(TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.conn = create_db(os.path.join(self.tmp.name, "jobs.db"))
+        jobs = [
+            Job(url=f"https://example.com/{i}", downloader_type="wget", priority=i % 3)
+            for i in range(10)
+        ]
+        enqueue_jobs(self.conn, jobs)
+
+    def test_claim_order(self):
+        jobs = claim_jobs(self.conn, "worker-a", 4)
+        self.assertEqual([job.priority for job in jobs], [2, 2, 2, 1])
+        self.assertTrue(all(job.job_status == JobStatus.RUNNING.value for job in jobs))
+
+    def test_claims_do_not_overlap(self):
+        claimed_a = claim_jobs(self.conn, "worker-a", 6)
+        claimed_b = claim_jobs(self.conn, "worker-b", 6)
+        ids_a = {job.id for job in claimed_a}
+        ids_b = {job.id for job in claimed_b}
+
+        self.assertEqual(len(ids_a), 6)
+        self.assertEqual(len(ids_b), 4)
+        self.assertFalse(ids_a & ids_b)
+        self.assertEqual(claim_jobs(self.conn, "worker-c", 1), [])
+
+    def test_expired_lease_is_reclaimed(self):
+        claimed = claim_jobs(self.conn, "worker-a", 10, lease_seconds=-1)
+        reclaimed = claim_jobs(self.conn, "worker-b", 10)
+        self.assertEqual(len(reclaimed), len(claimed))
+        self.assertTrue(all(job.attempts == 2 for job in reclaimed))
+
+    def test_expired_last_attempt_fails(self):
+        claimed = claim_jobs(self.conn, "worker-a", 10, lease_seconds=-1)
+        self.conn.execute("UPDATE jobs SET max_attempts = attempts")
+        self.conn.commit()
+
+        self.assertEqual(claim_jobs(self.conn, "worker-b", 10), [])
+        statuses = self.conn.execute(
+            "SELECT job_status, COUNT(*) FROM jobs GROUP BY job_status"
+        ).fetchall()
+        self.assertEqual(statuses, [(JobStatus.FAILED.value, len(claimed))])
+
+    def test_finish_job(self):
+        job = claim_jobs(self.conn, "worker-a", 1)[0]
+        self.assertEqual(finish_job(self.conn, job, "HTTP 500"), JobStatus.QUEUED)
+
+        job = claim_jobs(self.conn, "worker-a", 1)[0]
+        job.attempts = job.max_attempts
+        self.assertEqual(finish_job(self.conn, job, "HTTP 500"), JobStatus.FAILED)
+
+        job = claim_jobs(self.conn, "worker-a", 1)[0]
+        self.assertEqual(finish_job(self.conn, job), JobStatus.COMPLETED)
+
+    def test_retry_delay(self):
+        job = claim_jobs(self.conn, "worker-a", 10)[0]
+        finish_job(self.conn, job, "HTTP 500", retry_delay=60)
+        self.assertGreater(job.not_before, time.time() + 30)
+        self.assertEqual(claim_jobs(self.conn, "worker-a", 1), [])
+
+        self.conn.execute("UPDATE jobs SET not_before = ?", (time.time() - 1,))
+        self.conn.commit()
+        self.assertEqual([j.id for j in claim_jobs(self.conn, "worker-a", 1)], [job.id])
+
+    def test_requeue_only_stale_downloads(self):
+        now = time.time()
+        self.conn.executemany(
+            "INSERT INTO downloads (url, downloader_type, download_status, "
+            "start_date, output_path) VALUES (?, 'wget', 'started', ?, ?)",
+            [
+                ("https://example.com/stale.bin", now - 600, "stale.bin"),
+                ("https://example.com/active.bin", now, "active.bin"),
+            ],
+        )
+        self.conn.commit()
+
+        self.assertEqual(requeue_unfinished(self.conn, stale_after=300), 1)
+        urls = [
+            row[0]
+            for row in self.conn.execute("SELECT url FROM jobs WHERE url LIKE '%.bin'")
+        ]
+        self.assertEqual(urls, ["https://example.com/stale.bin"])
+
+    def test_add_twice_queues_once(self):
+        url = "https://example.com/add-twice.bin"
+        for _ in range(2):
+            download_action(action="add", url=url, downloader_type="wget", ui=False)
+
+        conn = Download().conn
+        for table in ("downloads", "jobs"):
+            count = conn.execute(
+                f"SELECT COUNT(*) FROM {table} WHERE url = ?", (url,)
+            ).fetchone()[0]
+            self.assertEqual(count, 1, table)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp.cleanup()
+        return super().tearDown()
+
+
+if __name__ == "__main__":
+    test_methods = [
+        TestJob.test_claim_order,
+        TestJob.test_claims_do_not_overlap,
+        TestJob.test_expired_lease_is_reclaimed,
+        TestJob.test_expired_last_attempt_fails,
+        TestJob.test_finish_job,
+        TestJob.test_retry_delay,
+        TestJob.test_requeue_only_stale_downloads,
+        TestJob.test_add_twice_queues_once,
+    ]
+    run_test_methods(test_methods)
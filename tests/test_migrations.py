@@ -0,0 +1,262 @@
+from pathlib import Path
+from datetime import datetime, timedelta
+import os
+import sqlite3
+import tempfile
+from test_base import *
+
+current_file = Path(__file__).resolve()
+parent_directory = current_file.parents[2]
+os.sys.path.insert(0, str(parent_directory))
+
+from utils import (
+    format_duration,
+    format_timestamp,
+    get_date_range,
+    parse_duration,
+    parse_progress,
+    to_timestamp,
+)
+from utils.sqlite import create_connection
+from utils.sqlite import get_primary_key
+from utils.sqlite_conn import (
+    create_db,
+    download_values,
+    migrations,
+    search_indexes,
+    values,
+)
+from utils.sqlite_migrate import get_schema_version, migrate
+
+# the downloads table before dates, progress and durations were typed
+legacy_values = (
+    "url text NOT NULL, downloader_type text NOT NULL, "
+    "download_status text NOT NULL, start_date DATE, end_date DATE, "
+    "time_elapsed text, output_directory text, output_filename text, "
+    "output_path text, source_url text, proxy text, extra_args text, "
+    "progress text, PRIMARY KEY (url, downloader_type, output_path)"
+)
+
+
+class TestMigrations(TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "downloads.db")
+
+    def test_parsers(self):
+        start = datetime(2024, 5, 1, 12, 30, 15, 250000)
+        self.assertEqual(to_timestamp(str(start)), start.timestamp())
+        self.assertIsNone(to_timestamp("not a date"))
+        self.assertEqual(parse_progress(" 42.5%"), 42.5)
+        self.assertIsNone(parse_progress("N/A"))
+        self.assertEqual(parse_duration(str(timedelta(seconds=62.7))), 63)
+        self.assertEqual(parse_duration(str(timedelta(days=2, seconds=5))), 172805)
+        self.assertEqual(format_timestamp(start.timestamp()), "2024-05-01 12:30:15")
+        self.assertEqual(format_duration(62.7), "0:01:03")
+        self.assertIsNone(format_duration(None))
+
+        low, high = get_date_range("2024-02")
+        self.assertEqual(low, datetime(2024, 2, 1).timestamp())
+        self.assertLess(high, datetime(2024, 3, 1).timestamp())
+        self.assertGreater(high, datetime(2024, 2, 29, 23, 59, 59).timestamp())
+        self.assertIsNone(get_date_range("..2024")[0])
+
+    def test_new_database(self):
+        conn = create_db(self.db_path)
+        self.assertEqual(get_schema_version(conn), migrations[-1][0])
+        conn.close()
+
+    def test_legacy_database(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(f"CREATE TABLE downloads ({legacy_values})")
+        conn.executemany(
+            "INSERT INTO downloads (url, downloader_type, download_status, "
+            "start_date, end_date, time_elapsed, output_path, progress) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    f"https://example.com/video{i}.mp4",
+                    "wget",
+                    "completed",
+                    str(datetime(2024, 1 + i % 12, 1, 8, 0, 0, 500)),
+                    str(datetime(2024, 1 + i % 12, 1, 8, 1, 2, 500)),
+                    "0:01:02",
+                    f"/out/{i}.mp4",
+                    f"{i % 101}.0%",
+                )
+                for i in range(1000)
+            ],
+        )
+        conn.commit()
+        conn.close()
+
+        conn = create_db(self.db_path)
+        self.assertEqual(get_schema_version(conn), migrations[-1][0])
+
+        types = conn.execute(
+            "SELECT DISTINCT typeof(start_date), typeof(end_date), "
+            "typeof(time_elapsed), typeof(progress) FROM downloads"
+        ).fetchall()
+        self.assertEqual(types, [("real", "real", "integer", "real")])
+        self.assertEqual(
+            conn.execute("SELECT time_elapsed, progress FROM downloads").fetchone(),
+            (62, 0.0),
+        )
+
+        # rowids are kept, so the full-text index still matches the rows
+        fts = "SELECT COUNT(*) FROM downloads_fts WHERE url MATCH 'video99'"
+        self.assertEqual(conn.execute(fts).fetchone()[0], 11)
+
+        may = "SELECT COUNT(*) FROM downloads WHERE start_date BETWEEN ? AND ?"
+        self.assertEqual(conn.execute(may, get_date_range("2024-05")).fetchone()[0], 83)
+
+        for column, index in [
+            ("start_date", "idx_downloads_start_date"),
+            ("progress", "idx_downloads_progress"),
+        ]:
+            plan = conn.execute(
+                f"EXPLAIN QUERY PLAN SELECT * FROM downloads "
+                f"WHERE {column} BETWEEN ? AND ?",
+                (1, 2),
+            ).fetchall()
+            self.assertIn(index, str(plan))
+
+        conn.close()
+
+    def test_unparseable_dates(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(f"CREATE TABLE downloads ({legacy_values})")
+        conn.executemany(
+            "INSERT INTO downloads (url, downloader_type, download_status, "
+            "start_date, end_date) VALUES (?, 'wget', 'completed', ?, ?)",
+            [
+                ("https://example.com/a", "yesterday-ish", None),
+                ("https://example.com/b", "not a date", ""),
+                ("https://example.com/c", str(datetime(2024, 1, 1)), "never"),
+            ],
+        )
+        conn.commit()
+        conn.close()
+
+        with self.assertLogs("migrations", "WARNING") as logs:
+            conn = create_db(self.db_path)
+
+        self.assertEqual(
+            logs.output,
+            [
+                "WARNING:migrations:Cleared 2 unparseable start_date values",
+                "WARNING:migrations:Cleared 1 unparseable end_date values",
+            ],
+        )
+        conn.close()
+
+    def test_download_ids(self):
+        # downloads as created before they had an id
+        values = download_values[:-2] + [
+            "PRIMARY KEY (url, downloader_type, output_path)"
+        ]
+        table, search_table, columns, _ = search_indexes[0]
+        conn = create_db(
+            self.db_path,
+            tables=["downloads"],
+            values=[values],
+            search_indexes=[(table, search_table, columns, "rowid")],
+            migrations=migrations[:2],
+        )
+        conn.executemany(
+            "INSERT INTO downloads (url, downloader_type, download_status, "
+            "output_path) VALUES (?, 'wget', 'completed', ?)",
+            [
+                (f"https://example.com/video{i}.mp4", f"/out/{i}.mp4")
+                for i in range(100)
+            ],
+        )
+        conn.execute("DELETE FROM downloads WHERE url LIKE '%0.mp4'")
+        conn.commit()
+        rowids = conn.execute("SELECT rowid, url FROM downloads").fetchall()
+        conn.close()
+
+        conn = create_db(self.db_path)
+        ids = conn.execute("SELECT id, url FROM downloads").fetchall()
+        self.assertEqual(ids, rowids)
+
+        # rows are still matched and upserted by their unique key
+        self.assertEqual(
+            get_primary_key(tuple(download_values)),
+            ("url", "downloader_type", "output_path"),
+        )
+
+        # ids survive a vacuum, so the search index keeps matching its rows
+        conn.execute("VACUUM")
+        fts = (
+            "SELECT url FROM downloads WHERE id IN "
+            "(SELECT rowid FROM downloads_fts WHERE url MATCH 'video9')"
+        )
+        self.assertEqual(len(conn.execute(fts).fetchall()), 10)
+        self.assertTrue(all("video9" in url for url, in conn.execute(fts)))
+        conn.close()
+
+    def test_columns_added_after_migrations(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(f"CREATE TABLE downloads ({legacy_values})")
+        conn.execute(
+            "INSERT INTO downloads (url, downloader_type, download_status, "
+            "output_path, progress) VALUES ('https://example.com/a', 'wget', "
+            "'completed', '/out/a', '50.0%')"
+        )
+        conn.commit()
+        conn.close()
+
+        # a column added after the migrations were written
+        newer_values = download_values[:-2] + ["checksum text"] + download_values[-2:]
+        conn = create_db(
+            self.db_path,
+            values=[newer_values if v is download_values else v for v in values],
+        )
+        self.assertEqual(get_schema_version(conn), migrations[-1][0])
+        self.assertEqual(
+            conn.execute("SELECT id, progress, checksum FROM downloads").fetchall(),
+            [(1, 50.0, None)],
+        )
+        conn.close()
+
+    def test_migrations_run_once(self):
+        calls = []
+        steps = [(1, lambda conn: calls.append(1)), (2, lambda conn: calls.append(2))]
+
+        conn = create_connection(self.db_path)
+        self.assertEqual(migrate(conn, steps[:1]), 1)
+        self.assertEqual(migrate(conn, steps), 2)
+        self.assertEqual(migrate(conn, steps), 2)
+        self.assertEqual(calls, [1, 2])
+
+        def fail(conn):
+            conn.execute("CREATE TABLE partial (x)")
+            raise RuntimeError()
+
+        with self.assertRaises(RuntimeError):
+            migrate(conn, steps + [(3, fail)])
+
+        # the failed migration is rolled back along with its version bump
+        self.assertEqual(get_schema_version(conn), 2)
+        tables = "SELECT name FROM sqlite_master WHERE name = 'partial'"
+        self.assertEqual(conn.execute(tables).fetchall(), [])
+        conn.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        return super().tearDown()
+
+
+if __name__ == "__main__":
+    test_methods = [
+        TestMigrations.test_parsers,
+        TestMigrations.test_new_database,
+        TestMigrations.test_legacy_database,
+        TestMigrations.test_unparseable_dates,
+        TestMigrations.test_download_ids,
+        TestMigrations.test_columns_added_after_migrations,
+        TestMigrations.test_migrations_run_once,
+    ]
+    run_test_methods(test_methods)
@@ -0,0 +1,73 @@
+from pathlib import Path
+import os
+import time
+from test_base import *
+
+current_file = Path(__file__).resolve()
+parent_directory = current_file.parents[2]
+os.sys.path.insert(0, str(parent_directory))
+
+from src.progress import ProgressBuffer
+
+
+class FakeDownload:
+    batches = []
+
+    def __init__(self, url: str, progress: str = None):
+        self.url = url
+        self.downloader_type = "wget"
+        self.output_path = f"/tmp/{url}"
+        self.progress = progress
+
+    @classmethod
+    def upsert_all(cls, items: list):
+        cls.batches.append(items)
+
+
+class TestProgressBuffer(TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        FakeDownload.batches = []
+
+    def test_latest_progress_is_kept(self):
+        buffer = ProgressBuffer(interval=60)
+
+        for percent in range(100):
+            for i in range(50):
+                buffer.add(FakeDownload(str(i), f"{percent}%"))
+
+        self.assertEqual(FakeDownload.batches, [])
+        buffer.discard(FakeDownload("0"))
+        buffer.flush()
+
+        self.assertEqual(len(FakeDownload.batches), 1)
+        self.assertEqual(len(FakeDownload.batches[0]), 49)
+        self.assertTrue(all(d.progress == "99%" for d in FakeDownload.batches[0]))
+
+        buffer.flush()
+        self.assertEqual(len(FakeDownload.batches), 1)
+
+    def test_write_rate(self):
+        buffer = ProgressBuffer(interval=0.1)
+        end = time.monotonic() + 1
+        ticks = 0
+
+        # 50 downloads reporting progress as fast as they can
+        while time.monotonic() < end:
+            buffer.add(FakeDownload(str(ticks % 50), str(ticks)))
+            ticks += 1
+        buffer.flush()
+
+        self.assertGreater(ticks, 1000)
+        self.assertLessEqual(len(FakeDownload.batches), 12)
+
+    def tearDown(self):
+        return super().tearDown()
+
+
+if __name__ == "__main__":
+    test_methods = [
+        TestProgressBuffer.test_latest_progress_is_kept,
+        TestProgressBuffer.test_write_rate,
+    ]
+    run_test_methods(test_methods)
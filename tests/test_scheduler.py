@@ -0,0 +1,197 @@
+from pathlib import Path
+import os
+import threading
+import time
+from test_base import *
+
+current_file = Path(__file__).resolve()
+parent_directory = current_file.parents[2]
+os.sys.path.insert(0, str(parent_directory))
+
+from src.scheduler import (
+    DownloadJob,
+    DownloadScheduler,
+    get_type_semaphore,
+    parse_concurrency_limits,
+    release_type_semaphore,
+)
+
+
+class FakeDownload:
+    def __init__(self, url):
+        self.url = url
+
+
+class ConcurrencyCounter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def func(self, url: str, delay: float = 0.05):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(delay)
+        with self.lock:
+            self.running -= 1
+        yield {"url": url, "status": 0}
+
+
+def get_jobs(counter: ConcurrencyCounter, count: int, limit_key: str = None):
+    for i in range(count):
+        url = f"http://example.com/{i}"
+        yield DownloadJob(FakeDownload(url), counter.func, {"url": url}, limit_key)
+
+
+class TestScheduler(TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+
+    def test_parse_concurrency_limits(self):
+        limits = parse_concurrency_limits("wget=8, ytdlp=3,transmission=1,bad")
+        self.assertEqual(limits, {"wget": 8, "ytdlp": 3, "transmission": 1})
+        self.assertEqual(parse_concurrency_limits(None), {})
+
+    def test_get_limit_key(self):
+        scheduler = DownloadScheduler(4, "wget=8,ytdlp=3")
+        self.assertEqual(scheduler.get_limit_key("wget", "downloaders.wget"), "wget")
+        self.assertEqual(
+            scheduler.get_limit_key("ytdlp_audio", "downloaders.ytdlp"), "ytdlp"
+        )
+        self.assertIsNone(scheduler.get_limit_key("urllib", "downloaders.url_lib"))
+
+    def test_global_limit(self):
+        counter = ConcurrencyCounter()
+        scheduler = DownloadScheduler(3, {})
+        events = list(scheduler.run(get_jobs(counter, 12)))
+
+        results = [e for e in events if e[0] == "result"]
+        done = [e for e in events if e[0] == "done"]
+        self.assertEqual(len(results), 12)
+        self.assertEqual(len(done), 12)
+        self.assertEqual(counter.max_running, 3)
+
+    def test_type_limit(self):
+        counter = ConcurrencyCounter()
+        scheduler = DownloadScheduler(8, {"test_type_limit": 2})
+        list(scheduler.run(get_jobs(counter, 10, "test_type_limit")))
+        self.assertEqual(counter.max_running, 2)
+
+    def test_errors_are_reported(self):
+        def fail(url: str):
+            raise ValueError(url)
+
+        jobs = [DownloadJob(FakeDownload("a"), fail, {"url": "a"})]
+        events = list(DownloadScheduler(2, {}).run(jobs))
+        self.assertEqual([e[0] for e in events], ["error", "done"])
+        self.assertIsInstance(events[0][2], ValueError)
+
+    def test_jobs_are_pulled_lazily(self):
+        counter = ConcurrencyCounter()
+        pulled = []
+
+        def jobs():
+            for job in get_jobs(counter, 50):
+                pulled.append(job)
+                yield job
+
+        scheduler = DownloadScheduler(2, {})
+        events = scheduler.run(jobs())
+        next(events)
+        self.assertLessEqual(len(pulled), scheduler.max_pending + 1)
+        list(events)
+        self.assertEqual(len(pulled), 50)
+
+    def test_idle_events(self):
+        counter = ConcurrencyCounter()
+        jobs = get_jobs(counter, 1)
+        jobs = [
+            DownloadJob(job.download, counter.func, {**job.kwargs, "delay": 0.3})
+            for job in jobs
+        ]
+
+        events = list(DownloadScheduler(2, {}).run(jobs, idle_timeout=0.05))
+        names = [e[0] for e in events]
+        self.assertGreaterEqual(names.count("idle"), 2)
+        self.assertEqual(names[-2:], ["result", "done"])
+
+    def test_jobs_error_drains_running_jobs(self):
+        counter = ConcurrencyCounter()
+
+        def jobs():
+            yield from get_jobs(counter, 3)
+            raise ValueError("bad batch")
+
+        events = []
+        with self.assertRaises(ValueError):
+            for event in DownloadScheduler(4).run(jobs()):
+                events.append(event)
+
+        # every job pulled before the error was run and reported first
+        done = [e for e in events if e[0] == "done"]
+        results = [e for e in events if e[0] == "result"]
+        self.assertEqual(len(done), 3)
+        self.assertEqual(len(results), 3)
+
+    def test_type_limits_per_scheduler(self):
+        counter = ConcurrencyCounter()
+        scheduler = DownloadScheduler(8, {"per_scheduler": 1})
+        list(scheduler.run(get_jobs(counter, 4, "per_scheduler")))
+        self.assertEqual(counter.max_running, 1)
+
+        # a later scheduler with another limit doesn't get the first one's
+        counter = ConcurrencyCounter()
+        scheduler = DownloadScheduler(8, {"per_scheduler": 3})
+        list(scheduler.run(get_jobs(counter, 6, "per_scheduler")))
+        self.assertEqual(counter.max_running, 3)
+
+    def test_blocked_jobs_dont_hold_back_others(self):
+        counter = ConcurrencyCounter()
+        limited = list(get_jobs(counter, 30, "blocked_batch"))
+        kwargs = {"url": "", "delay": 0}
+        free = [
+            DownloadJob(FakeDownload(f"free/{i}"), counter.func, kwargs)
+            for i in range(12)
+        ]
+
+        scheduler = DownloadScheduler(4, {"blocked_batch": 1})
+        done = [e[1].url for e in scheduler.run(limited + free) if e[0] == "done"]
+
+        # the unlimited jobs run beside the limited batch, not after it
+        last_free = max(i for i, url in enumerate(done) if url.startswith("free/"))
+        limited_before = [url for url in done[:last_free] if "example.com" in url]
+        self.assertLess(len(limited_before), 10)
+        self.assertEqual(len(done), 42)
+
+    def test_wait_for_limit_held_elsewhere(self):
+        semaphore = get_type_semaphore("held_elsewhere", 1)
+        semaphore.acquire()
+
+        scheduler = DownloadScheduler(2, {"held_elsewhere": 1})
+        timer = threading.Timer(0.2, release_type_semaphore, (semaphore,))
+        timer.start()
+
+        start = time.monotonic()
+        counter = ConcurrencyCounter()
+        events = list(scheduler.run(get_jobs(counter, 2, "held_elsewhere")))
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        self.assertEqual([e[0] for e in events].count("done"), 2)
+
+
+if __name__ == "__main__":
+    test_methods = [
+        TestScheduler.test_parse_concurrency_limits,
+        TestScheduler.test_get_limit_key,
+        TestScheduler.test_global_limit,
+        TestScheduler.test_type_limit,
+        TestScheduler.test_errors_are_reported,
+        TestScheduler.test_jobs_are_pulled_lazily,
+        TestScheduler.test_idle_events,
+        TestScheduler.test_jobs_error_drains_running_jobs,
+        TestScheduler.test_type_limits_per_scheduler,
+        TestScheduler.test_blocked_jobs_dont_hold_back_others,
+        TestScheduler.test_wait_for_limit_held_elsewhere,
+    ]
+    run_test_methods(test_methods)
@@ -0,0 +1,458 @@
+from pathlib import Path
+from datetime import datetime
+import json
+import os
+import sys
+import tempfile
+import threading
+import tracemalloc
+from test_base import *
+
+current_file = Path(__file__).resolve()
+parent_directory = current_file.parents[2]
+os.sys.path.insert(0, str(parent_directory))
+
+from utils.sqlite import (
+    create_connection,
+    create_search_index,
+    create_table,
+    get_upsert_query,
+    map_sqlite_results_to_objects,
+    SQLiteRecord,
+)
+from utils.sqlite_item import SQLiteItem
+from utils.sqlite_query import Column, where
+from src.download import Download
+
+item_values = ["name text NOT NULL", "value INTEGER", "PRIMARY KEY (name)"]
+
+
+class Item(SQLiteItem):
+    def __init__(self, name: str = None, value: int = None, db_path: str = None):
+        super().__init__(item_values, ["name", "value"], db_path=db_path)
+        self.name = name
+        self.value = value
+        self.filter_condition = f"name = {name}"
+
+
+record_values = [
+    "url text NOT NULL",
+    "status text",
+    "start_date DATE",
+    "note text",
+    "PRIMARY KEY (url)",
+]
+
+
+class Record(SQLiteItem):
+    exact_columns = ("status",)
+    prefix_columns = ("start_date",)
+    search_table = "Record_fts"
+    search_columns = ("url",)
+
+    def __init__(
+        self,
+        url: str = None,
+        status: str = None,
+        start_date: str = None,
+        note: str = None,
+        db_path: str = None,
+    ):
+        column_names = ["url", "status", "start_date", "note"]
+        super().__init__(record_values, column_names, db_path=db_path)
+        self.url = url
+        self.status = status
+        self.start_date = start_date
+        self.note = note
+
+
+class TestSQLite(TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "items.db")
+        create_table(create_connection(self.db_path), "Item", item_values)
+
+    def test_connection_pragmas(self):
+        conn = create_connection(self.db_path, busy_timeout=1234)
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(conn.execute("PRAGMA busy_timeout").fetchone()[0], 1234)
+        self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)
+        conn.close()
+
+    def test_connections_per_thread(self):
+        item = Item(db_path=self.db_path)
+        connections = []
+        thread = threading.Thread(target=lambda: connections.append(item.conn))
+        thread.start()
+        thread.join()
+
+        self.assertIs(item.conn, Item(db_path=self.db_path).conn)
+        self.assertIsNot(item.conn, connections[0])
+
+    def test_concurrent_writes(self):
+        errors = []
+
+        def write(worker: int):
+            try:
+                for i in range(50):
+                    Item(f"{worker}-{i}", i, self.db_path).insert()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=write, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(Item(db_path=self.db_path).select_all()), 400)
+
+    def test_reads_during_write(self):
+        Item("a", 1, self.db_path).insert()
+        writer = create_connection(self.db_path)
+        writer.execute("BEGIN IMMEDIATE")
+        writer.execute("UPDATE Item SET value = 2 WHERE name = 'a'")
+
+        # readers see the last committed value instead of waiting on the lock
+        self.assertEqual(Item("a", db_path=self.db_path).select_first().value, 1)
+        writer.commit()
+        self.assertEqual(Item("a", db_path=self.db_path).select_first().value, 2)
+        writer.close()
+
+    def test_transaction(self):
+        reader = create_connection(self.db_path)
+        count = "SELECT COUNT(*) FROM Item"
+
+        with Item(db_path=self.db_path).transaction():
+            Item("a", 1, self.db_path).insert()
+            with Item(db_path=self.db_path).transaction():
+                Item("b", 2, self.db_path).insert()
+            # nothing is committed until the outermost block exits
+            self.assertEqual(reader.execute(count).fetchone()[0], 0)
+
+        self.assertEqual(reader.execute(count).fetchone()[0], 2)
+
+        with self.assertRaises(RuntimeError):
+            with Item(db_path=self.db_path).transaction():
+                Item("c", 3, self.db_path).insert()
+                raise RuntimeError()
+
+        self.assertEqual(reader.execute(count).fetchone()[0], 2)
+        reader.close()
+
+    def test_bulk_writes(self):
+        items = [Item(str(i), i, self.db_path) for i in range(1000)]
+        Item.insert_all(items)
+        self.assertEqual(len(Item(db_path=self.db_path).select_all()), 1000)
+
+        for item in items[:10]:
+            item.value = -item.value
+        Item.upsert_all(items[:10] + [Item("new", 1, self.db_path)])
+
+        items = Item(db_path=self.db_path).select_all()
+        rows = {item.name: item.value for item in items}
+        self.assertEqual(len(rows), 1001)
+        self.assertEqual(rows["9"], -9)
+        self.assertEqual(rows["new"], 1)
+
+    def test_bulk_insert_with_duplicates(self):
+        Item("1", 1, self.db_path).insert()
+
+        # the duplicate is skipped, the rest of the batch is still written
+        Item.insert_all([Item(str(i), i, self.db_path) for i in range(5)])
+
+        items = Item(db_path=self.db_path).select_all()
+        self.assertEqual(sorted(item.name for item in items), ["0", "1", "2", "3", "4"])
+
+    def test_upsert(self):
+        self.assertEqual(
+            get_upsert_query("Item", ("name", "value"), ("name",)),
+            "INSERT INTO Item (name, value) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+        )
+
+        Item("a", 1, self.db_path).upsert()
+        Item("a", 2, self.db_path).upsert()
+        Item.upsert_all([Item("a", 3, self.db_path), Item("b", 4, self.db_path)])
+
+        items = Item(db_path=self.db_path).select_all()
+        self.assertEqual(
+            [(item.name, item.value) for item in items], [("a", 3), ("b", 4)]
+        )
+
+    def test_concurrent_upserts(self):
+        errors = []
+
+        def write(worker: int):
+            try:
+                for i in range(100):
+                    Item(str(i % 10), worker, self.db_path).upsert()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=write, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(Item(db_path=self.db_path).select_all()), 10)
+
+    def test_filter_by(self):
+        conn = create_connection(self.db_path)
+        create_table(conn, "Record", record_values)
+        conn.execute("CREATE INDEX idx_record_status ON Record (status)")
+
+        def record(*values):
+            return Record(*values, db_path=self.db_path)
+
+        Record.insert_all(
+            [
+                record("https://a.com/x=1 AND y<2", "completed", "2024-05-01", "n1"),
+                record("https://b.com/video.mp4", "completed", "2024-06-01", "n2"),
+                record("https://c.com/Video.mkv", "started", "2024-05-30", "n3"),
+            ]
+        )
+        # rows written before the index existed are indexed too
+        self.assertTrue(create_search_index(conn, "Record", "Record_fts", ["url"]))
+        record("https://d.com/video.webm", "completed", "2023-05-01", "x").insert()
+
+        def filter_urls(query_params: list, **values):
+            record = Record(db_path=self.db_path, **values)
+            return sorted(r.url for r in record.filter_by(query_params))
+
+        self.assertEqual(
+            filter_urls(["url"], url="VIDEO"),
+            [
+                "https://b.com/video.mp4",
+                "https://c.com/Video.mkv",
+                "https://d.com/video.webm",
+            ],
+        )
+        self.assertEqual(
+            filter_urls(["url"], url="x=1 AND y<2"), ["https://a.com/x=1 AND y<2"]
+        )
+        self.assertEqual(filter_urls(["status"], status="complete"), [])
+        self.assertEqual(
+            filter_urls(["url", "status"], url="video", status="completed"),
+            ["https://b.com/video.mp4", "https://d.com/video.webm"],
+        )
+        self.assertEqual(
+            filter_urls(["start_date"], start_date="2024-05"),
+            ["https://a.com/x=1 AND y<2", "https://c.com/Video.mkv"],
+        )
+        self.assertEqual(len(filter_urls(["note"], note="n")), 3)
+
+        conn.execute("DELETE FROM Record WHERE url = 'https://d.com/video.webm'")
+        conn.execute("UPDATE Record SET url = 'https://b.com/a.mp3' WHERE note = 'n2'")
+        conn.commit()
+        self.assertEqual(
+            filter_urls(["url"], url="video"), ["https://c.com/Video.mkv"]
+        )
+
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM Record WHERE status = ?", ("completed",)
+        ).fetchall()
+        self.assertIn("idx_record_status", str(plan))
+        conn.close()
+
+    def test_search(self):
+        conn = create_connection(self.db_path)
+        create_table(conn, "Record", record_values)
+        create_search_index(conn, "Record", "Record_fts", ["url"])
+        Record.insert_all(
+            [
+                Record(f"https://a.com/{i}.{ext}", status, db_path=self.db_path)
+                for i, (ext, status) in enumerate(
+                    [("mp4", "completed"), ("mkv", "started"), ("mp4", "started")] * 5
+                )
+            ]
+        )
+        record = Record(db_path=self.db_path)
+
+        def search_urls(value: str, columns: tuple = None):
+            predicate = record.get_search_predicate(value, columns)
+            # every page is searched, not only the first
+            pages = record.iter_pages(predicate, page_size=2)
+            return sorted(r.url for page in pages for r in page)
+
+        self.assertEqual(len(search_urls(".mp4")), 10)
+        self.assertEqual(search_urls("mp3"), [])
+        self.assertEqual(len(search_urls("start", ("url", "status"))), 10)
+        self.assertEqual(len(search_urls("")), 15)
+        conn.close()
+
+    def test_iter_items(self):
+        Item.insert_all([Item(f"{i:05}", i, self.db_path) for i in range(20000)])
+        item = Item(db_path=self.db_path)
+
+        first = list(item.iter_items(order_by="name DESC", limit=3))
+        self.assertEqual([i.name for i in first], ["19999", "19998", "19997"])
+
+        tracemalloc.start()
+        count = sum(1 for _ in item.iter_items(Column("value") >= 100, batch_size=100))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.assertEqual(count, 19900)
+        self.assertLess(peak, 512 * 1024)
+
+        with self.assertRaises(ValueError):
+            list(item.iter_items(order_by="name; DROP TABLE Item"))
+
+    def test_select_page(self):
+        conn = create_connection(self.db_path)
+        create_table(conn, "Record", record_values)
+        dates = [None, "2024-01", "2024-01", "2024-02", None, "2024-01", "2024-03"]
+        Record.insert_all(
+            [
+                Record(f"https://example.com/{i}", "done", date, db_path=self.db_path)
+                for i, date in enumerate(dates)
+            ]
+        )
+
+        record = Record(db_path=self.db_path)
+        record.page_key = "start_date"
+
+        for descending in (False, True):
+            pages = list(record.iter_pages(page_size=2, descending=descending))
+            urls = [r.url for page in pages for r in page]
+
+            expected = sorted(
+                range(len(dates)),
+                key=lambda i: ((dates[i] is not None, dates[i] or ""), i),
+                reverse=descending,
+            )
+            self.assertEqual(urls, [f"https://example.com/{i}" for i in expected])
+            self.assertTrue(all(len(page) <= 2 for page in pages))
+
+        items, next_key = record.select_page(where(start_date="2024-01"), page_size=2)
+        self.assertEqual(next_key, ("2024-01", 3))
+        items, next_key = record.select_page(
+            where(start_date="2024-01"), next_key, page_size=2
+        )
+        self.assertEqual([r.url for r in items], ["https://example.com/5"])
+        self.assertIsNone(next_key)
+        conn.close()
+
+    def test_row_mapping(self):
+        conn = create_connection(self.db_path)
+        create_table(conn, "Record", record_values)
+        Record("https://a.com", note={"segments": [1, 2]}, db_path=self.db_path).insert()
+        self.assertEqual(
+            conn.execute("SELECT note FROM Record").fetchone()[0],
+            '{"segments": [1, 2]}',
+        )
+        conn.close()
+
+        rows = [
+            ("https://a.com/1", "wget", "completed", "2024-01-01", None, None, "/out")
+            + (None,) * 4
+            + ('{"segments": 2}', "100"),
+            ("https://a.com/2", "wget", "started") + (None,) * 8 + ("{'a': [1]}",),
+        ]
+        first, second = map_sqlite_results_to_objects(rows, Download)
+
+        self.assertEqual(first.url, "https://a.com/1")
+        self.assertEqual(first.output_directory, "/out")
+        self.assertEqual(first.progress, "100")
+        self.assertEqual(first.table_name, "downloads")
+        # decoded on first access
+        self.assertEqual(first._extra_args, '{"segments": 2}')
+        self.assertEqual(first.extra_args, {"segments": 2})
+        # rows written before extra_args was stored as JSON
+        self.assertEqual(second.extra_args, {"a": [1]})
+        self.assertIsNone(second.progress)
+        self.assertIsNot(first.__dict__, second.__dict__)
+
+    def test_records(self):
+        Item.insert_all([Item("a", 1, self.db_path), Item("b", 2, self.db_path)])
+        records = Item(db_path=self.db_path).select_all(records=True)
+
+        self.assertIsInstance(records[0], SQLiteRecord)
+        self.assertEqual([(r.name, r.value) for r in records], [("a", 1), ("b", 2)])
+        self.assertEqual(records[0].as_dict(), {"name": "a", "value": 1})
+        with self.assertRaises(AttributeError):
+            records[0].value = 3
+
+        item = records[0].to_item()
+        self.assertIsInstance(item, Item)
+        self.assertEqual((item.name, item.value), ("a", 1))
+
+    def test_record_memory(self):
+        rows = [
+            (f"https://example.com/{i}.mp4", "wget", "completed", "2024-01-01")
+            + (None, "60", "/out", f"{i}.mp4", f"/out/{i}.mp4", None, None)
+            + ('{"segments": 2}', "100", 1024, None, None)
+            for i in range(5000)
+        ]
+
+        records = map_sqlite_results_to_objects(rows, Download.record_type())
+        downloads = map_sqlite_results_to_objects(rows, Download)
+        self.assertEqual(len(records), len(rows))
+
+        # fields live in the tuple itself, with no per-record __dict__
+        self.assertFalse(hasattr(records[0], "__dict__"))
+        self.assertTrue(
+            all("__slots__" in vars(cls) for cls in type(records[0]).__mro__[:-2])
+        )
+        self.assertLess(
+            sys.getsizeof(records[0]),
+            sys.getsizeof(downloads[0]) + sys.getsizeof(vars(downloads[0])),
+        )
+
+        record = map_sqlite_results_to_objects(rows[:1], Download.record_type())[0]
+        self.assertEqual(record.extra_args, {"segments": 2})
+        self.assertEqual(json.loads(repr(record))["url"], rows[0][0])
+
+        download = record.to_item()
+        self.assertIsInstance(download, Download)
+        self.assertEqual(download.output_path, "/out/0.mp4")
+        self.assertEqual(download.extra_args, {"segments": 2})
+
+    def test_display_dict(self):
+        start = datetime(2024, 5, 1, 12, 30, 15).timestamp()
+        download = Download("https://example.com/a.mp4", "wget", start_date=start)
+        download.time_elapsed = 3725
+
+        values = download.display_dict()
+        self.assertEqual(values["start_date"], "2024-05-01 12:30:15")
+        self.assertEqual(values["time_elapsed"], "1:02:05")
+        self.assertIsNone(values["end_date"])
+        self.assertEqual(download.as_dict()["start_date"], start)
+
+        record = map_sqlite_results_to_objects(
+            [(download.url, "wget", "completed", start, None, 3725)],
+            Download.record_type(),
+        )[0]
+        self.assertEqual(json.loads(repr(record))["start_date"], "2024-05-01 12:30:15")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        return super().tearDown()
+
+
+if __name__ == "__main__":
+    test_methods = [
+        TestSQLite.test_connection_pragmas,
+        TestSQLite.test_connections_per_thread,
+        TestSQLite.test_concurrent_writes,
+        TestSQLite.test_reads_during_write,
+        TestSQLite.test_transaction,
+        TestSQLite.test_bulk_writes,
+        TestSQLite.test_bulk_insert_with_duplicates,
+        TestSQLite.test_upsert,
+        TestSQLite.test_concurrent_upserts,
+        TestSQLite.test_filter_by,
+        TestSQLite.test_search,
+        TestSQLite.test_iter_items,
+        TestSQLite.test_select_page,
+        TestSQLite.test_row_mapping,
+        TestSQLite.test_records,
+        TestSQLite.test_record_memory,
+        TestSQLite.test_display_dict,
+    ]
+    run_test_methods(test_methods)
@@ -0,0 +1,99 @@
+from pathlib import Path
+import os
+import tempfile
+from test_base import *
+
+current_file = Path(__file__).resolve()
+parent_directory = current_file.parents[2]
+os.sys.path.insert(0, str(parent_directory))
+
+from utils.sqlite import create_connection, create_table
+from utils.sqlite_item import SQLiteItem
+from utils.sqlite_query import Column, Condition, Or, compile_shape, where
+
+link_values = ["url text NOT NULL", "status text", "PRIMARY KEY (url)"]
+
+
+class Link(SQLiteItem):
+    def __init__(self, url: str = None, status: str = None, db_path: str = None):
+        super().__init__(link_values, ["url", "status"], db_path=db_path)
+        self.url = url
+        self.status = status
+        self.filter_condition = where(url=url)
+
+
+class TestSQLiteQuery(TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "links.db")
+        create_table(create_connection(self.db_path), "Link", link_values)
+
+    def test_compile(self):
+        predicate = where(url="a", output_path=None) & (
+            (Column("progress") != "100%") | Column("status").isin(["x", "y"])
+        )
+        self.assertEqual(
+            predicate.compile(),
+            (
+                "(url = ? AND output_path IS NULL AND "
+                "(progress != ? OR status IN (?, ?)))",
+                ("a", "100%", "x", "y"),
+            ),
+        )
+        self.assertEqual(
+            Column("start_date").startswith("2024-05").compile(),
+            ("(start_date >= ? AND start_date < ?)", ("2024-05", "2024-06")),
+        )
+        self.assertEqual(
+            Column("progress").between(10, 50.5).compile(),
+            ("progress BETWEEN ? AND ?", (10, 50.5)),
+        )
+        self.assertEqual(
+            Column("progress").between(None, 50).compile(), ("progress <= ?", (50,))
+        )
+        self.assertEqual(Or().compile(), ("0", ()))
+
+        with self.assertRaises(ValueError):
+            Condition("url; DROP TABLE Link", "=", "a")
+        with self.assertRaises(ValueError):
+            Condition("url", "GLOB", "a")
+
+    def test_statements_are_cached(self):
+        compile_shape.cache_clear()
+        for i in range(100):
+            where(url=f"https://example.com/{i}", downloader_type="wget").compile()
+
+        info = compile_shape.cache_info()
+        self.assertEqual(info.misses, 3)
+        self.assertEqual(info.hits, 99)
+
+    def test_values_are_parameters(self):
+        urls = [
+            "https://example.com/watch?v=1 AND status = done",
+            "https://example.com/a<b>=c",
+            "https://example.com/it's",
+        ]
+        Link.insert_all([Link(url, "started", self.db_path) for url in urls])
+
+        for url in urls:
+            link = Link(url, "completed", self.db_path)
+            link.update()
+            self.assertEqual(link.select_first().status, "completed")
+
+        Link(urls[0], db_path=self.db_path).delete()
+        remaining = Link(db_path=self.db_path).select_all()
+        self.assertEqual(sorted(link.url for link in remaining), sorted(urls[1:]))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        return super().tearDown()
+
+
+if __name__ == "__main__":
+    test_methods = [
+        TestSQLiteQuery.test_compile,
+        TestSQLiteQuery.test_statements_are_cached,
+        TestSQLiteQuery.test_values_are_parameters,
+    ]
+    run_test_methods(test_methods)
@@ -0,0 +1,100 @@
+from pathlib import Path
+import os
+import subprocess
+import sys
+import tempfile
+from test_base import *
+
+current_file = Path(__file__).resolve()
+parent_directory = current_file.parents[2]
+os.sys.path.insert(0, str(parent_directory))
+
+project_directory = str(current_file.parents[1])
+
+# what `udown download ...` imports before it parses its arguments; timing
+# depends on the machine, so the budget is only checked with UDOWN_IMPORT_BUDGET=1
+IMPORT_BUDGET_US = 100000
+
+check_imports = """
+import logging, sys
+import main
+sys.argv = ["udown", "download", "--help"]
+try:
+    main.main()
+except SystemExit:
+    pass
+backends = [name for name in sys.modules if name.startswith("downloaders.")]
+loggers = [
+    name
+    for name, logger in logging.root.manager.loggerDict.items()
+    if getattr(logger, "handlers", None)
+]
+print(backends, loggers)
+"""
+
+
+class TestStartup(TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "downloads.db")
+        self.env = {**os.environ, "DATABASE_PATH": self.db_path}
+
+    def run_python(self, *args) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            [sys.executable, *args],
+            cwd=project_directory,
+            env=self.env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+    def get_import_time(self) -> int:
+        """
+        Returns how long `udown download --help` spends importing modules,
+        in microseconds, leaving out the interpreter's own startup.
+        """
+
+        stderr = self.run_python(
+            "-X", "importtime", "main.py", "download", "--help"
+        ).stderr
+        lines = stderr.splitlines()
+        site = next(i for i, line in enumerate(lines) if line.endswith("| site"))
+
+        # top level imports, whose cumulative times include their dependencies
+        import_time = 0
+        for line in lines[site + 1 :]:
+            parts = line.split("|")
+            if len(parts) == 3 and not parts[2].startswith("  "):
+                import_time += int(parts[1])
+
+        return import_time
+
+    @unittest.skipUnless(
+        os.environ.get("UDOWN_IMPORT_BUDGET") == "1", "set UDOWN_IMPORT_BUDGET=1"
+    )
+    def test_import_budget(self):
+        # the fastest of a few runs, so a busy machine doesn't fail the test
+        import_time = min(self.get_import_time() for _ in range(3))
+        print(f"imports: {import_time / 1000:.1f}ms")
+        self.assertLess(import_time, IMPORT_BUDGET_US)
+
+    def test_import_is_lazy(self):
+        output = self.run_python("-c", check_imports).stdout.splitlines()[-1]
+
+        # no backend is imported, no logger is set up, no database is opened
+        self.assertEqual(output, "[] []")
+        self.assertFalse(os.path.exists(self.db_path))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        return super().tearDown()
+
+
+if __name__ == "__main__":
+    test_methods = [
+        TestStartup.test_import_budget,
+        TestStartup.test_import_is_lazy,
+    ]
+    run_test_methods(test_methods)
@@ -0,0 +1,199 @@
+from pathlib import Path
+import os
+import tempfile
+from test_base import *
+
+current_file = Path(__file__).resolve()
+parent_directory = current_file.parents[2]
+os.sys.path.insert(0, str(parent_directory))
+
+from downloaders.url_lib import SegmentedDownload, download, request_range
+from range_server import start_server
+from src.host_limiter import HostLimit, HostSlot
+from src.http_pool import get_pool_manager
+
+
+class TestUrlLib(TestBase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.serve_dir = os.path.join(self.tmp.name, "serve")
+        self.output_directory = os.path.join(self.tmp.name, "out")
+        os.makedirs(self.serve_dir)
+
+        self.data = os.urandom(5 * 1024 * 1024 + 123)
+        with open(os.path.join(self.serve_dir, "file.bin"), "wb") as f:
+            f.write(self.data)
+
+    def read_output(self, filename="file.bin"):
+        with open(os.path.join(self.output_directory, filename), "rb") as f:
+            return f.read()
+
+    def test_segmented_download(self):
+        server, base_url = start_server(self.serve_dir)
+        results = list(
+            download(f"{base_url}/file.bin", self.output_directory, segments=4)
+        )
+        server.shutdown()
+
+        self.assertEqual(results[-1]["status"], 0)
+        self.assertEqual(results[-1]["size"], len(self.data))
+        self.assertEqual(self.read_output(), self.data)
+
+    def test_segments_take_host_slots(self):
+        server, base_url = start_server(self.serve_dir)
+        self.addCleanup(server.shutdown)
+        url = f"{base_url}/file.bin"
+        path = os.path.join(self.tmp.name, "file.bin")
+        http = get_pool_manager()
+
+        # the download's own slot, and the host's other slot held elsewhere
+        limit = HostLimit(max_connections=2)
+        limit.semaphore.acquire()
+        limit.semaphore.acquire()
+
+        def fetch():
+            segmented = SegmentedDownload(
+                http, url, path, len(self.data), 8, HostSlot("127.0.0.1", limit)
+            )
+            written = list(segmented.run(request_range(http, url, {}, 0, 8)))
+            self.assertEqual(written[-1], len(self.data))
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), self.data)
+            return segmented
+
+        self.assertEqual(len(fetch().threads), 1)
+
+        # once the other slot is free, a second connection takes it
+        limit.release()
+        self.assertGreater(len(fetch().threads), 1)
+        self.assertTrue(limit.try_acquire())
+        self.assertFalse(limit.try_acquire())
+
+    def test_download_without_range_support(self):
+        server, base_url = start_server(self.serve_dir, accept_ranges=False)
+        results = list(
+            download(f"{base_url}/file.bin", self.output_directory, segments=4)
+        )
+        server.shutdown()
+
+        self.assertEqual(results[-1]["status"], 0)
+        self.assertEqual(self.read_output(), self.data)
+
+    def test_single_stream_download(self):
+        server, base_url = start_server(self.serve_dir)
+        url = f"{base_url}/file.bin"
+        results = list(download(url, self.output_directory, "copy.bin", segments=1))
+        server.shutdown()
+
+        self.assertEqual(results[-1]["status"], 0)
+        self.assertEqual(self.read_output("copy.bin"), self.data)
+
+    def test_http_error(self):
+        server, base_url = start_server(self.serve_dir)
+        results = list(download(f"{base_url}/missing.bin", self.output_directory))
+        server.shutdown()
+
+        self.assertEqual(results[-1]["status"], 1)
+        self.assertEqual(results[-1]["error"], "HTTP 404")
+
+    def write_part(self, size: int, filename="file.bin"):
+        os.makedirs(self.output_directory, exist_ok=True)
+        with open(os.path.join(self.output_directory, f"{filename}.part"), "wb") as f:
+            f.write(self.data[:size])
+
+    def test_resume_download(self):
+        ranges = []
+        server, base_url = start_server(self.serve_dir, ranges=ranges)
+        url = f"{base_url}/file.bin"
+
+        first = list(download(url, self.output_directory, segments=1))[-1]
+        os.remove(os.path.join(self.output_directory, "file.bin"))
+        self.assertIsNotNone(first["etag"])
+        self.assertEqual(first["bytes_received"], len(self.data))
+
+        for segments in (1, 4):
+            offset = 2 * 1024 * 1024 + 7
+            self.write_part(offset)
+            ranges.clear()
+            results = list(
+                download(
+                    url,
+                    self.output_directory,
+                    segments=segments,
+                    etag=first["etag"],
+                    bytes_received=offset,
+                )
+            )
+
+            self.assertEqual(results[-1]["status"], 0)
+            self.assertTrue(ranges[0].startswith(f"bytes={offset}-"))
+            self.assertEqual(self.read_output(), self.data)
+            self.assertFalse(
+                os.path.exists(os.path.join(self.output_directory, "file.bin.part"))
+            )
+
+        server.shutdown()
+
+    def test_resume_changed_file(self):
+        server, base_url = start_server(self.serve_dir)
+        self.write_part(1024)
+        results = list(
+            download(
+                f"{base_url}/file.bin",
+                self.output_directory,
+                segments=1,
+                etag='"stale"',
+                bytes_received=1024,
+            )
+        )
+        server.shutdown()
+
+        self.assertEqual(results[-1]["status"], 0)
+        self.assertNotEqual(results[-1]["etag"], '"stale"')
+        self.assertEqual(self.read_output(), self.data)
+
+    def test_incomplete_download_keeps_part(self):
+        # only ranges come up short, so the first download is complete
+        server, base_url = start_server(self.serve_dir, short_by=100)
+        url = f"{base_url}/file.bin"
+        first = list(download(url, self.output_directory, segments=1))[-1]
+        os.remove(os.path.join(self.output_directory, "file.bin"))
+
+        self.write_part(1024)
+        results = list(
+            download(
+                url,
+                self.output_directory,
+                segments=1,
+                etag=first["etag"],
+                bytes_received=1024,
+            )
+        )
+        server.shutdown()
+
+        self.assertEqual(results[-1]["status"], 1)
+        self.assertFalse(
+            os.path.exists(os.path.join(self.output_directory, "file.bin"))
+        )
+        self.assertTrue(
+            os.path.exists(os.path.join(self.output_directory, "file.bin.part"))
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        return super().tearDown()
+
+
+if __name__ == "__main__":
+    test_methods = [
+        TestUrlLib.test_segmented_download,
+        TestUrlLib.test_segments_take_host_slots,
+        TestUrlLib.test_download_without_range_support,
+        TestUrlLib.test_single_stream_download,
+        TestUrlLib.test_http_error,
+        TestUrlLib.test_resume_download,
+        TestUrlLib.test_resume_changed_file,
+        TestUrlLib.test_incomplete_download_keeps_part,
+    ]
+    run_test_methods(test_methods)
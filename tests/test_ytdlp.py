@@ -1,8 +1,10 @@
 import json
 from pathlib import Path
 import os
+import tempfile
 import threading
 import time
+from types import SimpleNamespace
 from urllib.parse import parse_qs, urlparse
 import yt_dlp
 from test_base import *
@@ -13,6 +15,8 @@ os.sys.path.insert(0, str(parent_directory))
 
 from downloaders.ytdlp import (
     YTDLPProgressState,
+    _sessions,
+    close_sessions,
     download,
     get_channel_info,
     get_options,
@@ -28,7 +32,9 @@ from downloaders.ytdlp import (
     logger,
 )
 
+from src.scheduler import DownloadJob, DownloadScheduler
 from src.settings import DOWNLOADER_METADATA_DIR
+from range_server import start_server
 
 #     "https://www.youtube.com/playlist?list=PL3A_1s_Z8MQbYIvki-pbcerX8zrF4U8zQ"
 # playlist_urls = [
@@ -279,6 +285,104 @@ class TestYtdlp(TestBase):
         print(video_urls)
 
         
+    def test_sessions_are_reused(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for i in range(3):
+                with open(os.path.join(tmp, f"{i}.mp4"), "wb") as f:
+                    f.write(os.urandom(16 * 1024))
+
+            server, base_url = start_server(tmp)
+            self.addCleanup(server.shutdown)
+            self.addCleanup(close_sessions)
+            close_sessions()
+
+            sessions = set()
+            for i in range(3):
+                results = list(
+                    download(
+                        f"{base_url}/{i}.mp4",
+                        custom_format="best",
+                        output_directory=os.path.join(tmp, "out"),
+                    )
+                )
+                self.assertEqual(results[-1]["status"], 0)
+                self.assertEqual(results[-1]["progress"], "100%")
+                self.assertEqual(len(_sessions), 1)
+
+                session = _sessions[0][1]
+                self.assertIsNone(session.hook)
+                sessions.add(session)
+
+            self.assertEqual(len(sessions), 1)
+
+    def test_download_playlist_concurrently(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            videos = "".join(f'<video src="{i}.mp4"></video>' for i in range(4))
+            with open(os.path.join(tmp, "index.html"), "w") as f:
+                f.write(f"<html><title>Playlist</title><body>{videos}</body></html>")
+
+            for i in range(4):
+                with open(os.path.join(tmp, f"{i}.mp4"), "wb") as f:
+                    f.write(os.urandom(16 * 1024))
+
+            server, base_url = start_server(tmp)
+            self.addCleanup(server.shutdown)
+            output_directory = os.path.join(tmp, "out")
+
+            results = list(
+                download(
+                    f"{base_url}/index.html",
+                    custom_format="best",
+                    output_directory=output_directory,
+                    playlist_concurrency=2,
+                )
+            )
+
+            self.assertEqual(len(results), 4)
+            indexes = sorted(result["index"] for result in results)
+            self.assertEqual(indexes, [0, 1, 2, 3])
+
+            for result in results:
+                self.assertEqual(result["status"], 0, msg=str(result))
+                self.assertTrue(result["is_playlist"])
+                self.assertEqual(result["source_url"], f"{base_url}/index.html")
+                self.assertTrue(
+                    os.path.exists(
+                        os.path.join(output_directory, result["output_filename"])
+                    )
+                )
+
+
+    def test_playlist_entries_take_type_slots(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            videos = "".join(f'<video src="{i}.mp4"></video>' for i in range(6))
+            with open(os.path.join(tmp, "index.html"), "w") as f:
+                f.write(f"<html><title>Playlist</title><body>{videos}</body></html>")
+
+            for i in range(6):
+                with open(os.path.join(tmp, f"{i}.mp4"), "wb") as f:
+                    f.write(os.urandom(16 * 1024))
+
+            in_flight = {}
+            server, base_url = start_server(tmp, latency=0.2, in_flight=in_flight)
+            self.addCleanup(server.shutdown)
+            url = f"{base_url}/index.html"
+            kwargs = {
+                "urls": url,
+                "custom_format": "best",
+                "output_directory": os.path.join(tmp, "out"),
+                "playlist_concurrency": 4,
+            }
+
+            # entries share the job's `ytdlp=2` budget instead of running 4 at once
+            job = DownloadJob(SimpleNamespace(url=url), download, kwargs, "ytdlp")
+            events = list(DownloadScheduler(4, {"ytdlp": 2}).run([job]))
+
+            results = [payload for event, _, payload in events if event == "result"]
+            self.assertEqual(len(results), 6)
+            self.assertTrue(all(result["status"] == 0 for result in results))
+            self.assertEqual(in_flight["max"], 2)
+
 
 if __name__ == "__main__":
     test_methods = [
@@ -293,6 +397,9 @@ if __name__ == "__main__":
         # TestYtdlp.test_get_entry_filename,
         # TestYtdlp.test_download_entries,
         # TestYtdlp.test_check_ffmpeg,
-        TestYtdlp.test_get_video_urls_from_channel
+        TestYtdlp.test_get_video_urls_from_channel,
+        TestYtdlp.test_sessions_are_reused,
+        TestYtdlp.test_download_playlist_concurrently,
+        TestYtdlp.test_playlist_entries_take_type_slots,
     ]
     run_test_methods(test_methods)
@@ -1,4 +1,5 @@
 import ast
+import calendar
 import json
 from datetime import datetime, timedelta
 import re
@@ -29,6 +30,170 @@ def parse_date(date: str):
     return date
 
 
+# the date prefixes date filters accept, from the widest period to the narrowest
+DATE_FORMATS = [
+    "%Y",
+    "%Y-%m",
+    "%Y-%m-%d",
+    "%Y-%m-%d %H",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f",
+]
+
+# str(timedelta), e.g. "0:01:02.345678" or "2 days, 3:04:05"
+DURATION_RE = re.compile(
+    r"^(?:(?P<days>-?\d+) days?, )?"
+    r"(?P<hours>\d+):(?P<minutes>\d\d):(?P<seconds>\d\d(?:\.\d+)?)$"
+)
+
+
+def parse_datetime(date: str):
+    """Parses a date or a prefix of one; returns (datetime, DATE_FORMATS index)."""
+
+    date = parse_date(date).strip().replace("T", " ")
+
+    for index, fmt in enumerate(DATE_FORMATS):
+        try:
+            return datetime.strptime(date, fmt), index
+        except ValueError:
+            continue
+
+    raise ValueError(f"Invalid date: {date}")
+
+
+def get_period_end(start: datetime, index: int) -> datetime:
+    """Returns the start of the period after the one `start` was parsed as."""
+
+    if index == 0:
+        return start.replace(year=start.year + 1)
+    if index == 1:
+        days = calendar.monthrange(start.year, start.month)[1]
+        return start + timedelta(days=days)
+
+    units = ["days", "hours", "minutes", "seconds", "microseconds"]
+    return start + timedelta(**{units[index - 2]: 1})
+
+
+def to_timestamp(value):
+    """Converts a datetime, a number or a date string to epoch seconds."""
+
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    try:
+        return parse_datetime(value)[0].timestamp()
+    except ValueError:
+        return None
+
+
+def parse_progress(value):
+    """Converts progress such as "42.0%" to a percentage, or None."""
+
+    if value is None or isinstance(value, (int, float)):
+        return value
+
+    try:
+        return float(str(value).strip().rstrip("%"))
+    except ValueError:
+        return None
+
+
+def parse_duration(value):
+    """Converts a duration, in seconds or as str(timedelta), to whole seconds."""
+
+    if value is None or isinstance(value, (int, float)):
+        return None if value is None else round(value)
+
+    value = str(value).strip()
+
+    try:
+        return round(float(value))
+    except ValueError:
+        pass
+
+    match = DURATION_RE.match(value)
+    if not match:
+        return None
+
+    parts = {key: float(part or 0) for key, part in match.groupdict().items()}
+    return round(timedelta(**parts).total_seconds())
+
+
+def format_timestamp(value):
+    """Formats epoch seconds as a local date for display."""
+
+    if value is None:
+        return None
+
+    try:
+        return datetime.fromtimestamp(float(value)).strftime("%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError, OverflowError, OSError):
+        return value
+
+
+def format_duration(value):
+    """Formats a duration in seconds as str(timedelta), e.g. "0:01:02"."""
+
+    if value is None:
+        return None
+
+    try:
+        return str(timedelta(seconds=round(float(value))))
+    except (TypeError, ValueError, OverflowError):
+        return value
+
+
+def parse_range(value: str, parse=float) -> tuple:
+    """
+    Parses "low..high" (either end may be left out) or a single value into
+    (low, high), parsing each end with `parse`.
+    """
+
+    low, separator, high = str(value).partition("..")
+    if not separator:
+        high = low
+
+    return (
+        parse(low.strip()) if low.strip() else None,
+        parse(high.strip()) if high.strip() else None,
+    )
+
+
+def parse_duration_range(value: str) -> tuple:
+    return parse_range(value, parse_duration)
+
+
+def get_date_range(value: str) -> tuple:
+    """
+    Parses a date filter into (low, high) epoch seconds. A date matches its
+    whole period, so "2024-05" covers May, and "2024-05..today" runs from
+    the start of May to the end of today.
+    """
+
+    low, separator, high = str(value).partition("..")
+    if not separator:
+        high = low
+
+    start = parse_datetime(low)[0].timestamp() if low.strip() else None
+    end = None
+
+    if high.strip():
+        # inclusive, so the range stops just before the next period starts
+        end = get_period_end(*parse_datetime(high)).timestamp() - 1e-6
+
+    return start, end
+
+
 def parse_value(value):
     value = value.strip()
 
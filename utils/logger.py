@@ -4,6 +4,7 @@ import logging
 import os
 from pathlib import Path
 import stat
+import threading
 
 
 LOG_COLORS = {
@@ -68,6 +69,32 @@ def setup_logger(name="downloader", log_dir="/tmp", level=logging.INFO):
     return logger
 
 
+class LazyLogger:
+    """
+    Stands in for setup_logger's logger, which is only set up (log directory,
+    file and console handlers) the first time something is logged.
+    """
+
+    lock = threading.Lock()
+
+    def __init__(self, **kwargs):
+        self.__dict__["_kwargs"] = kwargs
+        self.__dict__["_logger"] = None
+
+    def get_logger(self) -> logging.Logger:
+        if self._logger is None:
+            with self.lock:
+                if self._logger is None:
+                    self.__dict__["_logger"] = setup_logger(**self._kwargs)
+        return self._logger
+
+    def __getattr__(self, name):
+        return getattr(self.get_logger(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.get_logger(), name, value)
+
+
 def write_output(logger, result, path: str = None, append: bool = True):
 
     if path is None:
@@ -1,16 +1,16 @@
 import argparse
+from collections import namedtuple
+from contextlib import contextmanager
 from datetime import datetime
 from functools import lru_cache
-from inspect import getmembers, signature
-from itertools import zip_longest
+import json
 import os
-from pprint import PrettyPrinter
 import sqlite3
 from ast import literal_eval
 import re
 from urllib.parse import urlparse
-
-pp = PrettyPrinter(depth=4)
+from utils import format_duration, format_timestamp
+from utils.sqlite_query import And, Column, Match, Or, Predicate
 
 
 def get_callable_args(func, args: dict = None) -> dict:
@@ -19,6 +19,8 @@ def get_callable_args(func, args: dict = None) -> dict:
     if not callable(func):
         raise ValueError("not a function")
 
+    from inspect import signature
+
     func_signature = signature(func)
     func_params = {param.name: param for param in func_signature.parameters.values()}
 
@@ -73,13 +75,75 @@ def is_valid_path(path, raise_error=True):
     return path
 
 
-def create_connection(database_path: str):
+BUSY_TIMEOUT = 5000
+
+
+class Connection(sqlite3.Connection):
+    """Connection that knows whether a `transaction` block is open on it."""
+
+    transaction_depth = 0
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection, immediate: bool = False):
+    """
+    Runs the statements in the block as one transaction, committing on exit
+    and rolling back on error. Nested blocks join the outermost transaction.
+    """
+
+    if conn.transaction_depth:
+        conn.transaction_depth += 1
+        try:
+            yield conn
+        finally:
+            conn.transaction_depth -= 1
+        return
+
+    if conn.in_transaction:
+        conn.commit()
+
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    conn.transaction_depth = 1
+
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+    finally:
+        conn.transaction_depth = 0
+
+
+def configure_connection(conn: sqlite3.Connection, busy_timeout: int = BUSY_TIMEOUT):
+    """
+    Enables WAL so readers don't block the writer, waits up to `busy_timeout`
+    milliseconds for locks instead of failing, and only syncs on checkpoints.
+    """
+
+    conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout)}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+
+def create_connection(
+    database_path: str,
+    check_same_thread: bool = True,
+    busy_timeout: int = BUSY_TIMEOUT,
+):
     """
     Create a connection to an SQLite database.
     """
     try:
-        conn = sqlite3.connect(database_path)
-        return conn
+        conn = sqlite3.connect(
+            database_path,
+            check_same_thread=check_same_thread,
+            timeout=busy_timeout / 1000,
+            factory=Connection,
+        )
+        return configure_connection(conn, busy_timeout)
     except sqlite3.Error as e:
         print("Error connecting to the database:", e)
         print("Database path: ", database_path)
@@ -96,7 +160,7 @@ def select_items(
     """
     Retrieves a collection of items stored in the SQLite database.
     """
-    query = f"SELECT * FROM {sanitize_values(table_name)[0]}"
+    query = f"SELECT * FROM {sanitize_table_name(table_name)}"
     if filter_condition:
         filter_condition, params = get_filter_condition(filter_condition)
 
@@ -130,9 +194,11 @@ def view_items(
         conn, table_name, filter_condition, mapped_object_type, column_names
     )
 
+    from pprint import pprint
+
     for item in items:
         item_dict = dict(zip(column_names, item))
-        pp.pprint(item_dict)
+        pprint(item_dict, depth=4)
         print("")
 
 
@@ -160,6 +226,11 @@ def sanitize_filter_condition(filter_condition: str):
     return filter_condition_keys, tuple(sanitized_params)
 
 
+@lru_cache(maxsize=None)
+def sanitize_table_name(table_name: str) -> str:
+    return sanitize_values(table_name)[0]
+
+
 def sanitize_values(values: list):
     """
     Sanitize values by removing non-word characters.
@@ -211,6 +282,12 @@ def insert_items(
         columns = ", ".join(column_names)
 
         query = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+
+        if len(objects) > 1:
+            return execute_many(
+                conn, query, (get_object_values(obj, column_names) for obj in objects)
+            )
+
         last_row_id = None
         for obj in objects:
             values = get_object_values(obj, column_names)
@@ -223,6 +300,35 @@ def insert_items(
         print("Error inserting data:", e)
 
 
+def insert_new_items(
+    conn: sqlite3.Connection, table_name: str, objects: list, column_names: list = None
+) -> list:
+    """
+    Inserts objects that don't conflict with an existing row on any unique
+    key, in a single transaction. Returns the objects that were inserted.
+    """
+
+    column_names = (
+        get_column_names(conn.cursor(), table_name)
+        if column_names is None
+        else column_names
+    )
+    placeholders = ", ".join(["?"] * len(column_names))
+    query = (
+        f"INSERT INTO {sanitize_table_name(table_name)} ({', '.join(column_names)}) "
+        f"VALUES ({placeholders}) ON CONFLICT DO NOTHING"
+    )
+    inserted = []
+
+    with transaction(conn):
+        for obj in objects:
+            cursor = conn.execute(query, get_object_values(obj, column_names))
+            if cursor.rowcount:
+                inserted.append(obj)
+
+    return inserted
+
+
 def update_items(
     conn: sqlite3.Connection,
     table_name: str,
@@ -250,6 +356,13 @@ def update_items(
 
         query = f"UPDATE {table_name} SET {set_clause} WHERE {filter_condition}"
 
+        if len(objects) > 1:
+            return execute_many(
+                conn,
+                query,
+                (get_object_values(obj, column_names) + list(params) for obj in objects),
+            )
+
         for obj in objects:
             update_values = get_object_values(obj, column_names)
             update_values.extend(params)
@@ -266,12 +379,94 @@ def update_items(
         return -1
 
 
+@lru_cache(maxsize=None)
+def get_primary_key(table_values: tuple) -> tuple:
+    """
+    Returns the columns that identify a row: the primary key declared in a
+    table's values, or its UNIQUE (...) key when the primary key only names
+    the rowid (an INTEGER PRIMARY KEY column).
+    """
+
+    primary_key = unique = ()
+    is_rowid = False
+
+    for value in table_values:
+        match = re.match(r"(PRIMARY KEY|UNIQUE)\s*\((.*)\)", value.strip())
+        if match:
+            columns = tuple(column.strip() for column in match.group(2).split(","))
+            if match.group(1) == "UNIQUE":
+                unique = unique or columns
+            else:
+                primary_key = columns
+
+        elif "PRIMARY KEY" in value:
+            primary_key = (value.split(" ")[0],)
+            is_rowid = " INTEGER PRIMARY KEY" in value
+
+    return unique if is_rowid and unique else primary_key
+
+
+@lru_cache(maxsize=None)
+def get_upsert_query(table_name: str, column_names: tuple, primary_key: tuple):
+    placeholders = ", ".join(["?"] * len(column_names))
+    columns = ", ".join(column_names)
+    update_columns = [column for column in column_names if column not in primary_key]
+
+    query = (
+        f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders}) "
+        f"ON CONFLICT ({', '.join(primary_key)}) DO "
+    )
+
+    if not update_columns:
+        return query + "NOTHING"
+
+    set_clause = ", ".join(f"{column} = excluded.{column}" for column in update_columns)
+    return query + f"UPDATE SET {set_clause}"
+
+
+def upsert_items(
+    conn: sqlite3.Connection,
+    table_name: str,
+    objects: list,
+    primary_key: list,
+    column_names: list = None,
+):
+    """
+    Inserts objects, updating the existing row instead whenever one with the
+    same primary key exists.
+    """
+
+    if not isinstance(objects, list):
+        raise ValueError("'objects' must be a list.")
+
+    if not primary_key:
+        raise ValueError(f"Table {table_name} has no primary key.")
+
+    column_names = (
+        get_column_names(conn.cursor(), table_name)
+        if column_names is None
+        else column_names
+    )
+    query = get_upsert_query(table_name, tuple(column_names), tuple(primary_key))
+
+    if len(objects) > 1:
+        return execute_many(
+            conn, query, (get_object_values(obj, column_names) for obj in objects)
+        )
+
+    values = get_object_values(objects[0], column_names) if objects else None
+    cursor, results = execute_query(conn, query, values, return_cursor=True)
+    return cursor.lastrowid if cursor else None
+
+
 def get_object_values(obj, column_names: list):
     """Given a list of column names, returns the respective values for an object."""
 
     def normalize(value):
         if isinstance(value, (str, int, float, bool, type(None))):
             return value
+        if isinstance(value, (dict, list, tuple)):
+            return json.dumps(value)
         return str(value)
 
     results = []
@@ -294,6 +489,97 @@ def get_last_inserted_row_id(conn: sqlite3.Connection, table_name: str):
     return result[0][0] if len(result) > 0 else 0
 
 
+def table_exists(conn: sqlite3.Connection, table_name: str) -> bool:
+    query = "SELECT 1 FROM sqlite_master WHERE name = ?"
+    return conn.execute(query, (table_name,)).fetchone() is not None
+
+
+def get_filter_predicate(
+    conn: sqlite3.Connection,
+    query_params: list,
+    obj: object,
+    conjunction_type: str = "AND",
+):
+    """
+    Builds the predicate matching the object's values for `query_params`.
+
+    Strings in the object's `exact_columns` must match exactly and those in
+    `prefix_columns` by prefix, and (low, high) pairs in `range_columns`
+    match with BETWEEN, so all of them can use an index. `search_columns`
+    are matched through the `search_table` full-text index; any other string
+    matches anywhere in the column. Returns None if no value is set.
+    """
+
+    exact_columns = getattr(obj, "exact_columns", ())
+    prefix_columns = getattr(obj, "prefix_columns", ())
+    range_columns = getattr(obj, "range_columns", ())
+    search_table = getattr(obj, "search_table", None)
+    search_columns = getattr(obj, "search_columns", ())
+
+    if search_table and not table_exists(conn, search_table):
+        search_table = None
+
+    predicates = []
+
+    for param in query_params:
+        value = getattr(obj, param, None)
+
+        if not value:
+            continue
+
+        column = Column(param)
+
+        if param in range_columns and isinstance(value, tuple):
+            predicates.append(column.between(*value))
+
+        elif not isinstance(value, str) or param in exact_columns:
+            predicates.append(column == value)
+
+        elif param in prefix_columns:
+            predicates.append(column.startswith(value))
+
+        # the trigram tokenizer needs at least three characters
+        elif search_table and param in search_columns and len(value) >= 3:
+            predicates.append(Match(search_table, param, value))
+
+        else:
+            predicates.append(column.contains(value))
+
+    group = Or if conjunction_type.strip().upper() == "OR" else And
+    return group(*predicates) if predicates else None
+
+
+def get_search_predicate(
+    conn: sqlite3.Connection, obj: object, value: str, columns: tuple = None
+):
+    """
+    Builds the predicate matching rows where any of `columns` (by default the
+    object's `search_columns`) contains `value`. Search columns go through the
+    `search_table` full-text index, like get_filter_predicate. Returns None
+    for an empty value.
+    """
+
+    if not value:
+        return None
+
+    search_table = getattr(obj, "search_table", None)
+    search_columns = getattr(obj, "search_columns", ())
+    columns = search_columns if columns is None else columns
+
+    if search_table and not table_exists(conn, search_table):
+        search_table = None
+
+    predicates = []
+    for column in columns:
+        # the trigram tokenizer needs at least three characters
+        if search_table and column in search_columns and len(value) >= 3:
+            predicates.append(Match(search_table, column, value))
+        else:
+            predicates.append(Column(column).contains(value))
+
+    return Or(*predicates)
+
+
 def filter_items(
     conn: sqlite3.Connection,
     table_name: str,
@@ -303,25 +589,221 @@ def filter_items(
 ):
     """Given an object and a list of attributes, return filtered items."""
 
-    filter_condition = []
+    predicate = get_filter_predicate(conn, query_params, obj, conjunction_type)
+    return select_items(conn, table_name, predicate, type(obj))
 
-    for param in query_params:
 
-        if hasattr(obj, param):
-            value = getattr(obj, param)
-            # print("PARAM", param, value)
+@lru_cache(maxsize=None)
+def get_order_by(order_by: str) -> str:
+    """Validates an ORDER BY clause of columns, each optionally ASC or DESC."""
+
+    for term in order_by.split(","):
+        parts = term.split()
+        if not 1 <= len(parts) <= 2 or (
+            len(parts) == 2 and parts[1].upper() not in ("ASC", "DESC")
+        ):
+            raise ValueError(f"Invalid order: {order_by}")
+        Column(parts[0])
+
+    return order_by
+
+
+def iter_items(
+    conn: sqlite3.Connection,
+    table_name: str,
+    filter_condition: str | Predicate = None,
+    mapped_object_type=None,
+    column_names: list = [],
+    order_by: str = None,
+    limit: int = None,
+    batch_size: int = 500,
+):
+    """
+    Like select_items, but yields rows as they are read from the cursor,
+    `batch_size` at a time, so memory doesn't grow with the result.
+    """
+
+    query = f"SELECT * FROM {sanitize_table_name(table_name)}"
+    params = ()
+
+    if filter_condition:
+        filter_condition, params = get_filter_condition(filter_condition)
+        query += f" WHERE {filter_condition}"
+
+    if order_by:
+        query += f" ORDER BY {get_order_by(order_by)}"
+
+    if limit is not None:
+        query += " LIMIT ?"
+        params = (*params, int(limit))
+
+    cursor = conn.execute(query, params)
+
+    try:
+        while rows := cursor.fetchmany(batch_size):
+            if mapped_object_type:
+                rows = map_sqlite_results_to_objects(
+                    rows, mapped_object_type, column_names
+                )
+            yield from rows
+    finally:
+        cursor.close()
+
+
+def get_keyset_condition(key_column: str, after: tuple, descending: bool):
+    """Matches rows ordered after `after`, a (key, rowid) pair."""
+
+    value, rowid = after
+
+    # NULL keys sort first in ascending order and last in descending order
+    if value is None:
+        op = "<" if descending else ">"
+        condition = f"({key_column} IS NULL AND rowid {op} ?)"
+        if not descending:
+            condition = f"({condition} OR {key_column} IS NOT NULL)"
+        return condition, (rowid,)
+
+    if descending:
+        return f"(({key_column}, rowid) < (?, ?) OR {key_column} IS NULL)", after
+
+    return f"({key_column}, rowid) > (?, ?)", after
+
+
+def select_page(
+    conn: sqlite3.Connection,
+    table_name: str,
+    filter_condition: str | Predicate = None,
+    mapped_object_type=None,
+    key_column: str = "rowid",
+    after: tuple = None,
+    page_size: int = 100,
+    descending: bool = False,
+):
+    """
+    Returns (items, next_key) for one page ordered by (`key_column`, rowid).
+
+    Pass `next_key` back as `after` for the following page; it is None on
+    the last page. Pages seek on the key instead of using OFFSET, so every
+    page costs the same however deep it is.
+    """
+
+    key_column = Column(key_column).name
+    conditions = []
+    params = ()
+
+    if filter_condition:
+        condition, params = get_filter_condition(filter_condition)
+        conditions.append(condition)
+
+    if after is not None:
+        condition, key_params = get_keyset_condition(key_column, after, descending)
+        conditions.append(condition)
+        params = (*params, *key_params)
+
+    direction = "DESC" if descending else "ASC"
+    query = f"SELECT *, {key_column}, rowid FROM {sanitize_table_name(table_name)}"
+
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    query += f" ORDER BY {key_column} {direction}, rowid {direction} LIMIT ?"
+    rows = execute_query(conn, query, (*params, int(page_size)))
+
+    next_key = tuple(rows[-1][-2:]) if len(rows) == page_size else None
+    # the key columns trail each row, past the columns objects are mapped from
+    rows = [row[:-2] for row in rows]
+
+    if mapped_object_type:
+        rows = map_sqlite_results_to_objects(rows, mapped_object_type)
+
+    return rows, next_key
+
+
+def iter_pages(
+    conn: sqlite3.Connection,
+    table_name: str,
+    filter_condition: str | Predicate = None,
+    mapped_object_type=None,
+    key_column: str = "rowid",
+    page_size: int = 100,
+    descending: bool = False,
+):
+    """Yields successive pages from select_page."""
+
+    after = None
+
+    while True:
+        items, after = select_page(
+            conn,
+            table_name,
+            filter_condition,
+            mapped_object_type,
+            key_column,
+            after,
+            page_size,
+            descending,
+        )
+
+        if items:
+            yield items
+        if after is None:
+            return
+
+
+def create_search_index(
+    conn: sqlite3.Connection,
+    table_name: str,
+    search_table: str,
+    columns: list,
+    content_rowid: str = "rowid",
+):
+    """
+    Creates an FTS5 trigram index over `columns` of `table_name`, kept in sync
+    by triggers. `content_rowid` should name an INTEGER PRIMARY KEY column,
+    since plain rowids can change when the table is vacuumed. Returns False
+    if this SQLite build lacks FTS5.
+    """
+
+    exists = table_exists(conn, search_table)
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+    delete_old = (
+        f"INSERT INTO {search_table} ({search_table}, rowid, {column_list}) "
+        f"VALUES ('delete', old.{content_rowid}, {old_values});"
+    )
+    insert_new = (
+        f"INSERT INTO {search_table} (rowid, {column_list}) "
+        f"VALUES (new.{content_rowid}, {new_values});"
+    )
 
-            if value:
-                if isinstance(value, str):
-                    value_str = f"'%{value}%'"
-                    filter_condition.append(f"{param} LIKE {value_str}")
-                else:
-                    filter_condition.append(f"{param} = {value}")
+    statements = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {search_table} USING fts5("
+        f"{column_list}, content='{table_name}', content_rowid='{content_rowid}', "
+        "tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {search_table}_insert AFTER INSERT ON "
+        f"{table_name} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {search_table}_delete AFTER DELETE ON "
+        f"{table_name} BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {search_table}_update AFTER UPDATE OF "
+        f"{column_list} ON {table_name} BEGIN {delete_old} {insert_new} END",
+    ]
+
+    try:
+        with transaction(conn):
+            for statement in statements:
+                conn.execute(statement)
+
+            if not exists:
+                # index rows written before the search table existed
+                conn.execute(
+                    f"INSERT INTO {search_table} ({search_table}) VALUES ('rebuild')"
+                )
+    except sqlite3.OperationalError as e:
+        print(f"Error creating search index {search_table}: {e}")
+        return False
 
-    filter_condition = f" {conjunction_type} ".join(filter_condition)
-    # print("FILTER CONDITION", filter_condition)
-    items = select_items(conn, table_name, filter_condition, type(obj))
-    return items
+    return True
 
 
 @lru_cache(maxsize=None)
@@ -329,53 +811,166 @@ def get_cached_column_names(cls):
     return list(get_callable_args(cls.__init__).keys())
 
 
-def map_sqlite_results_to_objects(
-    sqlite_results: list, object_type, column_names: list = []
-):
-    """Maps SQLite query results to a list of objects"""
+def load_json(value):
+    """
+    Decodes a JSON column value. Rows written before values were stored as
+    JSON hold Python literals, which are still read back.
+    """
+
+    if not isinstance(value, str):
+        return value
+
+    try:
+        return json.loads(value)
+    except ValueError:
+        pass
+
+    try:
+        return literal_eval(value)
+    except (SyntaxError, ValueError):
+        return value
+
+
+@lru_cache(maxsize=None)
+def get_row_factory(object_type, column_names: tuple):
+    """
+    Returns a function that builds an `object_type` from a row tuple.
+
+    Objects are copied from a template instance, and column values are
+    written straight to the attributes backing their properties, so neither
+    `__init__` nor the setters run per row. Columns map to the constructor's
+    parameters by position, and columns past the parameters are ignored.
+    """
+
+    if issubclass(object_type, SQLiteRecord):
+        return object_type.from_row
 
     all_columns = get_cached_column_names(object_type)
+    template = vars(object_type()).copy()
 
-    if not column_names:
-        column_names = all_columns
+    direct = []
+    setters = []
 
-    objects = []
+    for index, column_name in enumerate(all_columns):
+        if column_names and column_name not in column_names:
+            continue
 
-    # Identify columns that may require `literal_eval`
-    eval_needed = [name for name in column_names if isinstance(name, str)]
+        attr = getattr(object_type, column_name, None)
 
-    for result in sqlite_results:
-        o = object_type()
+        if isinstance(attr, property):
+            if hasattr(object_type, f"_{column_name}"):
+                direct.append((index, f"_{column_name}"))
+            else:
+                setters.append((index, column_name))
+        elif hasattr(object_type, column_name) or column_name in template:
+            direct.append((index, column_name))
 
-        for value, column_name in zip_longest(result, all_columns):
-            # Only evaluate if this column is in the pre-determined list
+    size = len(all_columns)
 
-            if column_name not in column_names:
-                continue
+    def make(row: tuple):
+        # tables with fewer columns than parameters leave the rest None
+        if len(row) < size:
+            row = (*row, *(None,) * (size - len(row)))
 
-            if (
-                column_name in eval_needed
-                and isinstance(value, str)
-                and (
-                    value.startswith("[")
-                    and value.endswith("]")
-                    or value.startswith("{")
-                    and value.endswith("}")
-                )
-            ):
-                try:
-                    value = literal_eval(value)
-                except (SyntaxError, ValueError):
-                    value = f'{value}'
+        o = object_type.__new__(object_type)
+        state = template.copy()
+
+        for index, name in direct:
+            state[name] = row[index]
+
+        o.__dict__ = state
+
+        for index, name in setters:
+            setattr(o, name, row[index])
+
+        return o
+
+    return make
+
+
+def get_display_values(values: dict, item_type) -> dict:
+    """Returns `values` with the date and duration columns of `item_type` formatted."""
+
+    values = dict(values)
+
+    for name in getattr(item_type, "date_columns", ()):
+        if name in values:
+            values[name] = format_timestamp(values[name])
+
+    for name in getattr(item_type, "duration_columns", ()):
+        if name in values:
+            values[name] = format_duration(values[name])
+
+    return values
+
+
+class SQLiteRecord(tuple):
+    """
+    A read-only row, much smaller than the item it was read for: fields are
+    stored in the tuple, with no per-instance `__dict__`. Values are as
+    stored, except JSON columns, which are decoded each time they're read.
+
+    Record types are made per item type by get_record_type.
+    """
+
+    __slots__ = ()
+    item_type = None
+    column_names = ()
+
+    @classmethod
+    def from_row(cls, row: tuple):
+        size = len(cls._fields)
+
+        if len(row) != size:
+            # past the mapped columns, or padded for columns the table lacks
+            row = (*row[:size], *(None,) * (size - len(row)))
+
+        return tuple.__new__(cls, row)
+
+    def to_item(self):
+        """Builds the full item, for actions that need one."""
+        return get_row_factory(self.item_type, ())(self)
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.column_names}
 
-            if column_name is not None and hasattr(o, column_name):
-                setattr(o, column_name, value)
+    def display_dict(self) -> dict:
+        """as_dict, with dates and durations formatted for display."""
+        return get_display_values(self.as_dict(), self.item_type)
 
-            # print("LVALUE", column_name, value)
+    def __repr__(self):
+        return json.dumps(self.display_dict(), indent=1, ensure_ascii=False)
 
-        objects.append(o)
+    __str__ = __repr__
 
-    return objects
+
+@lru_cache(maxsize=None)
+def get_record_type(item_type) -> type:
+    """Returns the SQLiteRecord type for rows mapped to `item_type`."""
+
+    fields = tuple(get_cached_column_names(item_type))
+    item = item_type()
+    namespace = {
+        "__slots__": (),
+        "item_type": item_type,
+        "column_names": tuple(name for name in fields if name in item.column_names),
+    }
+
+    for name in getattr(item_type, "json_columns", ()):
+        index = fields.index(name)
+        namespace[name] = property(lambda self, i=index: load_json(self[i]))
+
+    base = namedtuple(f"{item_type.__name__}Fields", fields, rename=True)
+    return type(f"{item_type.__name__}Record", (SQLiteRecord, base), namespace)
+
+
+def map_sqlite_results_to_objects(
+    sqlite_results: list, object_type, column_names: list = []
+):
+    """Maps SQLite query results to a list of objects"""
+
+    make = get_row_factory(object_type, tuple(column_names or ()))
+    return [make(row) for row in sqlite_results]
 
 
 def delete_items(
@@ -384,7 +979,7 @@ def delete_items(
     """
     Deletes existing records from table.
     """
-    table_name = sanitize_values(table_name)[0]
+    table_name = sanitize_table_name(table_name)
     query = f"DELETE FROM {table_name}"
 
     if filter_condition == "all" or filter_condition is None:
@@ -425,7 +1020,9 @@ def execute_query(
             # print(query)
             cursor.execute(query)
         results = cursor.fetchall()
-        conn.commit()
+
+        if not getattr(conn, "transaction_depth", 0):
+            conn.commit()
 
     except sqlite3.Error as e:
         print(f"Error executing query: {e} \n {query}")
@@ -436,6 +1033,41 @@ def execute_query(
     return results
 
 
+def execute_many(conn: sqlite3.Connection, query: str, parameters):
+    """
+    Executes `query` once per parameter sequence inside a single transaction.
+    Returns the last inserted row id.
+
+    If a row violates a constraint, the batch is rolled back and its rows are
+    executed one at a time, so only the failing rows are skipped, as they are
+    when written individually. Other errors are raised.
+    """
+
+    parameters = list(parameters)
+
+    with transaction(conn):
+        conn.execute("SAVEPOINT execute_many")
+
+        try:
+            cursor = conn.executemany(query, parameters)
+        except sqlite3.IntegrityError:
+            conn.execute("ROLLBACK TO execute_many")
+            cursor = None
+
+        conn.execute("RELEASE execute_many")
+
+        if cursor:
+            return cursor.lastrowid
+
+        last_row_id = None
+        for values in parameters:
+            cursor, _ = execute_query(conn, query, values, return_cursor=True)
+            if cursor and cursor.lastrowid:
+                last_row_id = cursor.lastrowid
+
+        return last_row_id
+
+
 def create_table(conn: sqlite3.Connection, table_name: str, table_values: list):
     """
     Create a new SQLite table.
@@ -449,6 +1081,30 @@ def create_table(conn: sqlite3.Connection, table_name: str, table_values: list):
     return table_name
 
 
+def add_missing_columns(conn: sqlite3.Connection, table_name: str, table_values: list):
+    """
+    Adds columns declared in `table_values` that an existing table lacks.
+    """
+    table_name = sanitize_values(table_name)[0]
+    existing = get_column_names(conn.cursor(), table_name)
+    added = []
+
+    for value in table_values:
+        column_name = value.split(" ")[0]
+        if column_name.isupper() or column_name in existing:
+            # skip constraints such as PRIMARY KEY (...)
+            continue
+
+        if "PRIMARY KEY" in value:
+            # can't be added in place; a migration rebuilds the table
+            continue
+
+        execute_query(conn, f"ALTER TABLE {table_name} ADD COLUMN {value}")
+        added.append(column_name)
+
+    return added
+
+
 def close_connection(conn: sqlite3.Connection):
     """
     Close the SQLite database connection.
@@ -495,8 +1151,11 @@ def is_valid_quote_string(quoted_string: str) -> bool:
     return False
 
 
-def get_filter_condition(filter_condition: str):
-    
+def get_filter_condition(filter_condition: str | Predicate):
+
+    if isinstance(filter_condition, Predicate):
+        return filter_condition.compile()
+
     if not isinstance(filter_condition, str):
         raise ValueError("filter_condition must be of type str.")
 
@@ -591,5 +1250,7 @@ if __name__ == "__main__":
 
     output = action_map[args.action]()
 
+    from pprint import pprint
+
     print(f"Executing {args.action}...")
-    pp.pprint(output)
+    pprint(output, depth=4)
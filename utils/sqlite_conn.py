@@ -1,23 +1,68 @@
-from utils.sqlite import create_connection, create_table
+from utils import parse_duration, parse_progress, to_timestamp
+from utils.sqlite import (
+    add_missing_columns,
+    create_connection,
+    create_search_index,
+    create_table,
+    execute_query,
+    table_exists,
+)
+from utils.logger import LazyLogger
+from utils.sqlite_migrate import migrate, rebuild_table
+
+logger = LazyLogger(name="migrations", log_dir="/udown/migrations")
 
 
 download_values = [
     "url text NOT NULL",
     "downloader_type text NOT NULL",
     "download_status text NOT NULL",
-    "start_date DATE",
-    "end_date DATE",
-    "time_elapsed text",
+    "start_date REAL",
+    "end_date REAL",
+    "time_elapsed INTEGER",
     "output_directory text",
     "output_filename text",
     "output_path text",
     "source_url text",
     "proxy text",
     "extra_args text",
-    "progress text",
+    "progress REAL",
+    "bytes_received INTEGER",
+    "etag text",
+    "last_modified text",
+    # last, so rows still map to Download's parameters by position
+    "id INTEGER PRIMARY KEY",
+    "UNIQUE (url, downloader_type, output_path)",
+]
+
+# the downloads table as each migration rebuilds it. These stay as they are
+# when download_values changes: columns added since are added to migrated
+# databases by add_missing_columns, or by a migration of their own.
+download_values_v1 = [
+    "url text NOT NULL",
+    "downloader_type text NOT NULL",
+    "download_status text NOT NULL",
+    "start_date REAL",
+    "end_date REAL",
+    "time_elapsed INTEGER",
+    "output_directory text",
+    "output_filename text",
+    "output_path text",
+    "source_url text",
+    "proxy text",
+    "extra_args text",
+    "progress REAL",
+    "bytes_received INTEGER",
+    "etag text",
+    "last_modified text",
     "PRIMARY KEY (url, downloader_type, output_path)",
 ]
 
+download_values_v3 = download_values_v1[:-1] + [
+    "id INTEGER PRIMARY KEY",
+    "UNIQUE (url, downloader_type, output_path)",
+]
+
 downloader_values = [
     "downloader_type text NOT NULL",
     "downloader_path text",
@@ -27,6 +72,57 @@ downloader_values = [
     "PRIMARY KEY (downloader_type)",
 ]
 
+job_values = [
+    "id INTEGER PRIMARY KEY AUTOINCREMENT",
+    "url text NOT NULL",
+    "downloader_type text",
+    "output_directory text",
+    "output_filename text",
+    "proxy text",
+    "extra_args text",
+    "priority INTEGER NOT NULL DEFAULT 0",
+    "attempts INTEGER NOT NULL DEFAULT 0",
+    "max_attempts INTEGER NOT NULL DEFAULT 3",
+    "job_status text NOT NULL DEFAULT 'queued'",
+    "lease_owner text",
+    "lease_expiry REAL",
+    "created_date DATE",
+    "error text",
+    "not_before REAL",
+]
+
+# yt-dlp's download archive, see src.archive
+archive_values = [
+    "archive_key text NOT NULL",
+    "archive_id text NOT NULL",
+    "archived_date REAL",
+    "PRIMARY KEY (archive_key, archive_id)",
+]
+
+# the newest video listed by the last sync of a channel
+channel_values = [
+    "channel_url text NOT NULL",
+    "sync_key text NOT NULL",
+    "last_video_id text",
+    "last_sync_date REAL",
+    "PRIMARY KEY (channel_url, sync_key)",
+]
+
+indexes = [
+    "CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (job_status, priority DESC, id)",
+    "CREATE INDEX IF NOT EXISTS idx_downloads_status ON downloads (download_status)",
+    "CREATE INDEX IF NOT EXISTS idx_downloads_type ON downloads (downloader_type)",
+    "CREATE INDEX IF NOT EXISTS idx_downloads_start_date ON downloads (start_date)",
+    "CREATE INDEX IF NOT EXISTS idx_downloads_end_date ON downloads (end_date)",
+    "CREATE INDEX IF NOT EXISTS idx_downloads_progress ON downloads (progress)",
+    "CREATE INDEX IF NOT EXISTS idx_downloads_source_url ON downloads (source_url)",
+]
+
+# (table, FTS5 table, columns, rowid column) searched by filter_by
+search_indexes = [
+    ("downloads", "downloads_fts", ["url", "output_filename", "output_path"], "id"),
+]
+
 # extractor_values = [
 #     "extractor_type text NOT NULL",
 #     "module text NOT NULL",
@@ -35,16 +131,110 @@ downloader_values = [
 #     "PRIMARY KEY (extractor_type)",
 # ]
 
-tables = ["downloads", "downloaders"]
-values = [download_values, downloader_values]
+tables = ["downloads", "downloaders", "jobs", "ytdlp_archive", "ytdlp_channels"]
+values = [
+    download_values,
+    downloader_values,
+    job_values,
+    archive_values,
+    channel_values,
+]
+
+
+def migrate_download_types(conn):
+    """
+    Dates become epoch seconds, progress a percentage and time_elapsed whole
+    seconds, instead of str(datetime), "42.0%" and str(timedelta).
+    """
+
+    conn.create_function("to_timestamp", 1, to_timestamp, deterministic=True)
+    conn.create_function("parse_progress", 1, parse_progress, deterministic=True)
+    conn.create_function("parse_duration", 1, parse_duration, deterministic=True)
+
+    # dates to_timestamp can't parse are stored as NULL
+    for column in ["start_date", "end_date"]:
+        nulled = conn.execute(
+            f"SELECT COUNT(*) FROM downloads WHERE {column} IS NOT NULL "
+            f"AND {column} != '' AND to_timestamp({column}) IS NULL"
+        ).fetchone()[0]
+
+        if nulled:
+            logger.warning(f"Cleared {nulled} unparseable {column} values")
+
+    rebuild_table(
+        conn,
+        "downloads",
+        download_values_v1,
+        {
+            "start_date": "to_timestamp(start_date)",
+            "end_date": "to_timestamp(end_date)",
+            "time_elapsed": "parse_duration(time_elapsed)",
+            "progress": "parse_progress(progress)",
+        },
+    )
+
+
+def migrate_ytdlp_archive(conn):
+    """
+    Archives the YouTube videos already downloaded under their downloader
+    type, so channel syncs don't download them again.
+    """
 
+    conn.execute(
+        "INSERT OR IGNORE INTO ytdlp_archive (archive_key, archive_id, archived_date) "
+        "SELECT downloader_type, 'youtube ' || substr(url, 33), end_date "
+        "FROM downloads WHERE download_status = 'completed' "
+        "AND url LIKE 'https://www.youtube.com/watch?v=___________'"
+    )
 
-def create_db(db_path: str, tables: list = tables, values: list = values):
+
+def migrate_download_ids(conn):
+    """
+    Gives downloads an `id` aliasing the rowid, keeping each row's rowid, so
+    the search index can use it as its content rowid. The search index is
+    dropped and built again by create_db.
+    """
+
+    rebuild_table(conn, "downloads", download_values_v3)
+    conn.execute("DROP TABLE IF EXISTS downloads_fts")
+
+
+# (version, function) pairs, run in order by create_db
+migrations = [
+    (1, migrate_download_types),
+    (2, migrate_ytdlp_archive),
+    (3, migrate_download_ids),
+]
+
+
+def create_db(
+    db_path: str,
+    tables: list = tables,
+    values: list = values,
+    indexes: list = indexes,
+    search_indexes: list = search_indexes,
+    migrations: list = migrations,
+):
 
     conn = create_connection(db_path)
+    new_database = not table_exists(conn, tables[0])
 
     # create tables
     for t, v in zip(tables, values):
         create_table(conn, t, v)
 
+    # migrations drop the indexes of tables they rebuild; they're created below
+    migrate(conn, migrations, new_database)
+
+    # databases created by older versions lack newer columns; added after the
+    # migrations, whose rebuilds only keep the columns of their own version
+    for t, v in zip(tables, values):
+        add_missing_columns(conn, t, v)
+
+    for index in indexes:
+        execute_query(conn, index)
+
+    for table_name, search_table, columns, content_rowid in search_indexes:
+        create_search_index(conn, table_name, search_table, columns, content_rowid)
+
     return conn
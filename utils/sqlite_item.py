@@ -1,16 +1,79 @@
 from sqlite3 import Connection
+import threading
 from typing import Any, Dict
 from utils.sqlite import (
     select_items,
     update_items,
     insert_items,
+    insert_new_items,
     delete_items,
     create_connection,
     filter_items,
+    get_display_values,
+    get_filter_predicate,
+    get_primary_key,
+    get_search_predicate,
+    get_record_type,
     get_random_row,
+    iter_items,
+    iter_pages,
+    select_page,
+    SQLiteRecord,
+    transaction,
+    upsert_items,
 )
+from utils.sqlite_query import where
 
-conn = None
+local = threading.local()
+
+# set up databases on first use rather than when a module is imported
+initializers = {}
+initializers_lock = threading.RLock()
+initializing = set()
+
+
+def set_initializer(db_path: str, func):
+    """Runs `func(db_path)` before the first connection to `db_path` is opened."""
+
+    with initializers_lock:
+        initializers[db_path] = func
+
+
+def init_database(db_path: str):
+    """
+    Runs the initializer set for `db_path`, once per process; other threads
+    wait for it to finish. Connections the initializer opens itself skip it.
+    """
+
+    if db_path not in initializers:
+        return
+
+    with initializers_lock:
+        func = initializers.get(db_path)
+        if func is None or db_path in initializing:
+            return
+
+        initializing.add(db_path)
+        try:
+            func(db_path)
+            del initializers[db_path]
+        finally:
+            initializing.discard(db_path)
+
+
+def get_connection(db_path: str) -> Connection:
+    """Returns the calling thread's connection to `db_path`, opening it once."""
+
+    connections = getattr(local, "connections", None)
+    if connections is None:
+        connections = local.connections = {}
+
+    conn = connections.get(db_path)
+    if conn is None:
+        init_database(db_path)
+        conn = connections[db_path] = create_connection(db_path)
+
+    return conn
 
 
 class SQLiteItem:
@@ -25,6 +88,23 @@ class SQLiteItem:
 
     _conjunction_type = "AND"
 
+    # how filter_by matches string columns (see utils.sqlite.filter_items)
+    exact_columns = ()
+    prefix_columns = ()
+    range_columns = ()
+    search_table = None
+    search_columns = ()
+
+    # select_page orders by (page_key, rowid)
+    page_key = "rowid"
+
+    # columns holding JSON text, decoded when read through a record
+    json_columns = ()
+
+    # epoch seconds and durations in seconds, formatted by display_dict
+    date_columns = ()
+    duration_columns = ()
+
     def __init__(
         self,
         table_values: list,
@@ -67,13 +147,11 @@ class SQLiteItem:
 
     @property
     def conn(self):
-        if self._conn is None:
-            global conn
-            if conn is None:
-                conn = create_connection(self.db_path)
-            self._conn = conn
+        if self._conn is not None:
+            return self._conn
 
-        return self._conn
+        # each thread gets its own connection; WAL lets their reads overlap a write
+        return get_connection(self.db_path)
 
     @property
     def filter_condition(self):
@@ -124,6 +202,90 @@ class SQLiteItem:
         )
         return items
 
+    def get_filter_predicate(
+        self, query_params: list = None, conjunction_type: str = None
+    ):
+        """The predicate filter_by would select with, or None to match everything."""
+
+        if query_params is None:
+            query_params = self.column_names
+
+        conjunction_type = (
+            self.conjunction_type if conjunction_type is None else conjunction_type
+        )
+        return get_filter_predicate(self.conn, query_params, self, conjunction_type)
+
+    def get_search_predicate(self, value: str, columns: tuple = None):
+        """The predicate matching rows where any of `columns` contains `value`."""
+        return get_search_predicate(self.conn, self, value, columns)
+
+    @classmethod
+    def record_type(cls):
+        """The compact, read-only type rows are mapped to with `records=True`."""
+        return get_record_type(cls)
+
+    def get_mapped_type(self, records: bool = False):
+        return self.record_type() if records else type(self)
+
+    def iter_items(
+        self,
+        filter_condition=None,
+        order_by: str = None,
+        limit: int = None,
+        batch_size: int = 500,
+        records: bool = False,
+    ):
+        """Yields matching items while reading them from the cursor in batches."""
+
+        return iter_items(
+            self.conn,
+            self.table_name,
+            filter_condition,
+            self.get_mapped_type(records),
+            self.column_names,
+            order_by,
+            limit,
+            batch_size,
+        )
+
+    def select_page(
+        self,
+        filter_condition=None,
+        after: tuple = None,
+        page_size: int = 100,
+        descending: bool = False,
+        records: bool = False,
+    ):
+        """Returns (items, next_key) for one page ordered by `page_key`."""
+
+        return select_page(
+            self.conn,
+            self.table_name,
+            filter_condition,
+            self.get_mapped_type(records),
+            self.page_key,
+            after,
+            page_size,
+            descending,
+        )
+
+    def iter_pages(
+        self,
+        filter_condition=None,
+        page_size: int = 100,
+        descending: bool = False,
+        records: bool = False,
+    ):
+        return iter_pages(
+            self.conn,
+            self.table_name,
+            filter_condition,
+            self.get_mapped_type(records),
+            self.page_key,
+            page_size,
+            descending,
+        )
+
     def get_filter_keys_from_args(self, args_dict, defaults):
         user_keys = {
             k for k, v in args_dict.items() if k in defaults and v != defaults[k]
@@ -151,27 +313,104 @@ class SQLiteItem:
         items = self.select(filter_condition)
         return items[0] if len(items) > 0 else None
 
-    def select_all(self):
+    def select_all(self, records: bool = False):
         return select_items(
-            self.conn, self.table_name, None, type(self), self.column_names
+            self.conn,
+            self.table_name,
+            None,
+            self.get_mapped_type(records),
+            self.column_names,
         )
 
+    def transaction(self, immediate: bool = False):
+        """
+        Groups every write made on this thread's connection inside the block
+        into a single transaction.
+        """
+        return transaction(self.conn, immediate)
+
+    def before_insert(self):
+        """Fills in defaults before the item is inserted."""
+
     def insert(self):
+        self.before_insert()
         return insert_items(self.conn, self.table_name, [self], self.column_names)
 
     @classmethod
     def insert_all(cls, items: list):
+        items = [
+            item for item in items if isinstance(item, (SQLiteItem, SQLiteRecord))
+        ]
+        if not items:
+            return None
+
+        # records were read from the table, so they already have their defaults
         for item in items:
             if isinstance(item, SQLiteItem):
-                item.insert()
+                item.before_insert()
+
+        first = items[0]
+        if isinstance(first, SQLiteRecord):
+            first = first.item_type()
+
+        return insert_items(first.conn, first.table_name, items, first.column_names)
 
     @classmethod
-    def upsert_all(cls, items: list, filter_condition: str = None):
+    def insert_new(cls, items: list) -> list:
+        """Inserts the items whose rows don't exist yet; returns those inserted."""
+
+        if not items:
+            return []
+
         for item in items:
-            if isinstance(item, SQLiteItem):
+            item.before_insert()
+
+        first = items[0]
+        return insert_new_items(first.conn, first.table_name, items, first.column_names)
+
+    @classmethod
+    def upsert_all(cls, items: list, filter_condition: str = None):
+        items = [item for item in items if isinstance(item, SQLiteItem)]
+        if not items:
+            return None
+
+        first = items[0]
+        if first.can_upsert():
+            for item in items:
+                item.before_insert()
+
+            return upsert_items(
+                first.conn, first.table_name, items, first.primary_key, first.column_names
+            )
+
+        with first.transaction():
+            for item in items:
                 item.upsert(filter_condition)
 
+    @property
+    def primary_key(self):
+        return get_primary_key(tuple(self.table_values))
+
+    @property
+    def key_condition(self):
+        """Matches this item's row by primary key."""
+        return where(**{column: getattr(self, column) for column in self.primary_key})
+
+    def can_upsert(self):
+        """Whether the primary key is among the written columns."""
+        return bool(self.primary_key) and set(self.primary_key) <= set(
+            self.column_names
+        )
+
     def upsert(self, filter_condition=None):
+        if self.can_upsert():
+            # a single INSERT ... ON CONFLICT, so concurrent writers can't race
+            self.before_insert()
+            return upsert_items(
+                self.conn, self.table_name, [self], self.primary_key, self.column_names
+            )
+
+        # without a usable primary key, match existing rows by filter_condition
         if self.item_exists(filter_condition):
             i = self.update(filter_condition)
         else:
@@ -227,6 +466,10 @@ class SQLiteItem:
 
         return result
 
+    def display_dict(self, column_names: list = None) -> Dict[str, Any]:
+        """as_dict, with dates and durations formatted for display."""
+        return get_display_values(self.as_dict(column_names), type(self))
+
     @classmethod
     def from_dict(cls, data: dict):
         """Initialize model from a dictionary, useful for API responses."""
@@ -0,0 +1,93 @@
+import sqlite3
+from utils.sqlite import (
+    create_table,
+    get_column_names,
+    table_exists,
+    transaction,
+)
+
+SCHEMA_TABLE = "schema_version"
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Returns the database's schema version, 0 if it was never versioned."""
+
+    if not table_exists(conn, SCHEMA_TABLE):
+        return 0
+
+    row = conn.execute(f"SELECT MAX(version) FROM {SCHEMA_TABLE}").fetchone()
+    return row[0] or 0
+
+
+def set_schema_version(conn: sqlite3.Connection, version: int):
+    create_table(conn, SCHEMA_TABLE, ["version INTEGER NOT NULL"])
+    conn.execute(f"DELETE FROM {SCHEMA_TABLE}")
+    conn.execute(f"INSERT INTO {SCHEMA_TABLE} (version) VALUES (?)", (version,))
+
+
+def migrate(
+    conn: sqlite3.Connection, migrations: list, new_database: bool = False
+) -> int:
+    """
+    Runs the migrations newer than the database's schema version, in order.
+    `migrations` is a list of (version, function) pairs; each function takes
+    the connection and runs in its own transaction with the version bump.
+
+    New databases are created with the latest schema, so they're only
+    stamped with the latest version. Returns the resulting version.
+    """
+
+    latest = max((version for version, _ in migrations), default=0)
+
+    if new_database:
+        with transaction(conn, immediate=True):
+            set_schema_version(conn, latest)
+        return latest
+
+    for version, func in sorted(migrations, key=lambda migration: migration[0]):
+        if get_schema_version(conn) >= version:
+            continue
+
+        with transaction(conn, immediate=True):
+            # another process may have migrated while this one waited
+            if get_schema_version(conn) >= version:
+                continue
+
+            func(conn)
+            set_schema_version(conn, version)
+
+    return get_schema_version(conn)
+
+
+def rebuild_table(
+    conn: sqlite3.Connection,
+    table_name: str,
+    table_values: list,
+    expressions: dict = None,
+):
+    """
+    Recreates `table_name` with `table_values`, so columns can change type,
+    and copies every row over in a single INSERT ... SELECT. `expressions`
+    maps a column to the SQL expression its old values are converted with.
+
+    Rowids are kept, so external content indexes stay valid; indexes and
+    triggers on the table are dropped and have to be created again.
+    """
+
+    expressions = expressions or {}
+    existing = get_column_names(conn.cursor(), table_name)
+    names = [value.split(" ")[0] for value in table_values]
+
+    # skip constraints such as PRIMARY KEY (...), and columns the table lacks
+    columns = [name for name in names if not name.isupper() and name in existing]
+    selected = [expressions.get(column, column) for column in columns]
+    new_table = f"{table_name}_rebuild"
+
+    conn.execute(f"DROP TABLE IF EXISTS {new_table}")
+    create_table(conn, new_table, table_values)
+    conn.execute(
+        f"INSERT INTO {new_table} (rowid, {', '.join(columns)}) "
+        f"SELECT rowid, {', '.join(selected)} FROM {table_name}"
+    )
+    conn.execute(f"DROP TABLE {table_name}")
+    conn.execute(f"ALTER TABLE {new_table} RENAME TO {table_name}")
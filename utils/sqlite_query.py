@@ -0,0 +1,219 @@
+from functools import lru_cache
+import re
+
+IDENTIFIER_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+OPERATORS = {
+    "=",
+    "!=",
+    "<",
+    "<=",
+    ">",
+    ">=",
+    "LIKE",
+    "IN",
+    "BETWEEN",
+    "IS NULL",
+    "IS NOT NULL",
+}
+
+
+def check_identifier(name: str) -> str:
+    if not isinstance(name, str) or not IDENTIFIER_RE.match(name):
+        raise ValueError(f"Invalid column name: {name!r}")
+    return name
+
+
+class Predicate:
+    """
+    A condition that compiles to a parameterized WHERE clause. Predicates
+    combine with `&` and `|`; values are always passed as parameters.
+    """
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    @property
+    def shape(self) -> tuple:
+        """Everything the SQL text depends on, i.e. the predicate without values."""
+        raise NotImplementedError
+
+    def get_params(self) -> list:
+        raise NotImplementedError
+
+    def compile(self):
+        """Returns (sql, params). The SQL text is cached per predicate shape."""
+        return compile_shape(self.shape), tuple(self.get_params())
+
+    def __repr__(self):
+        sql, params = self.compile()
+        return f"{type(self).__name__}({sql!r}, {params!r})"
+
+
+class Condition(Predicate):
+    """Compares a column to a value, e.g. Condition("url", "=", url)."""
+
+    def __init__(self, column: str, op: str = "=", value=None):
+        op = op.upper()
+        if op not in OPERATORS:
+            raise ValueError(f"Unsupported operator: {op}")
+
+        self.column = check_identifier(column)
+        self.op = op
+        self.value = tuple(value) if op in ("IN", "BETWEEN") else value
+
+        if op == "BETWEEN" and len(self.value) != 2:
+            raise ValueError("BETWEEN takes a (low, high) pair")
+
+    @property
+    def shape(self):
+        arity = len(self.value) if self.op == "IN" else None
+        return ("condition", self.column, self.op, arity)
+
+    def get_params(self):
+        if self.op in ("IN", "BETWEEN"):
+            return list(self.value)
+        if self.op in ("IS NULL", "IS NOT NULL"):
+            return []
+        return [self.value]
+
+
+class Match(Predicate):
+    """Matches rows whose `column` contains `value` through an FTS5 table."""
+
+    def __init__(self, search_table: str, column: str, value: str):
+        self.search_table = check_identifier(search_table)
+        self.column = check_identifier(column)
+        self.value = value
+
+    @property
+    def shape(self):
+        return ("match", self.search_table, self.column)
+
+    def get_params(self):
+        # quoted as a phrase, so punctuation in the value isn't query syntax
+        return ['"' + self.value.replace('"', '""') + '"']
+
+
+class Group(Predicate):
+    conjunction = "AND"
+
+    def __init__(self, *predicates: Predicate):
+        self.predicates = []
+
+        for predicate in predicates:
+            if predicate is None:
+                continue
+            if type(predicate) is type(self):
+                self.predicates.extend(predicate.predicates)
+            else:
+                self.predicates.append(predicate)
+
+    @property
+    def shape(self):
+        return (self.conjunction, tuple(p.shape for p in self.predicates))
+
+    def get_params(self):
+        return [param for p in self.predicates for param in p.get_params()]
+
+
+class And(Group):
+    conjunction = "AND"
+
+
+class Or(Group):
+    conjunction = "OR"
+
+
+class Column:
+    """Builds conditions with Python operators, e.g. Column("progress") != "100%"."""
+
+    def __init__(self, name: str):
+        self.name = check_identifier(name)
+
+    def __eq__(self, value):
+        if value is None:
+            return Condition(self.name, "IS NULL")
+        return Condition(self.name, "=", value)
+
+    def __ne__(self, value):
+        if value is None:
+            return Condition(self.name, "IS NOT NULL")
+        return Condition(self.name, "!=", value)
+
+    def __lt__(self, value):
+        return Condition(self.name, "<", value)
+
+    def __le__(self, value):
+        return Condition(self.name, "<=", value)
+
+    def __gt__(self, value):
+        return Condition(self.name, ">", value)
+
+    def __ge__(self, value):
+        return Condition(self.name, ">=", value)
+
+    def like(self, pattern: str):
+        return Condition(self.name, "LIKE", pattern)
+
+    def contains(self, value: str):
+        return self.like(f"%{value}%")
+
+    def isin(self, values):
+        return Condition(self.name, "IN", values)
+
+    def between(self, low, high):
+        """Inclusive range; a None end leaves that side open."""
+        if low is None and high is None:
+            return And()
+        if low is None:
+            return self <= high
+        if high is None:
+            return self >= low
+
+        return Condition(self.name, "BETWEEN", (low, high))
+
+    def startswith(self, prefix: str):
+        """Prefix match as a range, so an index on the column can serve it."""
+        if not prefix:
+            return And()
+
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return And(self >= prefix, self < upper)
+
+    __hash__ = None
+
+
+def where(**values) -> And:
+    """Equality on every given column, e.g. where(url=url, downloader_type=t)."""
+    return And(*(Column(name) == value for name, value in values.items()))
+
+
+@lru_cache(maxsize=1024)
+def compile_shape(shape: tuple) -> str:
+    kind = shape[0]
+
+    if kind == "condition":
+        _, column, op, arity = shape
+
+        if op == "IN":
+            return f"{column} IN ({', '.join(['?'] * arity)})" if arity else "0"
+        if op == "BETWEEN":
+            return f"{column} BETWEEN ? AND ?"
+        if op in ("IS NULL", "IS NOT NULL"):
+            return f"{column} {op}"
+        return f"{column} {op} ?"
+
+    if kind == "match":
+        _, search_table, column = shape
+        return f"rowid IN (SELECT rowid FROM {search_table} WHERE {column} MATCH ?)"
+
+    conjunction, shapes = shape
+    if not shapes:
+        return "1" if conjunction == "AND" else "0"
+    if len(shapes) == 1:
+        return compile_shape(shapes[0])
+
+    return "(" + f" {conjunction} ".join(compile_shape(s) for s in shapes) + ")"